@@ -0,0 +1,268 @@
+'''
+This script contains the AdaptiveTimestep class. This class lets
+BacStroke.simulate take timesteps of varying length: long timesteps while
+every bacterium is in the bulk of the clinostat, and the timestep of the
+configuration (dt) when a bacterium is close to a wall or end, or when
+tumbling or rotation need short timesteps to be resolved.
+
+Each timestep is a power of two times dt, no longer than dt_max, and is the
+longest for which every bacterium satisfies:
+
+    Walls:    the distance it can move in the timestep, u*dt' + k*sqrt(2*D*dt'),
+              is at most wall_fraction of its distance to the nearest wall or
+              end (R - a, r + a, H - a, a). u is the speed of every velocity term
+              except the clinostat rotation (which moves bacteria along the
+              walls) and k = sigmas. The advective term dominates for large
+              Peclet numbers (see Functions.peclet) and the diffusive term for
+              small ones.
+    Tumbling: tumbling_rate*dt' <= max_tumble
+    Rotation: omega*dt' <= max_angle and sqrt(2*Dr*dt') <= max_angle for
+              bacteria that swim, as the swimming direction is held through
+              each timestep, and omega*dt' <= max_angle for every bacterium
+              with the 'euler' position method (which spirals bacteria
+              outwards for large omega*dt')
+
+The timestep is chosen after each move, from the new positions, and used
+for the velocity calculated at the end of the timestep (the velocity of a
+bacterium, including its diffusion, is held over the next timestep). Only
+powers of two are used so that few distinct timesteps occur (each needs its
+own tumble probability and, for the 'exact' orientation method, its own
+table of angles) and every timestep ends on a multiple of dt.
+
+The output is still recorded every dt (every record_every dt): positions
+between the ends of a long timestep are interpolated along the straight
+line the bacterium moved along in the frame rotating with the clinostat,
+with the fluctuations of a Brownian bridge added for translational
+diffusion so that the MSD at lagtimes shorter than a timestep is still
+correct. Swimming directions between the ends are those held through the
+timestep, tumbles and wall hits are recorded at its end.
+'''
+
+# Imports #####################################################################
+
+# modules
+import numpy as np
+
+# external files
+from Boundaries import apply_boundaries, WALLS
+
+###############################################################################
+
+
+def rotate_planar(pos, angle):
+    '''
+    Rotates positions about the axis of the clinostat.
+
+    :param pos: [N, 3] float array, positions [m]
+    :param angle: float or [N] float array, angle of rotation [rad]
+
+    :returns rotated: [N, 3] float array
+    '''
+    cos_angle = np.cos(angle)
+    sin_angle = np.sin(angle)
+
+    rotated = np.copy(pos)
+    rotated[:, 0] = cos_angle*pos[:, 0] - sin_angle*pos[:, 1]
+    rotated[:, 1] = sin_angle*pos[:, 0] + cos_angle*pos[:, 1]
+
+    return rotated
+
+
+class AdaptiveTimestep(object):
+    '''
+    Class used to choose the length of each timestep of a simulation.
+    '''
+
+    def __init__(self, dt_max, wall_fraction=0.5, sigmas=3.0, max_tumble=0.2, max_angle=0.2, bridge=True):
+        '''
+        :param dt_max: float, longest timestep allowed [s]
+        :param wall_fraction: float, largest fraction of the distance to a wall
+        a bacterium can move in one timestep
+        :param sigmas: float, number of standard deviations of the diffusive
+        displacement included in the distance moved
+        :param max_tumble: float, largest tumbling_rate*timestep, no limit if None
+        :param max_angle: float, largest angle [rad] the clinostat or rotational
+        diffusion turn a bacterium through in one timestep (see top of
+        file), no limit if None
+        :param bridge: boolean, add Brownian bridge fluctuations to interpolated positions
+        '''
+        self.dt_max = float(dt_max)
+        self.wall_fraction = float(wall_fraction)
+        self.sigmas = float(sigmas)
+        self.max_tumble = max_tumble
+        self.max_angle = max_angle
+        self.bridge = bridge
+
+        # rotation limits every bacterium (not only those that swim), set by start
+        self.limit_rotation = True
+
+        # length of the next timestep, in multiples of dt
+        self.ticks = 1
+
+        # number of timesteps of each length (in multiples of dt) taken in the last simulation
+        self.step_counts = {}
+
+
+    def allowed_dt(self, params, bacteria):
+        '''
+        Longest timestep allowed for each bacterium, before rounding to a
+        power of two times dt.
+
+        :param params: SimulationParameters instance (or BatchParameters)
+        :param bacteria: Population instance
+
+        :returns dt: [N] float array, timestep [s]
+        '''
+        n = len(bacteria)
+        a = bacteria.rad
+
+        # distance from each bacterium to the nearest wall or end, where the
+        # boundary conditions start to act
+        rho = np.sqrt(bacteria.pos[:, 0]**2 + bacteria.pos[:, 1]**2)
+        z = bacteria.pos[:, 2]
+        gap = np.minimum.reduce([(params.R - a) - rho, rho - (params.r + a), (params.H - a) - z, z - a])
+        reach = self.wall_fraction*np.maximum(gap, 0)
+
+        # speed towards the walls and diffusive spread of each bacterium
+        speed = (np.abs(bacteria.swim) + np.sqrt(np.sum(bacteria.term_vel**2, axis=1))
+                 + np.sqrt(np.sum(bacteria.centripetal_vel**2, axis=1)))
+        spread = self.sigmas*np.sqrt(2*np.broadcast_to(params.diffusion_coefficient, n))
+
+        # root (sqrt of the timestep) of speed*dt + spread*sqrt(dt) = reach,
+        # written so it stays finite when either term is 0
+        with np.errstate(divide='ignore', invalid='ignore'):
+            denominator = spread + np.sqrt(spread**2 + 4*speed*reach)
+            root = np.where(denominator > 0, 2*reach/denominator, np.inf)
+        limits = [root**2]
+
+        with np.errstate(divide='ignore'):
+
+            if self.max_tumble is not None:
+                limits.append(self.max_tumble/np.broadcast_to(params.tumbling_rate, n))
+
+            if self.max_angle is not None:
+
+                # bacteria the rotation limits apply to
+                rotating = np.full(n, True) if self.limit_rotation else bacteria.swim != 0
+                no_limit = np.full(n, np.inf)
+
+                limits.append(np.where(rotating, self.max_angle/np.abs(np.broadcast_to(params.omega, n)), no_limit))
+                limits.append(np.where(bacteria.swim != 0, self.max_angle**2/(2*np.broadcast_to(params.rotational_diffusion_coefficient, n)), no_limit))
+
+        return np.minimum.reduce(limits)
+
+
+    def next_ticks(self, params, bacteria, remaining):
+        '''
+        Length of the next timestep, as a number of timesteps of length dt.
+
+        :param remaining: integer, number of timesteps of length dt left in the simulation
+
+        :returns ticks: integer, power of two
+        '''
+        allowed = min(np.min(self.allowed_dt(params, bacteria), initial=np.inf), self.dt_max)
+
+        ticks = 1
+        while 2*ticks*params.dt <= allowed and 2*ticks <= remaining:
+            ticks *= 2
+
+        return ticks
+
+
+    def start(self, params, bacteria, orientation_method='euler', position_method='euler'):
+        '''
+        Chooses the length of the first timestep, called by BacStroke.simulate
+        once the velocity terms of the population are initialised.
+
+        :param orientation_method: string, orientation method of the simulation
+        :param position_method: string, position method of the simulation
+
+        :returns dt: float, length of the first timestep [s]
+        '''
+        self.limit_rotation = position_method == 'euler'
+        self.step_counts = {}
+        self.ticks = self.next_ticks(params, bacteria, params.numstep)
+
+        return self.ticks*params.dt
+
+
+    def steps(self, params, bacteria, tumbler, orientation_method='euler', position_method='euler', profiler=None):
+        '''
+        Advances a population through a simulation with adaptive timesteps,
+        yielding the state of the population at every multiple of dt (same as
+        BacStroke.fixed_steps).
+
+        :param params: SimulationParameters instance (or BatchParameters)
+        :param bacteria: Population instance, changed in place
+        :param tumbler: TumbleSampler instance of the population
+        :param profiler: ComponentProfiler instance timing each boundary branch (see Profiling.py), or None
+        '''
+
+        dt = params.dt
+        numstep = params.numstep
+        omega = params.omega
+        n = len(bacteria)
+
+        # state of the population between the ends of a timestep
+        between = bacteria.copy()
+        no_tumbles = np.zeros(n, dtype=int)
+        no_hits = np.zeros(len(WALLS), dtype=int)
+
+        # diffusion coefficient of each bacterium as a column
+        D = np.broadcast_to(np.asarray(params.diffusion_coefficient, float), n)[:, None]
+
+        ticks = 0 # number of timesteps of length dt so far
+        while ticks < numstep:
+
+            step_ticks = self.ticks
+            step_dt = step_ticks*dt
+            self.step_counts[step_ticks] = self.step_counts.get(step_ticks, 0) + 1
+
+            start = ticks
+            ticks += step_ticks
+            time = ticks*dt
+
+            start_pos = np.copy(bacteria.pos)
+            between.swim_direction[:] = bacteria.swim_direction
+
+            # velocity terms that depend on the current position of each bacterium
+            bacteria.centripetal_force(params.viscosity_coefficient, params.density, omega, params.centripetal_force)
+            bacteria.rotational_vel(omega)
+
+            # moving every bacterium with the velocity held through this timestep
+            bacteria.update_pos(step_dt, method=position_method, omega=omega)
+
+            # length of the next timestep, from the new positions, and the
+            # velocity held through it
+            self.ticks = self.next_ticks(params, bacteria, numstep - ticks) if ticks < numstep else 1
+            bacteria.update_vel(self.ticks*dt, params.diffusion_coefficient)
+
+            swimming, hits = apply_boundaries(bacteria, params.R, params.r, params.H, profiler=profiler)
+
+            tumbles = tumbler.sample(time, mask=swimming, dt=step_dt)
+            bacteria.update_swimming_vel(omega, params.rotational_diffusion_coefficient, step_dt, tumbles,
+                                         mask=swimming, method=orientation_method)
+
+            # multiples of dt within the timestep, interpolated in the frame
+            # rotating with the clinostat (so the rotation isnt cut across)
+            if ticks - start > 1:
+                angle = np.asarray(omega)*step_dt
+                displacement = rotate_planar(bacteria.pos, -angle) - start_pos
+                bridge = np.zeros([n, 3])
+
+            for k in range(start + 1, ticks):
+
+                fraction = (k - start)/step_ticks
+                between.pos[:] = rotate_planar(start_pos + fraction*displacement, fraction*angle)
+
+                # Brownian bridge from the last point to the end of the timestep
+                if self.bridge and np.any(D > 0):
+                    left = (ticks - k)/(ticks - k + 1)
+                    variance = 2*D*dt*left
+                    noise = bacteria.streams.rows('bridge', np.arange(n)).normal(0, 1, size=(n, 3))
+                    bridge = bridge*left + np.sqrt(variance)*noise
+                    between.pos += bridge
+
+                yield k - 1, k*dt, between, no_tumbles, no_hits
+
+            yield ticks - 1, time, bacteria, tumbles, hits
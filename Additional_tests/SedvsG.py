@@ -7,9 +7,11 @@ objects. Naming on the plot is based off of the file name minus the .txt.
 
 This script turns off the following components of velocity:
     
-    Diffusion: by setting diffusion coefficient to 0 in config file
-    Swimming: by setting swimming velocity in each initial conditions file to 0
-    Rotation: by setting the clinostat rotation rate to 0 in the configuration file
+    Diffusion: by setting diffusion coefficient to 0
+    Swimming: by setting swimming velocity of each object to 0
+    Rotation: by setting the clinostat rotation rate to 0
+
+The configuration and initial conditions files are not changed.
 
 Check the configuration text file to ensure all other parameters are correct.
 '''
@@ -28,7 +30,8 @@ from scipy.stats import linregress
 
 # external files
 import BacStroke as bs
-import Functions as f
+from Population import Population
+from SimParameters import SimulationParameters
 
 ###############################################################################
 
@@ -49,23 +52,14 @@ def main():
     # numerous values of gravitational strength [m/s]
     gs = np.arange(0, 11, 1)*g
 
-    # opening configuration file and setting diffusion and rotation to 0 ######
-
-    # opening config file
-    with open(config_file_path, 'r') as file:
-        # read a list of lines into data
-        data = file.readlines()       
+    # reading configuration file and setting diffusion and rotation to 0 ######
     
-    # setting diffusion coefficient and rotation to 0 in config file
-    data[10] = '0\n' # \n to ensure new line added, rotation
-    data[31] = '0\n' # diffusion
+    # parameters are changed in memory, the configuration file isnt rewritten
+    params = SimulationParameters.from_config_file(config_file_path)
+    params = params.copy(clino_rotation_rate=0, diffusion_coefficient=0)
     
     # grabbing total time as variable
-    sim_time = float(data[7])
-
-    # and write everything back to config file
-    with open(config_file_path, 'w') as file:
-        file.writelines(data)
+    sim_time = params.total_time
      
     # calculating sedimentation speed for each object at each gs    
     sedimentation_speeds = np.zeros([len(arr), len(gs)]) # sed speed storage array, [number of objects, number of gravs]
@@ -73,46 +67,22 @@ def main():
     # for each object in Object_initial_conditions folder #####################
     for i in range(len(arr)):
         
-        # set the initial conditions file #####
-        
-        # opening config file to edit value of g
-        with open(config_file_path, 'r') as file:
-            # read a list of lines into data
-            data = file.readlines()       
-        
-        # resetting gravitational acceleration [m/s]
-        data[1] = 'Object_initial_conditions/' + arr[i] + '\n'
-    
-        # and write everything back to config file
-        with open(config_file_path, 'w') as file:
-            file.writelines(data)
+        # read the initial conditions file #####
+        with open('Object_initial_conditions/' + arr[i], 'r') as file:
+            population = Population.new_population(file)
             
-        # speed to set swimming too
-        swimming_speed = [0.0]    
-           
         # setting swimming speed to 0
-        f.change_swimming_speed('Object_initial_conditions/' + arr[i], swimming_speed)
+        population.swim[:] = 0.0
          
         # for each gravitational strength measured ############################
         for j in range(len(gs)):
-            
-            # opening config file to edit value of g #####
-            with open(config_file_path, 'r') as file:
-                # read a list of lines into data
-                data = file.readlines()       
-            
-            # resetting gravitational acceleration [m/s]
-            data[22] = str(gs[j]) + '\n' # \n for keeping config file format
-            
-            # and write everything back to config file
-            with open(config_file_path, 'w') as file:
-                file.writelines(data)
 
-            # run BacStroke to get position array saved into bacpos.csv
-            bs.main()
+            # run BacStroke to get position array saved into bacpos.csv, with
+            # the gravitational acceleration changed [m/s]
+            bs.simulate(params.copy(g=gs[j]), population.copy(), 'bacpos.csv', None, None, None, None)
             
             # access bacpos file
-            data = pd.read_csv("bacpos.csv")
+            data = pd.read_csv("bacpos.csv", header=None)
             positions = np.array(data) # in xyz format
             
             # difference between first and last position of object
@@ -8,16 +8,16 @@ distributions. As both of these angles allow generation of a random direction
 within the unit circle.
 
 Theta is generated via the random generation of a value of cos(theta) between 
-the values of 0 and 1 as this distribution is uniform.
+the values of -1 and 1 as this distribution is uniform.
 
-Both Phi & Theta are generated randomly as a number between 0 and 2pi.
+Phi is generated randomly as a number between 0 and 2pi.
 
 These values are then used to generate the xyz components of a random direction
 by using the polar to cartesian coordinate transformations.
 
-x = r*sin(phi)*cos(theta)
-y = r*sin(phi)*sin(theta)
-z = r*cos(phi)
+x = r*sin(theta)*cos(phi)
+y = r*sin(theta)*sin(phi)
+z = r*cos(theta)
 
 where r is one in this case as we are working with unit vectors.
 """
@@ -51,13 +51,11 @@ def initialise_swimming_direction():
     
     # generating random angles from the circular coordinate system
     # cos theta is generated as this is uniform unlike theta
-    #costheta = np.random.uniform(-1, 1)
-    #theta = np.arccos(costheta)
-    theta = np.random.uniform(0, np.pi)
+    costheta = np.random.uniform(-1, 1)
     phi = np.random.uniform(0, 2*np.pi)
     
     # random unit vector generated from the circular coordinate system
-    return theta, phi
+    return costheta, phi
 
 
 def main():
@@ -65,21 +63,20 @@ def main():
     # number of run iterations
     runs = int(1E6)
     
-    # theta and phi generated from each run
-    theta = np.zeros(runs)
+    # cos theta and phi generated from each run
+    costheta = np.zeros(runs)
     phi = np.zeros(runs)
     
-    # generating all theta and phi angles
+    # generating all cos theta and phi angles
     for i in range(runs):
-        theta[i] = initialise_swimming_direction()[0]
-        phi[i] = initialise_swimming_direction()[1]
+        costheta[i], phi[i] = initialise_swimming_direction()
     
     # normalising to between 0 and 1
-    theta = (theta/np.pi)
+    costheta = (costheta + 1)/2
     phi = (phi/(2*np.pi))
     
     # plotting PDF function on histogram
-    plt.hist(theta, density=True, bins = 50, edgecolor = 'black', label = '$ \Theta $/2$\pi$')
+    plt.hist(costheta, density=True, bins = 50, edgecolor = 'black', label = '(cos$ \Theta $ + 1)/2')
     plt.hist(phi, density=True, bins = 50, label = '$\Phi$/$\pi$', alpha=0.8)
     plt.xlabel('Normalised angle')
     plt.ylabel('PDF')
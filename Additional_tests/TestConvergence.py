@@ -0,0 +1,75 @@
+'''
+This script tests the ConvergenceMonitor of Observables.py on synthetic
+populations, without running a simulation.
+
+    1. reset with the parameters of the clinostat but no configuration of
+       each bacterium (a single run) must scale the changes by the size of
+       the clinostat, 2R for y and R - r for the planar radius
+    2. a population whose positions are drawn from the same distribution
+       every timestep must converge, one whose mean keeps drifting must not
+
+'''
+# imports #####################################################################
+
+# modules
+import numpy as np
+
+# external files
+from Observables import ConvergenceMonitor
+from Population import Population
+from SimParameters import SimulationParameters
+
+###############################################################################
+
+def population_at(pos):
+    '''
+    Population of bacteria at the positions pos, only the positions are used by the monitor.
+    '''
+    n = len(pos)
+
+    return Population(np.full(n, 1E-12), pos, np.full(n, 1E-6), np.zeros(n))
+
+
+def feed(monitor, steps, n, drift=0.0, seed=0):
+    '''
+    Passes steps timesteps of a population of n bacteria to the monitor, with
+    positions spread around the middle of the clinostat whose mean y moves by
+    drift [m] every timestep.
+
+    :returns converged: boolean
+    '''
+    rng = np.random.default_rng(seed)
+
+    for i in range(steps):
+        pos = np.column_stack([rng.normal(2E-2, 2E-3, n), rng.normal(drift*i, 2E-3, n), rng.uniform(0, 4E-2, n)])
+        monitor.update(0.1*(i + 1), population_at(pos), np.zeros(4, dtype=int))
+
+    return monitor.converged
+
+
+def main():
+    '''
+    Runs both tests, raising an AssertionError if either fails.
+    '''
+    # clinostat of the test configuration
+    params = SimulationParameters.from_config_file('test_config.txt')
+
+    # 1. scale of a single run
+    monitor = ConvergenceMonitor(window=50)
+    monitor.reset(params=params)
+    print('scale without groups: ' + str(monitor.scale[:, 0]))
+    assert np.allclose(monitor.scale[:, 0], [2*params.R, params.R - params.r]), 'changes arent scaled by the clinostat'
+
+    # 2. stationary and drifting populations
+    stationary = feed(monitor, 1000, 200)
+    print('stationary population converged: ' + str(stationary) + ' at ' + str(monitor.converged_time) + 's')
+    assert stationary and np.all(np.isfinite(monitor.changes)), 'stationary population didnt converge'
+
+    monitor.reset(params=params)
+    drifting = feed(monitor, 1000, 200, drift=2E-5)
+    print('drifting population converged: ' + str(drifting))
+    assert not drifting, 'drifting population converged'
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+'''
+This script tests the mean quartic displacement (MQD) of FastMSD.py against
+the direct calculation of every lag (FastMSD.mqd_direct).
+
+The trajectory is that of a bacterium in the lab frame of the clinostat,
+rotating around its axis with a slowly diffusing radius and z position. Near
+every multiple of the rotation period the displacements nearly cancel and
+the MQD is many orders of magnitude below its maximum, so every lag, not
+only the shortest, is compared.
+
+'''
+# imports #####################################################################
+
+# modules
+import numpy as np
+
+# external files
+import FastMSD as fm
+
+###############################################################################
+
+def rotating_trajectory(n, omega, dt, R=3E-2, H=2E-2, noise=1E-6, seed=0):
+    '''
+    Positions of an object rotating about the z axis of the clinostat, with a
+    random walk added to its distance from the axis and its z position.
+
+    :param n: integer, number of positions
+    :param omega: float, rotation rate [rad/s]
+    :param dt: float, time between positions [s]
+    :param R: float, mean distance from the axis [m]
+    :param H: float, mean z position [m]
+    :param noise: float, standard deviation of each random walk step [m]
+    :param seed: integer, seed of the random walk
+
+    :returns positions: n x 3 numpy array [m]
+    '''
+    rng = np.random.default_rng(seed)
+    time = np.arange(n)*dt
+
+    radius = R + np.cumsum(rng.normal(0, noise, n))
+    z = H + np.cumsum(rng.normal(0, noise, n))
+
+    return np.column_stack([radius*np.cos(omega*time), radius*np.sin(omega*time), z])
+
+
+def main(tolerance=1E-6):
+    '''
+    Compares the MQD at every lag for several rotation rates and lengths of
+    trajectory, raising an AssertionError if any lag differs from the direct
+    calculation by more than tolerance (relative).
+    '''
+
+    # [number of positions, rotation rate [rad/s], timestep [s], noise [m]]
+    cases = [[2000, 0.5, 0.1, 1E-5],
+             [5000, 0.5, 0.1, 1E-7],
+             [4000, 0.2, 0.05, 1E-6],
+             [3000, 1.0, 0.1, 0.0]]
+
+    for n, omega, dt, noise in cases:
+
+        positions = rotating_trajectory(n, omega, dt, noise=noise)
+        lags = np.arange(n)
+
+        MQD = fm.mqd(positions)
+        direct = fm.mqd_direct(positions, lags)
+
+        # relative difference at every lag but 0 (where both are 0)
+        difference = np.abs(MQD[1:] - direct[1:])/direct[1:]
+        worst = np.argmax(difference) + 1
+
+        print('n = ' + str(n) + ', omega = ' + str(omega) + ' rad/s: largest relative difference '
+              + format(difference[worst - 1], '.2e') + ' at lag ' + str(worst))
+
+        assert difference[worst - 1] <= tolerance, 'MQD differs from the direct calculation at lag ' + str(worst)
+
+
+if __name__ == "__main__":
+    main()
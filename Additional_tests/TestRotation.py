@@ -20,7 +20,8 @@ import pandas as pd
 
 # external files
 import BacStroke as bs
-import Functions as f
+from Population import Population
+from SimParameters import SimulationParameters
 
 ###############################################################################
 
@@ -72,41 +73,37 @@ def flow_period(positions, centre_coord, sim_length, dt, RPM):
         
     return period
              
-def main():
+def main(initial_conditions_path=None):
+    '''
+    :param initial_conditions_path: string, path to the initial conditions
+    file of the bacterium, the file named in the configuration file if None
+    '''
     
     # file paths
     positions_file_path = 'bacpos.csv' # file containing coordinate positions
     config_file_path = 'test_config.txt' # sim config file corresponding to above positions file
     
-    # set diffusion, gravity and swimming to 0 (!!! work on swimming another time)
-    # opening config file
-    with open(config_file_path, 'r') as file:
-        # read a list of lines into data
-        data = file.readlines()       
-    
-    # setting diffusion coefficient and rotation to 0 in config file
-    data[22] = '0\n' # \n to ensure new line added, gravity
-    data[31] = '0\n' # diffusion
-    
-    # grabbing needed variables from config, needs to be tidied (config function)
-    initial_conditions_path = data[1].strip()
-    sim_time = float(data[7])
-    dt = float(data[4])
-    R = float(data[13]) # clinostat radius, m
+    # set diffusion, gravity and swimming to 0, in memory so the configuration
+    # and initial conditions files arent rewritten
+    params = SimulationParameters.from_config_file(config_file_path)
+    params = params.copy(g=0, diffusion_coefficient=0)
+    
+    # grabbing needed variables from config
+    if initial_conditions_path is None:
+        initial_conditions_path = params.initial_conditions_file
+    sim_time = params.total_time
+    dt = params.dt
+    R = params.R # clinostat radius, m
     dR = (R/100)*5 # 5% of clinostat radius
     r = 0.5E-2
     
     print(sim_time, dt, R, dR)
-
-    # and write everything back to config file
-    with open(config_file_path, 'w') as file:
-        file.writelines(data)
-   
-    # speed to set swimming too
-    swimming_speed = [0.0]    
+    
+    with open(initial_conditions_path, 'r') as file:
+        population = Population.new_population(file)
        
     # setting swimming speed to 0
-    f.change_swimming_speed(initial_conditions_path, swimming_speed)
+    population.swim[:] = 0.0
        
     # varying values for clinostat rotation [RPM]
     RPM = np.arange(1, 11, 1)
@@ -120,33 +117,19 @@ def main():
 
     for j in range(len(starting_positions)):
         
-        # changing starting position in initial conditions file
-        f.change_starting_coords(initial_conditions_path, starting_positions[j])
+        # changing starting position
+        population.pos[:] = starting_positions[j]
         print(starting_positions[j])
         
         # running simulation for each rotation value
         for i in range(len(RPM)):
         
-            # SETTING CLINOSTAT ROTATION ####
-        
-            # open config file
-            with open(config_file_path, 'r') as file:
-                # read a list of lines into data
-                data = file.readlines()       
-                
-                # resetting rotation rate of clinostat
-                data[10] = str(RPM[i]) + '\n'
-                
-                # and write everything back to config file
-            with open(config_file_path, 'w') as file:
-                file.writelines(data)
-                
-            #print(RPM[i])
-            # running bacstroke simulation to get new positions
-            bs.main()
+            # running bacstroke simulation to get new positions, with the
+            # rotation rate of the clinostat reset
+            bs.simulate(params.copy(clino_rotation_rate=RPM[i]), population.copy(), positions_file_path, None, None, None, None)
         
             # getting position file from bacstoke output
-            data = pd.read_csv(positions_file_path)
+            data = pd.read_csv(positions_file_path, header=None)
             positions = np.array(data)
         
             # calculating bacterium rotation period for current value of clinostat rotation rate
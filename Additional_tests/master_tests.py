@@ -6,6 +6,8 @@ It runs the following scripts one at a time:
     
     SedvsG.py - testing the relation between sedimentation speed and gravity
     TestRotation.py - testing the rotation period against the rotation rate of the clinostat
+    TestMQD.py - testing the MQD of FastMSD.py against the direct calculation of every lag
+    TestConvergence.py - testing the ConvergenceMonitor on stationary and drifting populations
 '''
 
 # imports #####################################################################
@@ -23,29 +25,23 @@ import BacStroke as bs
 import SedvsG as Gtest # sedimentation speed vs gravity test
 import TestRotation as Rtest # rotation period against rotation rate
 import SwimmingRandomTest as Stest
+import TestMQD as Mtest # MQD of a rotating trajectory at every lag
+import TestConvergence as Ctest # convergence monitor on synthetic populations
 ###############################################################################
 
 # gravity test
 Gtest.main()
 
-# setting config file back to Ecoli if not already
-
-# opening config file to edit value of g
-with open('test_config.txt', 'r') as file:
-    # read a list of lines into data
-    data = file.readlines()       
-
-# resetting gravitational acceleration [m/s]
-data[1] = 'Object_initial_conditions/Ecoli.txt\n'
-
-# and write everything back to config file
-with open('test_config.txt', 'w') as file:
-    file.writelines(data)
-
-# rotation test
-Rtest.main()
+# rotation test, always with Ecoli (test_config.txt names another object)
+Rtest.main(initial_conditions_path='Object_initial_conditions/Ecoli.txt')
 
 # swimming direction test
 Stest.main()
 
+# MQD test
+Mtest.main()
+
+# convergence monitor test
+Ctest.main()
+
 
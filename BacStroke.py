@@ -3,6 +3,10 @@ This script is the main simulation script for BacStroke. It runs a simulation
 of a single bacterium within a clinostat based on parameters found within the
 configuration file. 
 
+Every bacterium in the initial conditions file is simulated together as one
+population (see Population.py), each timestep updates the whole population at
+once.
+
 The bacteriums position within the clinostat is updated at each timestep
 within the simulation. Where it moves to depends on its velocity, this depends
 on four components:
@@ -27,14 +31,24 @@ import matplotlib.pyplot as plt
 from numpy.polynomial.polynomial import polyfit
 from matplotlib.patches import Rectangle
 import sys
+import os
 import random
+import warnings
 import matplotlib as mpl
 
 # external files
 import Functions as f 
 
 # class
-from Bacteria3D import Bacteria3D as bac
+from Population import Population
+from SimParameters import SimulationParameters
+from Boundaries import apply_boundaries, WALLS
+from Tumbling import TumbleSampler
+from RandomStreams import RandomStreams
+from TrajectoryIO import open_writer
+from Observables import save_results
+from Telemetry import Telemetry
+from FusedStep import FusedStepper
 
 plt.rcParams.update({
     'text.usetex': False,
@@ -52,374 +66,328 @@ mpl.rcParams.update(mpl.rcParamsDefault)
 
 ###############################################################################
 
-def main(config_file, output_file, tumble_file, time_file, swimming_file, figure_output_file):
-    
-    # 1. FILE INITIALISING ####################################################
-    
-    # opening config file containing all file paths needed to execute code
-    #config_file = 'test_config.txt' # path to config file
-    file = open(config_file, "r")
-    
-    # reading every entry from configuration file (containing constants etc)
-    config = file.readlines()[1::3]
-    
-    # removing trailing new line (\n)
-    for i in range(len(config)):
-        config[i] = config[i].rstrip()
-    
-    # obtaining file names from config file
-    inputfile_name = config[0]# input data file (containing becterium initial conditions)
-    
-    # Determining length of inputfile = no. bacteria in system   
-    with open(inputfile_name, 'r') as fp:
-        lines = len(fp.readlines()) # no. bacteria present 
+def fixed_steps(params, bacteria, tumbler, stepper=None, orientation_method='euler', position_method='euler', profiler=None):
+    '''
+    Advances a population through every timestep of a simulation, each of
+    length params.dt, yielding after each one so it can be recorded.
+    
+    :param params: SimulationParameters instance (or BatchParameters)
+    :param bacteria: Population instance, changed in place
+    :param tumbler: TumbleSampler instance of the population
+    :param stepper: FusedStepper instance used for every update, numpy methods if None
+    :param profiler: ComponentProfiler instance timing each boundary branch (see Profiling.py), or None
+    
+    :yields i: integer, number of the timestep
+    :yields time: float, time at the end of the timestep [s]
+    :yields state: Population instance, the population at time
+    :yields tumbles: [N] integer array, 1 = bacterium tumbled this timestep
+    :yields hits: [4] integer array, wall hits this timestep (in the order of Boundaries.WALLS)
+    '''
+    
+    time = 0.0
+    dt = params.dt
+    omega = params.omega
+    hits = np.zeros(len(WALLS), dtype=int)
+    
+    for i in range(params.numstep):  # Anything that happens per each timestep 
         
-    fp.close() # close input file to ensure no mess or overwriting
-    
-    infile = open(inputfile_name, "r")# opening input file to use
+        time += dt # establishing current time in simulation
+        
+        # every update below done in one compiled loop over the bacteria
+        if stepper is not None:
+            tumbles = stepper.step(time, hits)
+        
+        else:
+            # velocity terms that depend on the current position of each bacterium
+            bacteria.centripetal_force(params.viscosity_coefficient, params.density, omega, params.centripetal_force)
+            bacteria.rotational_vel(omega)
+            
+            # Update position of every bacterium, using the last velocity, 'exact'
+            # applies the clinostat rotation as a rotation of the planar coordinates
+            bacteria.update_pos(dt, method=position_method, omega=omega)
+            
+            # updating velocity of every bacterium [m/s]
+            bacteria.update_vel(dt, params.diffusion_coefficient)
+            
+            # boundary conditions #####
+            
+            # applying wall and end conditions to every bacterium at once, bacteria
+            # that only reach an end of the clinostat keep their swimming direction
+            swimming, hits = apply_boundaries(bacteria, params.R, params.r, params.H, profiler=profiler)
+            
+            # updating the swimming velocity and saving variables
+            tumbles = tumbler.sample(time, mask=swimming) # does bacterium tumble? 1 = yes, 0 = no
+            bacteria.update_swimming_vel(omega, params.rotational_diffusion_coefficient, dt, tumbles, mask=swimming, method=orientation_method) # updating swimming velocity
+        
+        yield i, time, bacteria, tumbles, hits
 
-    bacteria = [] # will contain instances of Bacteria3D, i.e initial conditions of each bacterium
-    
-    # initialising bacteria instances
-    for i in range(lines):
-        bacteria.append(bac.new_b3d(infile))
+
+def count_escaped(telemetry, pos, outer_squared, profiler=None):
+    '''
+    Counts the bacteria that have left the clinostat (see simulate), only
+    called for the recorded timesteps rather than every timestep.
+    
+    :param telemetry: Telemetry instance counting them as escaped
+    :param pos: [N, 3] float array, positions of the bacteria [m]
+    :param outer_squared: [N] float array, square of the outer radius of the clinostat of each bacterium [m^2]
+    :param profiler: ComponentProfiler instance timing the check (see Profiling.py), or None
+    '''
+    if profiler is not None:
+        profiler.mark()
+    
+    escaped = pos[:, 0]**2 + pos[:, 1]**2 > outer_squared
+    if np.any(escaped):
+        telemetry.count('escaped', escaped)
+    
+    if profiler is not None:
+        profiler.lap('escape check')
+
+
+def simulate(params, bacteria, output_file, tumble_file, time_file, swimming_file, figure_output_file, wall_file=None, tumble_mode='bernoulli', orientation_method='euler', position_method='euler', chunk_size=None, output_format='csv', precision='float64', compress=False, record_every=1, accumulators=None, observables_file=None, writer=None, seed=None, per_cell_streams=False, engine='numpy', adaptive=None, monitor=None, telemetry=None, profiler=None):
+    '''
+    Runs a simulation of a population of bacteria from parameters held in
+    memory, nothing is read from disk. The population is changed in place.
+    
+    :param params: SimulationParameters instance, parameters of the simulation
+    (or a BatchParameters instance, with parameters for each bacterium)
+    :param bacteria: Population instance, initial conditions of each bacterium
+    :param writer: open writer the trajectory is recorded with, used in
+    place of the output files if given
+    :param seed: seed of the run (see RandomStreams.as_seed_sequence), or a
+    list with one seed per configuration of a batch, a new seed if None
+    :param per_cell_streams: boolean, give each bacterium its own random number streams
+    :param engine: string, 'numpy' to advance the population with the numpy
+    methods of Population, or 'numba' to use the compiled fused step (see
+    FusedStep.py), the numpy methods are used if numba isnt installed
+    :param adaptive: AdaptiveTimestep instance, take timesteps of varying
+    length chosen by it (see AdaptiveTimestep.py) with the output still
+    recorded every dt, fixed timesteps of length dt if None
+    :param monitor: ConvergenceMonitor instance (see Observables.py), stop the
+    run or record it less often once the population is stationary, the run
+    always lasts total_time if None
+    :param telemetry: Telemetry instance (see Telemetry.py) reporting the
+    progress of the run and counting its events, e.g Telemetry(quiet=True)
+    for batch sweeps, progress printed every 5s if None
+    :param profiler: ComponentProfiler instance (see Profiling.py) timing each
+    physics component and boundary branch, a summary is printed at the end of
+    the run and saved with the accumulators, nothing is timed if None
+    
+    The other parameters are the same as main.
+    '''
+    
+    # 1. INITIALISING #########################################################
+    
+    lines = len(bacteria) # no. bacteria present
         
     # DEFINING INITIAL CONDITIONS AND CONSTANTS OF CLINOSTAT SYSTEM ###########
         
     # Time parmeters of simulation
     time = 0.0 # [s]
-    dt = float(config[1]) # length of each timestep [s]
-    total_time = float(config[2]) # total length of similation [s]
-    numstep = round(total_time/dt) # number of steps that simulation will take, rounded to int as used as np sizing
+    dt = params.dt # length of each timestep [s]
+    total_time = params.total_time # total length of similation [s]
+    numstep = params.numstep # number of steps that simulation will take, rounded to int as used as np sizing
     
     # clinostat parameters 
-    clino_rotation_rate = float(config[3]) # rotation rate of clinostat [RPM]
-    omega = clino_rotation_rate*2*np.pi/60 # converting rotation rate to angular velocity [rad/s]
+    clino_rotation_rate = params.clino_rotation_rate # rotation rate of clinostat [RPM]
+    omega = params.omega # converting rotation rate to angular velocity [rad/s]
     
     # clinostat parameters
-    R = float(config[4]) # radius of circular face of clinostat [m]
-    H = float(config[5]) # length of clinostat down the z axis [m]
-    r = 0.1E-2
+    R = params.R # radius of circular face of clinostat [m]
+    H = params.H # length of clinostat down the z axis [m]
+    r = params.r # inner radius of circular face of clinostat [m]
     
     # system constants
-    density = float(config[6]) # density of medium in clinostat [kg/m^3]
-    g = float(config[7]) # acceleration due to gravity [m/s^2]
+    density = params.density # density of medium in clinostat [kg/m^3]
+    g = params.g # acceleration due to gravity [m/s^2]
     
-    rotational_diffusion_coefficient = float(config[8]) # inversely proportional to time it takes bacterium to forget direction its travelling in [1/s]
-    viscosity_coefficient = float(config[9]) # viscosity coefficient of clinostat medium at room temp [Pa/s] (water during testing)
-    diffusion_coefficient = float(config[10]) # diffusion coefficient for medium within clinostat at room temp [m^2/s]
+    rotational_diffusion_coefficient = params.rotational_diffusion_coefficient # inversely proportional to time it takes bacterium to forget direction its travelling in [1/s]
+    viscosity_coefficient = params.viscosity_coefficient # viscosity coefficient of clinostat medium at room temp [Pa/s] (water during testing)
+    diffusion_coefficient = params.diffusion_coefficient # diffusion coefficient for medium within clinostat at room temp [m^2/s]
 
-    tumbling_rate = int(config[11]) # how often in a second a bacterium should tumble
-    
-    centripetal_force_status = config[12]
-    print(type(centripetal_force_status))
+    tumbling_rate = params.tumbling_rate # how often in a second a bacterium should tumble
     
-    # We now have a list of bacteria created as point particle instances from
-    # the bacteria3D class 
+    centripetal_force_status = params.centripetal_force # True or False, for each bacterium in a batch
     
     # 2. GENERATING INITIAL CONDITIONS ########################################
     
-    initial_positions = np.zeros([lines, 3])
+    # Saving initial positions
+    initial_positions = np.copy(bacteria.pos)
     
-    # reading inital position of bacteria
-    for i in range(len(bacteria)):        
-            # Saving initial positions
-            initial_positions[i] = bacteria[i].pos
+    # every random number of the simulation is drawn from the streams of the
+    # run, the seed is saved with the output so the run can be replayed
+    bacteria.streams = RandomStreams(lines, seed, groups=bacteria.config_id, per_cell=per_cell_streams, steps=numstep)
 
-    # Storage for data
-    pos_array = np.zeros([lines, numstep, 3]) # xyz position of every bacteria every timestep
-    time_array = np.zeros(numstep)
-    tumble_array = np.zeros(numstep)
-    swim_direction = np.zeros([lines, numstep, 3])
-    
-    # initialising velocity terms
-    for i in range(lines):
-        bacteria[i].terminal_vel(viscosity_coefficient, density, g) # terminal velocity
-        #print('vg = ' + str(bacteria[i].terminal_vel))
-        bacteria[i].rotational_vel(omega, dt) # rotational velocity
+    # Storage for data, positions, swimming directions, tumbles and times of
+    # every bacterium are written to the output files in blocks as the
+    # simulation runs, every record_every timesteps. No trajectory is stored
+    # if output_file is None (e.g when only accumulators are wanted), a writer
+    # that is already open can be given instead (e.g by Batch.py)
+    if writer is None:
+        writer = open_writer(lines, output_file, swimming_file, tumble_file, time_file, output_format=output_format,
+                             dt=dt*record_every, config=dict(params.as_dict(), seed=bacteria.streams.metadata()), precision=precision,
+                             compress=compress, chunk_size=chunk_size)
+    
+    # tumbles and timesteps since the last recorded timestep
+    tumbled = np.zeros(lines, dtype=int)
+    unrecorded = 0
+    
+    # statistics measured while the simulation runs (see Observables.py)
+    if accumulators is None:
+        accumulators = []
+    
+    # the convergence monitor is saved with the other statistics
+    if monitor is not None:
+        monitor.reset(bacteria.config_id, params)
+        accumulators = accumulators + [monitor]
+    
+    wall_hits = np.zeros([numstep, len(WALLS)], dtype=int) # number of bacteria hitting each wall every timestep
+    
+    # path of the first bacterium, kept every nopoints timesteps for plotting
+    nopoints = 50
+    plot_positions = np.zeros([(numstep + nopoints - 1)//nopoints, 3])
+    
+    # timing each component of the run, from the initial velocities on
+    if profiler is not None:
+        profiler.start(bacteria)
+    
+    # the timed wrappers of the profiler are removed even if the run fails
+    try:
         
-        # initial planar position
-        x = initial_positions[i][0]
-        y = initial_positions[i][1]
-        planar_pos = np.array([x, y, 0])
+        # initialising velocity terms of every bacterium
+        bacteria.terminal_vel(viscosity_coefficient, density, g) # terminal velocity
+        bacteria.rotational_vel(omega) # rotational velocity
+        bacteria.centripetal_force(viscosity_coefficient, density, omega, centripetal_force_status) # centripetal velocity
         
-        bacteria[i].centripetal_force(viscosity_coefficient, density, omega, planar_pos, dt, centripetal_force_status) # centripetal velocity
+        # the velocity is used through the next timestep, the length of the
+        # first adaptive timestep is chosen from the initial conditions
+        first_dt = dt if adaptive is None else adaptive.start(params, bacteria, orientation_method, position_method)
+        bacteria.update_vel(first_dt, diffusion_coefficient)
         
-        bacteria[i].update_vel(dt, diffusion_coefficient) # !!! remove if this fix doesnt work
+        # decides which bacteria tumble each timestep, 'bernoulli' tests every
+        # bacterium each timestep, 'scheduled' draws the time of each next tumble
+        tumbler = TumbleSampler(lines, dt, tumbling_rate, mode=tumble_mode, streams=bacteria.streams)
         
+        # compiled step fusing every update of a timestep, if requested and available
+        stepper = None
+        if engine == 'numba':
+            reason = FusedStepper.supports(orientation_method, position_method)
+            if adaptive is not None:
+                reason = 'the fused step only supports a fixed timestep'
+            if reason is None:
+                stepper = FusedStepper(bacteria, tumbler, dt, omega, viscosity_coefficient, density, centripetal_force_status,
+                                       diffusion_coefficient, rotational_diffusion_coefficient, R, r, H, position_method=position_method)
+            else:
+                warnings.warn('using the numpy engine, ' + reason)
+        elif engine != 'numpy':
+            raise ValueError("engine must be 'numpy' or 'numba', not " + str(engine))
         
-    
-    # 3. BEGINNING OF TIME INTEGRATION  #######################################
-    
-    for i in range(numstep):  # Anything that happens per each timestep 
-    
+        if profiler is not None:
+            profiler.start_steps(tumbler, stepper)
         
-        # progress tracking for loop
-        print('Progress: ' + str(i+1) + ' out of ' + str(numstep))
+        # 3. BEGINNING OF TIME INTEGRATION  #######################################
         
-        time += dt # establishing current time in simulation
-        time_array[i] = time # storing current time in simulation
+        # state of the population at every multiple of dt, after each fixed
+        # timestep or interpolated between adaptive timesteps
+        if adaptive is None:
+            steps = fixed_steps(params, bacteria, tumbler, stepper, orientation_method, position_method, profiler)
+        else:
+            steps = adaptive.steps(params, bacteria, tumbler, orientation_method, position_method, profiler)
         
-        for j in range(lines): # Anything for each particle
-  
-            # radius of bacterium
-            a = bacteria[j].rad
-            
-            planar_pos = np.array([bacteria[j].pos[0], bacteria[j].pos[1], 0])
-            #print('inner boundry, new planar magnitude is: ' + str(np.linalg.norm(planar_pos)))
-            bacteria[j].centripetal_force(viscosity_coefficient, density, omega, planar_pos, dt, centripetal_force_status)
-            
-            bacteria[j].rotational_vel(omega, dt)
-            
-            # updating velocity of each bacterium [m/s]
-           # bacteria[j].update_vel(dt, diffusion_coefficient)
-            
-            # # Update position of each bacterium, using updated velocity
-            bacteria[j].update_pos(dt)
-            
-            # updating velocity of each bacterium [m/s]
-            bacteria[j].update_vel(dt, diffusion_coefficient)
-            
-            #
-            #bacteria[j].rotational_vel(omega)
-  
-            # updating velocity of each bacterium [m/s]
-            #bacteria[j].update_vel(dt, diffusion_coefficient)
-            
-            # # Update position of each bacterium, using updated velocity
-            #bacteria[j].update_pos(dt)
-            
-            # Update position of each bacterium, using updated velocity
-            #bacteria[j].update_pos(dt) 
-            #pos_array[j, i] = bacteria[j].pos # store each position
-            
-            # boundary conditions (x & y)
-            
-            #position on a 2D circle (set z = 0)
-            planar_position = bacteria[j].pos - [0, 0, bacteria[j].pos[2]]
-            planar_magnitude = np.linalg.norm(planar_position)
+        decimated = False # recording less often since the population converged
+        i = -1
+        
+        # progress is reported every few seconds rather than every timestep
+        if telemetry is None:
+            telemetry = Telemetry()
+        telemetry.start(numstep)
+        
+        # square of the distance from the axis beyond which a bacterium has
+        # left the clinostat
+        outer_squared = np.square(np.broadcast_to(R, lines))
+        
+        for i, time, state, tumbles, hits in steps:
             
-            # if planar_magnitude > 0.05:
-            #     print(planar_magnitude)
-            #print(planar_magnitude)
+            wall_hits[i] = hits
             
-            # zone where boundry conditions are applied
-            outer_bc_zone = R - a # outer radius minus bacterium radii
-            inner_bc_zone = r + a # inner radius plus bacterium radii
+            # progress tracking for loop
+            telemetry.step()
+            telemetry.count('tumbles', tumbles)
             
-            boundry_conditions = False
+            # updating statistics measured during the run
+            for accumulator in accumulators:
+                accumulator.update(time, state, wall_hits[i])
             
-            if boundry_conditions == False:
+            # record time, positions, swimming directions and tumbles after all
+            # relevant conditions applied, every record_every timesteps
+            tumbled |= tumbles
+            unrecorded += 1
+            if writer is not None and unrecorded == record_every:
+                writer.record(time, state.pos, state.swim_direction, tumbled)
+                tumbled[:] = 0
+                unrecorded = 0
                 
-                # if bacterium position, r, within 1 bacterial radii from the edge, apply boundry conditions
-                if planar_magnitude >= outer_bc_zone:
-                    #print(time)
-                    print('outer boundry, current planar magnitude is :' +str(planar_magnitude))
-                    
-                    # last updated velocity of bacterium
-                    current_vel = bacteria[j].vel # maybe need to use np.copy?
-    
-                    # radial magnitude and direction of the velocity
-                    planar_rad_mag, planar_rad_dir = f.radial_velocity(planar_position, bacteria[j].vel)
-                    
-                    # removing radial component of velocity, i.e setting velocity to its tangential component
-                    bacteria[j].vel = current_vel - (planar_rad_mag*planar_rad_dir)
-                                 
-                    # saving swimming direction for output later
-                    swim_direction[j, i] = bacteria[j].swim_direction # saving swimming direction
-                    
-                    # radial direction of position
-                    rad_dir = np.copy(bacteria[j].pos)
-                    rad_dir[2] = 0
-                    rad_dir /= np.linalg.norm(rad_dir)
-                    
-                    # moving bacterium to outside of boundry condition zone
-                    frac = 0.1   #Fraction of body size to set inside outer_bc_zone (make parameter later)
-                    pos_z = bacteria[j].pos[2] # storing z coord of bacterium
-                    bacteria[j].pos = (R - (1.0 + frac)*a)*rad_dir # setting position to some fraction outside the boundry zone but inside the clinostat, this only sets xy parameters
-                    bacteria[j].pos[2] = pos_z # setting z parameter back to original
-                    #pos_array[j, i] = bacteria[j].pos # storing new position
-                    #print(pos_array[j, i])
-                    
-                    #xs, ys = bacteria[j].pos[0], bacteria[j].pos[1]
-                    
-                    #print(np.linalg.norm([xs, ys]))
-                    
-                    # saving variables for output
-                    
-                    # getting the swimming direciton vector for saving to output.
-                    tumble = bac.tumble_probability(dt, tumbling_rate) # does bacterium tumble? 1 = yes, 0 = no
-                    tumble_array[i] = tumble
-                    bacteria[j].update_swimming_vel(omega, rotational_diffusion_coefficient, dt, tumble) # updating swimming velocity
-                    swim_direction[j, i] = bacteria[j].swim_direction # saving swimming direction
-                    
-                    planar_pos = np.array([bacteria[j].pos[0], bacteria[j].pos[1], 0])
-                    #print('outer boundry, new planar magnitude is: ' + str(np.linalg.norm(planar_pos)))
-                    
-                    #bacteria[j].centripetal_force(viscosity_coefficient, density, omega, planar_pos, dt)
-                                   
-                    # # apply end boundry conditions if applicable, along side wall conditions
-                    
-                    # just before one wall
-                    if bacteria[j].pos[2] >= (H - a): 
-                        
-                        # updating z position and re-recording the position
-                        bacteria[j].pos[2] = H - (2*a)
-                        #pos_array[j, i] = bacteria[j].pos
-                        bacteria[j].vel[2] *= 0
-                    
-                    # close to the other wall
-                    if bacteria[j].pos[2] <= (0 + a):
-                        
-                        # updating z position and re-recording the position
-                        bacteria[j].pos[2] = 0 + (2*a)
-                        #pos_array[j, i] = bacteria[j].pos
-                        bacteria[j].vel[2] *= 0
-                
-                # apply inner wall boundry conditions, if applicable
-                elif planar_magnitude <= inner_bc_zone:
-                    print('inner boundry')
-                    
-                    #print(planar_magnitude, inner_bc_zone)
-                    
-                    # last updated velocity of bacterium
-                    current_vel = bacteria[j].vel
-    
-                    # radial magnitude and direction of the velocity
-                    planar_rad_mag, planar_rad_dir = f.radial_velocity(planar_position, bacteria[j].vel)
-                    
-                    # removing radial component of velocity, i.e setting velocity to its tangential component
-                    bacteria[j].vel = current_vel - (planar_rad_mag*planar_rad_dir)
-                    
-                    # saving swimming direction for output later
-                    swim_direction[j, i] = bacteria[j].swim_direction # saving swimming direction
-                    
-                    # radial direction of position
-                    rad_dir = np.copy(bacteria[j].pos)
-                    rad_dir[2] = 0
-                    rad_dir /= np.linalg.norm(rad_dir) # planar radial unit vector of current position
-                    
-                    # moving bacterium to outside of boundry condition zone
-                    frac = 0.1   #Fraction of body size to set inside inner_bc_zone (make parameter later)
-                    pos_z = bacteria[j].pos[2] # storing z coord of bacterium
-                    bacteria[j].pos = (r + (1.0 + frac)*a)*rad_dir # setting position to some fraction outside the boundry zone but inside the clinostat, this only sets xy parameters
-                    bacteria[j].pos[2] = pos_z # setting z parameter back to original
-                    #pos_array[j, i] = bacteria[j].pos # storing new position
-                    
-                    # # saving variables for output
-                    
-                    # getting the swimming direciton vector for saving to output.
-                    tumble = bac.tumble_probability(dt, tumbling_rate) # does bacterium tumble? 1 = yes, 0 = no
-                    tumble_array[i] = tumble
-                    bacteria[j].update_swimming_vel(omega, rotational_diffusion_coefficient, dt, tumble) # updating swimming velocity
-                    swim_direction[j, i] = bacteria[j].swim_direction # saving swimming direction
-                    
-                    
-                    #planar_pos = np.array([bacteria[j].pos[0], bacteria[j].pos[1], 0])
-                    #print('inner boundry, new planar magnitude is: ' + str(np.linalg.norm(planar_pos)))
-                    #bacteria[j].centripetal_force(viscosity_coefficient, density, omega, planar_pos, dt)
-                    
-                    # apply end boundry conditions if applicable, along side wall conditions
-                    
-                    # just before one wall
-                    if bacteria[j].pos[2] >= (H - a): 
-                        
-                        # updating z position and re-recording the position
-                        bacteria[j].pos[2] = H - (2*a)
-                        #pos_array[j, i] = bacteria[j].pos
-                        
-                        bacteria[j].vel[2] *= 0 #set z velocity to 0
-                    
-                    # close to the other wall
-                    if bacteria[j].pos[2] <= (0 + a):
-                        
-                        # updating z position and re-recording the position
-                        bacteria[j].pos[2] = 0 + (2*a)
-                        #pos_array[j, i] = bacteria[j].pos
-                        
-                        # setting z velocity to be 0, therefore velocity only in xy plane
-                        bacteria[j].vel[2] *= 0
-                
-                # upper z boundry condition
-                elif bacteria[j].pos[2] >= (H - a): 
-                    
-                   # updating z position and re-recording the position
-                   bacteria[j].pos[2] = H - (2*a)
-                   #pos_array[j, i] = bacteria[j].pos
-                   
-                   bacteria[j].vel[2] *= 0
-                 
-                # lower z boundry condition   
-                elif bacteria[j].pos[2] <= (0 + a):
-                    
-                    # updating z position and re-recording the position
-                    bacteria[j].pos[2] = 0 + (2*a)
-                    #pos_array[j, i] = bacteria[j].pos
-                    
-                    bacteria[j].vel[2] *= 0
-                    
-                # dont apply wall boundry conditions
-                else:
-                    #print('no boundry, current planar magnitude is ' + str(planar_magnitude))
-                    
-                    # updating velocity of each bacterium [m/s]
-                    #bacteria[j].update_vel(dt, diffusion_coefficient) - this makes the bacterium spiral outwards
-                    
-                    # # Update position of each bacterium, using updated velocity
-                    #bacteria[j].update_pos(dt) 
-                    #pos_array[j, i] = bacteria[j].pos # store each position
-                    
-                    # updating rotational velocity as it depends on position
-                    #bacteria[j].rotational_vel(omega)
-                    
-                    # get planar positions
-                    x = bacteria[j].pos[0]
-                    y = bacteria[j].pos[1]
-                    
-                    planar_pos = np.array([x, y, 0])
-                    
-                    #bacteria[j].centripetal_force(viscosity_coefficient, density, omega, planar_pos, dt)
-                    
-                    # updating the swimming velocity and saving variables
-                    tumble = bac.tumble_probability(dt, tumbling_rate) # does bacterium tumble? 1 = yes, 0 = no
-                    tumble_array[i] = tumble
-                    
-                    bacteria[j].update_swimming_vel(omega, rotational_diffusion_coefficient, dt, tumble) # updating swimming velocity
-                    swim_direction[j, i] = bacteria[j].swim_direction # saving swimming direction
-           
+                # bacteria outside the clinostat in the recorded rows
+                count_escaped(telemetry, state.pos, outer_squared, profiler)
             
-           
-            #bacteria[j].rotational_vel(omega)
-           
-            # record position after all relevant conditions applied
-            pos_array[j, i] = bacteria[j].pos
+            if i % nopoints == 0:
+                plot_positions[i//nopoints] = state.pos[0]
             
-            # get planar positions
-            x = pos_array[j, i][0]
-            y = pos_array[j, i][1]
-            
-            planar_pos = np.array([x, y, 0])
-            
-            if np.linalg.norm(planar_pos) > 0.05:
-                print(np.linalg.norm(planar_pos))
-            #print(pos_array[j, i])
-          
-           # if statement for inner boundry conditions, including the same thing about the z conditions 
-    
-    #pos_array[0] = pos_array[0][::100]
-    # saving parameters to output file
-    np.savetxt(output_file, pos_array[0], delimiter=",")
-    #np.savetxt(tumble_file, tumble_array, delimiter=",")
-    np.savetxt(time_file, time_array, delimiter=",") # outputting time for ease of analysis
-    #np.savetxt(swimming_file, swim_direction[0], delimiter = ",")
+            # once the population is stationary the rest of the run is cut, or
+            # recorded every decimate times as many timesteps
+            if monitor is not None and monitor.converged:
+                if monitor.action == 'stop':
+                    telemetry.message('Converged at ' + str(time) + 's, stopping')
+                    break
+                if not decimated:
+                    telemetry.message('Converged at ' + str(time) + 's, recording every ' + str(record_every*monitor.decimate) + ' timesteps')
+                    record_every *= monitor.decimate
+                    decimated = True
+                    
+                    # the rows recorded from here on (counted from the last one) are
+                    # further apart, saved as a new segment of the trajectory
+                    if writer is not None:
+                        writer.change_spacing(dt*record_every)
+    
+        # without a trajectory only the final positions are checked
+        if writer is None:
+            count_escaped(telemetry, bacteria.pos, outer_squared, profiler)
+    
+    finally:
+        if profiler is not None:
+            profiler.stop()
+    
+    # timesteps taken, fewer than numstep if the run was stopped early
+    wall_hits = wall_hits[:i + 1]
+    plot_positions = plot_positions[:i//nopoints + 1]
+    
+    # hits on each wall over the whole run
+    for wall, total in zip(WALLS, np.sum(wall_hits, axis=0)):
+        telemetry.count(wall + '_hits', total)
+    telemetry.finish()
+    
+    # time taken by each component of the run
+    if profiler is not None:
+        telemetry.message(profiler.summary())
+        accumulators = accumulators + [profiler]
+    
+    # saving the remaining timesteps to the output files
+    if writer is not None:
+        writer.close()
+    
+    # saving results of the statistics measured during the run
+    if observables_file is not None:
+        save_results(accumulators + [telemetry], observables_file)
+    
+    # number of wall hits each timestep, columns in the order of Boundaries.WALLS
+    if wall_file is not None:
+        np.savetxt(wall_file, wall_hits, delimiter=",", fmt='%d', header=','.join(WALLS))
+    
     # 4. PLOTTING ################################################################
             
-    # plotting path of bacteria
-    nopoints = 50
-    
-    x_coords = pos_array[0,:,0]
-    y_coords = pos_array[0,:,1]
-    z_coords = pos_array[0,:,2]
+    # plotting path of bacteria (every nopoints timesteps)
+    x_coords = plot_positions[:,0]
+    y_coords = plot_positions[:,1]
+    z_coords = plot_positions[:,2]
     
     
     fig, ax = plt.subplots(figsize=(10, 10))
@@ -427,7 +395,7 @@ def main(config_file, output_file, tumble_file, time_file, swimming_file, figure
     #ax.add_patch(cir)
     #cir2 = plt.Circle((0, 0), r, facecolor='white', alpha=1, linewidth=3, linestyle='--', edgecolor='black')#color='darkorange',fill=False)
     #ax.add_patch(cir2)
-    ax.scatter(x_coords[::nopoints], y_coords[::nopoints], s = 15, c = 'navy')
+    ax.scatter(x_coords, y_coords, s = 15, c = 'navy')
     ax.set_xlabel('x (m)')#, fontsize = 30)
     ax.set_ylabel('y (m)')#, fontsize = 30)
     ax.tick_params(axis='x')#, labelsize=20)
@@ -474,6 +442,40 @@ def main(config_file, output_file, tumble_file, time_file, swimming_file, figure
     
     # PUT DPI 
     
+
+def main(config_file, output_file, tumble_file, time_file, swimming_file, figure_output_file, wall_file=None, tumble_mode='bernoulli', orientation_method='euler', position_method='euler', chunk_size=None, output_format='csv', precision='float64', compress=False, record_every=1, accumulators=None, observables_file=None, population=None, seed=None, per_cell_streams=False, engine='numpy', adaptive=None, monitor=None, telemetry=None, profiler=None):
+    '''
+    Runs a simulation from a configuration file (see SimParameters.py for
+    the format) and its initial conditions file.
+    
+    :param config_file: string, path to configuration file, or a
+    SimulationParameters instance so no configuration file is needed
+    :param population: Population instance, initial conditions of each
+    bacterium, if None these are read from the initial conditions file named in
+    the configuration. The population is changed in place.
+    
+    Every other parameter is passed on to simulate.
+    '''
+    
+    # reading every entry from configuration file (containing constants etc)
+    if isinstance(config_file, SimulationParameters):
+        params = config_file
+    else:
+        params = SimulationParameters.from_config_file(config_file)
+    
+    # reading the initial conditions of every bacterium into one population,
+    # each property of the population is stored as an array (one row per bacterium)
+    if population is None:
+        with open(params.initial_conditions_file, 'r') as infile:
+            population = Population.new_population(infile) # instance of Population, i.e initial conditions of each bacterium
+    
+    simulate(params, population, output_file, tumble_file, time_file, swimming_file, figure_output_file, wall_file=wall_file,
+             tumble_mode=tumble_mode, orientation_method=orientation_method, position_method=position_method,
+             chunk_size=chunk_size, output_format=output_format, precision=precision, compress=compress,
+             record_every=record_every, accumulators=accumulators, observables_file=observables_file,
+             seed=seed, per_cell_streams=per_cell_streams, engine=engine, adaptive=adaptive, monitor=monitor, telemetry=telemetry,
+             profiler=profiler)
+    
 # Execute main method, but only when directly invoked
 if __name__ == "__main__":
     
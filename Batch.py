@@ -0,0 +1,110 @@
+'''
+This script contains the functions used to run many simulations of a sweep
+(e.g every omega and g of experiment 3, each repeated 20 times) together as
+one population, so the whole sweep advances in a single loop over timesteps.
+
+The population of every run is joined into one Population, each bacterium
+is tagged with the run it belongs to (config_id) and every parameter that
+differs between runs (rotation rate, gravity, swimming speed, diffusion,
+tumbling, ...) is stored as an array with one value per bacterium
+(SimParameters.BatchParameters). The timestep, simulation length and size
+of the clinostat must be the same for every run of a batch.
+
+The trajectory of each run is written to its own output folder, in the
+same format as a run of BacStroke.main. Each run keeps its own random
+number streams (see RandomStreams.py), seeded by its job, so a run gives
+the same result bit for bit whether it is simulated in a batch or alone.
+
+Jobs are built in the same way as for a parallel sweep (ParallelSweep.sweep_jobs).
+'''
+
+# Imports #####################################################################
+
+# modules
+import numpy as np
+import os
+
+# class
+from Population import Population
+from SimParameters import BatchParameters
+from TrajectoryIO import open_writer, SplitTrajectoryWriter
+from RandomStreams import seed_metadata
+from ParallelSweep import prepare_job
+
+###############################################################################
+
+
+def run_batch(jobs, batch_size=None, **options):
+    '''
+    Runs every job that doesnt already have its output, batch_size jobs at a
+    time as one population.
+
+    :param jobs: list of ParallelSweep.Job instances, e.g from ParallelSweep.sweep_jobs
+    :param batch_size: integer, number of jobs simulated together, all if None
+    :param options: any other keyword arguments of BacStroke.simulate, the
+    same for every job (e.g tumble_mode, record_every, accumulators), the
+    output format is set by each job
+
+    :returns n_run: integer, number of jobs run
+    '''
+    # imported here as BacStroke sets up plotting when imported
+    import BacStroke as bac
+
+    if 'output_format' in options:
+        raise ValueError('the output format of each run is set by its job, e.g sweep_jobs(..., output_format=...)')
+
+    # skipping runs that have already been simulated
+    pending = [job for job in jobs if not job.is_complete()]
+    print(str(len(jobs) - len(pending)) + ' of ' + str(len(jobs)) + ' runs already complete')
+
+    if len(pending) == 0:
+        return 0
+
+    if batch_size is None:
+        batch_size = len(pending)
+
+    batches = [pending[i:i + batch_size] for i in range(0, len(pending), batch_size)]
+
+    for batch in batches:
+
+        # initial population of each run, sampling its starting conditions if needed
+        populations = [prepare_job(job) for job in batch]
+
+        # every run as one population, with the parameters of each bacterium
+        bacteria = Population.concatenate(populations)
+        params = BatchParameters([job.params for job in batch], [len(population) for population in populations])
+
+        # output files of each run, in the same format as BacStroke.main
+        writers = []
+        for job, population in zip(batch, populations):
+
+            if not os.path.isdir(job.output_folder):
+                os.makedirs(job.output_folder)
+
+            # output left by an earlier attempt of the run that didnt finish
+            job.remove_output()
+            job.mark_started()
+
+            writers.append(open_writer(len(population), job.output_path('positions.csv'), job.output_path('swimming_direction.csv'),
+                                       job.output_path('tumbles.csv'), job.output_path('time.csv'),
+                                       output_format=job.output_format,
+                                       dt=job.params.dt*options.get('record_every', 1), config=dict(job.params.as_dict(), seed=seed_metadata(job.seed)),
+                                       precision=options.get('precision', 'float64'), compress=options.get('compress', False),
+                                       chunk_size=options.get('chunk_size')))
+
+        try:
+            bac.simulate(params, bacteria, None, None, None, None, None,
+                         writer=SplitTrajectoryWriter(writers, bacteria.config_id),
+                         seed=[job.seed for job in batch], **options)
+
+        except Exception:
+            # removing partial output so the runs arent skipped on a restart
+            for job in batch:
+                job.remove_output()
+            raise
+
+        # only reached once the output of every run of the batch is closed
+        for job in batch:
+            job.mark_complete()
+
+    return len(pending)
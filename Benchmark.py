@@ -0,0 +1,382 @@
+'''
+This script measures the throughput of BacStroke: steps per second of the
+simulation for populations of different sizes and physics components, and
+the time taken by the analysis (OptimisedMSD, SteadyState) and by writing
+and reading trajectories in each output format. The results are written to
+a json file, and two result files can be compared (compare) to find
+regressions, e.g before and after a change:
+
+    python Benchmark.py benchmark.json
+    python Benchmark.py new.json benchmark.json   (also compares to benchmark.json)
+    python Benchmark.py quick.json --quick          (small sizes, to check it runs)
+
+Simulation benchmarks use the parameters of a configuration file
+(config.txt) with each physics component switched on or off:
+
+    config:         the parameters as they are in the configuration file
+    all:            every component on (components switched off in the
+                    configuration file use the values in DEFAULTS)
+    no_<component>: every component on except one
+
+The components are rotation, gravity, diffusion, rotational_diffusion,
+tumbling, centripetal and swimming. Steps per second are measured over the
+time integration only (see Telemetry.py), not the set up of the run. The
+number of steps of each run is chosen so every size takes a similar time.
+
+Analysis and output benchmarks use synthetic trajectories (random walks),
+written to a temporary folder that is removed afterwards.
+'''
+
+# Imports #####################################################################
+
+# modules
+import numpy as np
+import subprocess
+import platform
+import tempfile
+import time
+import json
+import sys
+import os
+
+# external files
+from SimParameters import SimulationParameters
+from InitialConditions import new_population
+from Telemetry import Telemetry
+from TrajectoryIO import TrajectoryWriter, BinaryTrajectoryWriter, Trajectory, load_positions
+
+###############################################################################
+
+# values used for components that are switched off in the configuration file
+DEFAULTS = {'clino_rotation_rate': 5.0,
+            'g': 9.81,
+            'diffusion_coefficient': 2E-10,
+            'rotational_diffusion_coefficient': 0.15,
+            'tumbling_rate': 1.0,
+            'centripetal_force': True,
+            'swimming_vel': 2E-5}
+
+# parameter (or swimming speed) switched off for each component
+COMPONENTS = {'rotation': 'clino_rotation_rate',
+              'gravity': 'g',
+              'diffusion': 'diffusion_coefficient',
+              'rotational_diffusion': 'rotational_diffusion_coefficient',
+              'tumbling': 'tumbling_rate',
+              'centripetal': 'centripetal_force',
+              'swimming': 'swimming_vel'}
+
+SIZES = (1, 100, 10**4, 10**6)
+
+
+def component_variants(params, swimming_vel):
+    '''
+    Parameters and swimming speed of every variant of a configuration (see top of file).
+
+    :param params: SimulationParameters instance, parameters of the configuration file
+    :param swimming_vel: float, swimming speed of the initial conditions file [m/s]
+
+    :returns variants: dictionary, (SimulationParameters, swimming speed) of each variant
+    '''
+    values = dict(params.as_dict(), swimming_vel=swimming_vel)
+    variants = {'config': dict(values)}
+
+    # every component on, with a default value if it is off in the configuration file
+    every = dict(values)
+    for name in COMPONENTS.values():
+        if not every[name]:
+            every[name] = DEFAULTS[name]
+    variants['all'] = every
+
+    for component, name in COMPONENTS.items():
+        variants['no_' + component] = dict(every, **{name: False if name == 'centripetal_force' else 0.0})
+
+    return {variant: (SimulationParameters(**{key: value for key, value in values.items() if key != 'swimming_vel'}),
+                      values['swimming_vel'])
+            for variant, values in variants.items()}
+
+
+def steps_for_size(n, cell_steps=2*10**6, min_steps=5, max_steps=2000):
+    '''
+    Number of steps timed for a population of n bacteria, so every size
+    takes a similar time.
+    '''
+    return int(np.clip(cell_steps//n, min_steps, max_steps))
+
+
+def bench_simulation(config_file='config.txt', sizes=SIZES, variants=None, engines=('numpy',), cell_steps=2*10**6, seed=1):
+    '''
+    Steps per second of the simulation for each population size, variant and engine.
+
+    :param config_file: string, path to configuration file
+    :param sizes: tuple of integers, numbers of bacteria
+    :param variants: list of strings, variants to run (see top of file), all if None
+    :param engines: tuple of strings, engines of BacStroke.simulate ('numpy', 'numba')
+    :param cell_steps: integer, bacteria x steps of each run (see steps_for_size)
+    :param seed: integer, seed of the starting positions and of every run
+
+    :returns results: list of dictionaries, one per run
+    '''
+    # imported here as BacStroke sets up plotting when imported
+    import matplotlib.pyplot as plt
+    import BacStroke as bac
+
+    params = SimulationParameters.from_config_file(config_file)
+
+    # mass, radius and swimming speed of the first bacterium of the initial conditions file
+    mass, radius, _, _, _, swimming_vel = np.loadtxt(params.initial_conditions_file, ndmin=2)[0]
+
+    all_variants = component_variants(params, swimming_vel)
+    variants = list(all_variants) if variants is None else variants
+
+    results = []
+    for n in sizes:
+
+        steps = steps_for_size(n, cell_steps)
+        population = new_population(n, mass, radius, 0.0, (params.r, params.R, params.H),
+                                     rng=np.random.default_rng(seed))
+
+        for variant in variants:
+            variant_params, speed = all_variants[variant]
+            variant_params = variant_params.copy(total_time=steps*variant_params.dt)
+
+            for engine in engines:
+
+                bacteria = population.copy()
+                bacteria.swim[:] = speed
+                np.multiply(bacteria.swim[:, None], bacteria.swim_direction, out=bacteria.swim_vel)
+
+                telemetry = Telemetry(quiet=True)
+                bac.simulate(variant_params, bacteria, None, None, None, None, None, seed=seed,
+                             engine=engine, telemetry=telemetry)
+                plt.close('all')
+
+                rate = float(telemetry.result()['steps_per_second'])
+                results.append({'benchmark': 'simulation', 'variant': variant, 'engine': engine, 'size': n,
+                                'steps': steps, 'steps_per_second': rate, 'cell_steps_per_second': rate*n})
+
+    return results
+
+
+def best_time(function, repeats=3):
+    '''
+    Shortest time taken by a function over several calls [s].
+    '''
+    best = np.inf
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+
+    return best
+
+
+def random_walk(steps, n=1, dt=0.1, seed=1):
+    '''
+    Synthetic trajectory of n bacteria, a random walk started on the y axis.
+
+    :returns times, positions: [steps] float array, [steps, n, 3] float array
+    '''
+    rng = np.random.default_rng(seed)
+    positions = np.cumsum(rng.normal(0, 1E-5, size=(steps, n, 3)), axis=0)
+    positions[:, :, 1] += 2E-2
+
+    return dt*np.arange(1, steps + 1), positions
+
+
+def write_trajectory(writer, times, positions):
+    '''
+    Records a synthetic trajectory with a trajectory writer and closes it.
+    '''
+    for time_value, position in zip(times, positions):
+        writer.record(time_value, position)
+    writer.close()
+
+
+def bench_io(folder, sizes=((10**5, 1), (10**3, 100)), repeats=3):
+    '''
+    Time taken to write and read trajectories as csv and binary.
+
+    :param folder: string, folder the trajectories are written to
+    :param sizes: tuple of (steps, bacteria) of each trajectory
+
+    :returns results: list of dictionaries
+    '''
+    results = []
+    for steps, n in sizes:
+
+        times, positions = random_walk(steps, n)
+        csv_path = os.path.join(folder, 'io_positions.csv')
+        binary_path = os.path.join(folder, 'io_positions.traj')
+        megabytes = positions.nbytes/10**6
+
+        timings = {'csv_write': lambda: write_trajectory(TrajectoryWriter(n, csv_path), times, positions),
+                   'binary_write': lambda: write_trajectory(BinaryTrajectoryWriter(n, binary_path, dt=0.1), times, positions),
+                   'csv_read': lambda: load_positions(csv_path, n - 1),
+                   'binary_read': lambda: np.sum(Trajectory(binary_path)['positions'])}
+
+        for name, function in timings.items():
+            seconds = best_time(function, repeats)
+            results.append({'benchmark': 'io', 'variant': name, 'size': n, 'steps': steps,
+                            'seconds': seconds, 'megabytes_per_second': megabytes/seconds})
+
+    return results
+
+
+def bench_msd(folder, lengths=(10**4, 10**5), repeats=3):
+    '''
+    Time taken by OptimisedMSD.main (reading a csv trajectory, MSD and MQD at every lag).
+
+    :param folder: string, folder the trajectories are written to
+    :param lengths: tuple of integers, number of positions of each trajectory
+
+    :returns results: list of dictionaries
+    '''
+    import OptimisedMSD
+
+    results = []
+    for length in lengths:
+
+        times, positions = random_walk(length)
+        positions_file = os.path.join(folder, 'msd_positions.csv')
+        time_file = os.path.join(folder, 'msd_time.csv')
+        write_trajectory(TrajectoryWriter(1, positions_file, time_file=time_file), times, positions)
+
+        seconds = best_time(lambda: OptimisedMSD.main(positions_file, time_file, os.path.join(folder, 'msd.csv'),
+                                                     1, None, 0.1), repeats)
+        results.append({'benchmark': 'msd', 'variant': 'OptimisedMSD.main', 'size': 1, 'steps': length,
+                        'seconds': seconds})
+
+    return results
+
+
+def bench_steady_state(folder, runs=20, steps=10**4, n=10, repeats=3):
+    '''
+    Time taken by SteadyState.steady_state to build the y/r matrices of a
+    configuration from binary runs, and to measure again from the matrices.
+
+    :param folder: string, folder the runs are written to
+    :param runs: integer, number of runs of the configuration
+    :param steps: integer, number of positions of each run
+    :param n: integer, number of bacteria of each run
+
+    :returns results: list of dictionaries
+    '''
+    import SteadyState
+
+    run_paths = []
+    for k in range(runs):
+        run_path = os.path.join(folder, 'steady_state', 'run_' + str(k))
+        times, positions = random_walk(steps, n, seed=k)
+        write_trajectory(BinaryTrajectoryWriter(n, os.path.join(run_path, 'positions.traj'), dt=0.1), times, positions)
+        run_paths.append(run_path)
+
+    cache_folder = os.path.join(folder, 'steady_state', 'steady_state_cache')
+    build = best_time(lambda: SteadyState.build_cache(run_paths, cache_folder), repeats)
+    measure = best_time(lambda: SteadyState.steady_state(run_paths, cache_folder), repeats)
+
+    return [{'benchmark': 'steady_state', 'variant': 'build_cache', 'size': runs*n, 'steps': steps, 'seconds': build},
+            {'benchmark': 'steady_state', 'variant': 'cached', 'size': runs*n, 'steps': steps, 'seconds': measure}]
+
+
+def metadata():
+    '''
+    Description of the machine and code the benchmarks were run on.
+    '''
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        commit = ''
+
+    return {'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'commit': commit,
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'processor': platform.processor(),
+            'cpus': os.cpu_count()}
+
+
+def run_benchmarks(output_file, config_file='config.txt', sizes=SIZES, variants=None, engines=('numpy',), quick=False):
+    '''
+    Runs every benchmark and writes the results to a json file.
+
+    :param output_file: string, path to output json file
+    :param config_file: string, path to configuration file of the simulation benchmarks
+    :param sizes: tuple of integers, population sizes of the simulation benchmarks
+    :param variants: list of strings, variants of the simulation benchmarks, all if None
+    :param engines: tuple of strings, engines of the simulation benchmarks
+    :param quick: boolean, smaller sizes and fewer repeats (e.g to check the benchmarks run)
+
+    :returns results: dictionary, metadata and list of results
+    '''
+    repeats = 1 if quick else 3
+    if quick:
+        sizes = tuple(size for size in sizes if size <= 100)
+
+    results = bench_simulation(config_file, sizes, variants, engines, cell_steps=10**4 if quick else 2*10**6)
+
+    with tempfile.TemporaryDirectory() as folder:
+        results += bench_io(folder, ((10**3, 1), (10**2, 10)) if quick else ((10**5, 1), (10**3, 100)), repeats)
+        results += bench_msd(folder, (10**3,) if quick else (10**4, 10**5), repeats)
+        results += bench_steady_state(folder, *((4, 10**3, 2) if quick else (20, 10**4, 10)), repeats=repeats)
+
+    output = {'metadata': metadata(), 'results': results}
+    with open(output_file, 'w') as file:
+        json.dump(output, file, indent=1)
+
+    return output
+
+
+def result_key(result):
+    '''
+    Identifies the same benchmark in two result files.
+    '''
+    return (result['benchmark'], result['variant'], result.get('engine'), result['size'], result['steps'])
+
+
+def result_rate(result):
+    '''
+    Throughput of a benchmark, higher is faster.
+    '''
+    return result['steps_per_second'] if 'steps_per_second' in result else 1/result['seconds']
+
+
+def compare(new_file, old_file, threshold=0.9):
+    '''
+    Compares two result files, printing the speed of every benchmark in
+    new_file relative to old_file and flagging those slower than threshold.
+
+    :param new_file: string, path to new results
+    :param old_file: string, path to results to compare to
+    :param threshold: float, new/old throughput below which a benchmark is a regression
+
+    :returns regressions: list of tuples, (benchmark key, new/old throughput)
+    '''
+    with open(new_file, 'r') as file:
+        new = {result_key(result): result for result in json.load(file)['results']}
+    with open(old_file, 'r') as file:
+        old = {result_key(result): result for result in json.load(file)['results']}
+
+    regressions = []
+    for key in sorted(set(new) & set(old), key=str):
+        ratio = result_rate(new[key])/result_rate(old[key])
+        flag = ' REGRESSION' if ratio < threshold else ''
+        print(' '.join(str(part) for part in key if part is not None) + ': ' + format(ratio, '.2f') + 'x' + flag)
+        if ratio < threshold:
+            regressions.append((key, ratio))
+
+    return regressions
+
+
+# Execute main method, but only when directly invoked
+if __name__ == "__main__":
+
+    # output file, then an earlier result file to compare to, --quick for a short run
+    files = [argument for argument in sys.argv[1:] if not argument.startswith('--')]
+    output_file = files[0] if len(files) > 0 else 'benchmark.json'
+
+    run_benchmarks(output_file, quick='--quick' in sys.argv)
+
+    if len(files) > 1:
+        compare(output_file, files[1])
@@ -0,0 +1,132 @@
+'''
+This script contains the boundary conditions of the clinostat. The clinostat
+is an annulus (inner radius r, outer radius R) on its circular face and has
+length H down the z axis.
+
+The boundary conditions are applied to a whole Population (see Population.py)
+at once using boolean masks, rather than checking each bacterium in turn:
+
+    Outer wall: bacteria with planar radius >= R - a are moved back to
+                R - (1 + frac)a and the radial part of their velocity removed.
+    Inner wall: bacteria with planar radius <= r + a are moved back to
+                r + (1 + frac)a and the radial part of their velocity removed.
+    Ends:       bacteria with z >= H - a are moved to H - 2a, bacteria with
+                z <= a are moved to 2a, and their z velocity set to 0.
+
+where a is the radius of each bacterium.
+'''
+
+# Imports #####################################################################
+
+# modules
+import numpy as np
+
+###############################################################################
+
+# names of each boundary, in the order their wall hits are counted
+WALLS = ('outer', 'inner', 'upper', 'lower')
+
+
+def move_from_wall(bacteria, wall, distance, planar, planar_magnitude):
+    '''
+    Moves the bacteria at one of the walls back to a distance from the axis
+    and removes the radial component of their velocity.
+
+    :param bacteria: Population instance, positions and velocities are changed in place
+    :param wall: [N] boolean array, True for bacteria at the wall
+    :param distance: [N] float array, distance from the axis each bacterium is moved to [m]
+    :param planar: [N, 2] float array, planar position of every bacterium (a view of bacteria.pos)
+    :param planar_magnitude: [N] float array, planar radius of every bacterium before any moves
+    '''
+
+    # planar radial unit vector of each bacterium at the wall
+    rad_dir = planar[wall]/planar_magnitude[wall, None]
+
+    # removing radial component of velocity, i.e setting velocity to its tangential component
+    vel = bacteria.vel[wall]
+    rad_mag = np.sum(rad_dir*vel[:, :2], axis=1)
+    vel[:, :2] -= rad_mag[:, None]*rad_dir
+    bacteria.vel[wall] = vel
+
+    # moving bacteria to some fraction outside the boundry zone but inside
+    # the clinostat, this only sets xy parameters
+    bacteria.pos[wall, :2] = distance[wall][:, None]*rad_dir
+
+
+def apply_boundaries(bacteria, R, r, H, frac=0.1, profiler=None):
+    '''
+    Applies the wall and end boundary conditions of the clinostat to every
+    bacterium in a population.
+
+    :param bacteria: Population instance, positions and velocities are changed in place
+    :param R: float, outer radius of clinostat [m]
+    :param r: float, inner radius of clinostat [m]
+    :param H: float, length of clinostat down the z axis [m]
+    :param frac: float, fraction of body size to set inside the boundary zone
+    :param profiler: Profiling.ComponentProfiler instance timing each branch, or None
+
+    :returns swimming: [N] boolean array, False for bacteria that only reached
+    an end of the clinostat (these keep their swimming direction this timestep)
+    :returns hits: [4] integer array, number of bacteria that hit each wall,
+    in the order of WALLS
+    '''
+
+    if profiler is not None:
+        profiler.mark()
+
+    # radius of each bacterium
+    a = bacteria.rad
+
+    # planar position and its magnitude (position on the circular face)
+    planar = bacteria.pos[:, :2]
+    planar_magnitude = np.sqrt(planar[:, 0]**2 + planar[:, 1]**2)
+
+    # bacteria within 1 bacterial radii from the outer or the inner wall
+    outer = planar_magnitude >= (R - a)
+    inner = ~outer & (planar_magnitude <= (r + a))
+    radial = outer | inner
+
+    # bacteria within 1 bacterial radii from either end, before any moves
+    z = bacteria.pos[:, 2]
+    ends = (z >= (H - a)) | (z <= (0 + a))
+
+    if profiler is not None:
+        profiler.lap('boundaries: masks')
+
+    # WALLS ###################################################################
+
+    # each wall on its own, a bacterium is never at both
+    if np.any(outer):
+        move_from_wall(bacteria, outer, np.broadcast_to(R - (1.0 + frac)*a, outer.shape), planar, planar_magnitude)
+
+        if profiler is not None:
+            profiler.lap('boundaries: outer')
+
+    if np.any(inner):
+        move_from_wall(bacteria, inner, np.broadcast_to(r + (1.0 + frac)*a, inner.shape), planar, planar_magnitude)
+
+        if profiler is not None:
+            profiler.lap('boundaries: inner')
+
+    # ENDS ####################################################################
+
+    # just before one end
+    upper = z >= (H - a)
+    z[upper] = (H - (2*a))[upper]
+
+    # close to the other end, for bacteria only at an end this is only checked
+    # if they were not at the upper end
+    lower = (radial | ~upper) & (z <= (0 + a))
+    z[lower] = (0 + (2*a))[lower]
+
+    # setting z velocity to be 0, therefore velocity only in xy plane
+    bacteria.vel[upper | lower, 2] = 0
+
+    if profiler is not None:
+        profiler.lap('boundaries: ends')
+
+    # number of bacteria at each wall this timestep
+    hits = np.array([np.count_nonzero(outer), np.count_nonzero(inner),
+                     np.count_nonzero(upper), np.count_nonzero(lower)])
+
+    return radial | ~ends, hits
@@ -0,0 +1,254 @@
+"""
+Generate the ensemble MSD of each configuration.
+
+For every configuration folder (containing one folder per run), the MSD, MQD
+and non gaussian parameter of every bacterium of every run are calculated at
+log spaced lagtimes, along with their averages over the bacteria of each run
+and over every bacterium of the configuration (the ensemble). The result of
+each configuration is written to a single file, ensemble_MSD.npz, inside the
+configuration folder, holding:
+
+    lags:       lags in timesteps
+    lagtimes:   lags in s
+    runs:       names of the run folders used
+    counts:     number of bacteria of each run
+    MSD, MQD, alpha2:                   per run values, [runs, lags]
+    ensemble_MSD, ensemble_MQD, ensemble_alpha2: ensemble values, [lags]
+    MSD_sem:    standard error of the ensemble MSD over every bacterium, [lags]
+
+Log spaced lags keep a few hundred lagtimes per configuration, so the whole
+trajectory can be used without skipping positions. Runs are read one at a
+time, a block of bacteria at a time (rotational_transform.iter_positions),
+and added to running sums, so only one block is held in memory.
+
+Only the evenly spaced rows at the start of each run are used, runs that
+were recorded less often once they converged (see TrajectoryIO.even_rows)
+are cut where the spacing changed.
+"""
+
+### imports
+
+import numpy as np
+import os
+
+from FastMSD import msd_fft, mqd_direct
+from TrajectoryIO import trajectory_path, is_binary_trajectory, load_times, even_rows
+from rotational_transform import iter_positions
+from SteadyState import run_shape
+
+###
+
+
+def log_lags(no_pos, points=200):
+    '''
+    Log spaced lags (in timesteps) between 1 and no_pos - 1, with no repeats.
+
+    Parameters
+    ----------
+    no_pos : integer
+        number of positions in the trajectory.
+    points : integer
+        maximum number of lags.
+
+    Returns
+    -------
+    lags : numpy array of integers
+
+    '''
+    if no_pos < 2:
+        return np.zeros(0, dtype=int)
+
+    return np.unique(np.geomspace(1, no_pos - 1, points).astype(int))
+
+
+def alpha2(MSD, MQD, d=3):
+    '''
+    Non gaussian parameter (same definition as Additional_tests/PlotMSD.py).
+
+    Parameters
+    ----------
+    MSD : numpy array
+        mean square displacement values.
+    MQD : numpy array
+        mean quartic displacement values, same length and order as MSD.
+    d : integer
+        dimensionality of system.
+
+    Returns
+    -------
+    NGP : numpy array of non gaussian parameters (nan where MSD is 0)
+
+    '''
+    factor = (d+2)/d
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        NGP = (MQD/(factor*MSD**2)) - 1
+
+    return NGP
+
+
+def run_timestep(run_path, dt=None):
+    '''
+    Timestep between the first recorded positions of a run, from its binary
+    trajectory or time.csv file, or dt if neither is found.
+    '''
+    positions_path = trajectory_path(run_path)
+
+    if is_binary_trajectory(positions_path):
+        times = load_times(positions_path)
+    elif os.path.isfile(os.path.join(run_path, 'time.csv')):
+        times = load_times(os.path.join(run_path, 'time.csv'))
+    else:
+        times = []
+
+    if len(times) > 1:
+        return float(times[1] - times[0])
+
+    return dt
+
+
+def bacteria_blocks(path, no_pos, n, values=10**7):
+    '''
+    Positions of every bacterium of a run, a block of bacteria at a time.
+
+    Parameters
+    ----------
+    path : string
+        path to a positions csv file or a binary trajectory folder.
+    no_pos : integer
+        number of recorded timesteps used (the run is cut to this length).
+    n : integer
+        number of bacteria of the run.
+    values : integer
+        number of values in each block, at least one bacterium per block.
+
+    Yields
+    ------
+    positions : numpy array
+        [no_pos, bacteria, 3] positions of a block of bacteria.
+
+    '''
+    block = max(1, values//(3*max(no_pos, 1)))
+
+    for start in range(0, n, block):
+        bacteria = slice(start, min(start + block, n))
+
+        # every recorded timestep of the block, streamed in chunks of timesteps
+        positions = []
+        rows = 0
+        for times, chunk in iter_positions(path, bacteria=bacteria):
+            positions.append(chunk[:no_pos - rows])
+            rows += len(positions[-1])
+            if rows >= no_pos:
+                break
+
+        yield np.concatenate(positions)
+
+
+def ensemble_msd(run_paths, dt=None, points=200):
+    '''
+    MSD, MQD and non gaussian parameter of each run (averaged over its
+    bacteria) and of the ensemble of every bacterium at log spaced lagtimes.
+
+    Parameters
+    ----------
+    run_paths : list of strings
+        paths to the run folders of one configuration.
+    dt : float
+        timestep of the positions, only used if a run has no time data.
+    points : integer
+        maximum number of log spaced lags.
+
+    Returns
+    -------
+    results : dictionary of numpy arrays (see top of file)
+
+    '''
+    # trajectories are cut to the length of the shortest run (or its evenly
+    # spaced rows) so that every run has the same lags, the shapes are found
+    # without reading the positions
+    paths = [trajectory_path(path) for path in run_paths]
+    shapes = [run_shape(path) for path in paths]
+    rows = [even_rows(path)[0] for path in paths]
+    no_pos = min(shape[0] if even is None else min(shape[0], even) for shape, even in zip(shapes, rows))
+    counts = np.array([shape[1] for shape in shapes])
+    lags = log_lags(no_pos, points)
+
+    MSD = np.zeros([len(run_paths), len(lags)])
+    MQD = np.zeros([len(run_paths), len(lags)])
+
+    # sum of the square of the MSD of every bacterium, for the standard error
+    MSD_square = np.zeros(len(lags))
+
+    for i, path in enumerate(paths):
+        for positions in bacteria_blocks(path, no_pos, counts[i]):
+            for b in range(positions.shape[1]):
+                bacterium_MSD = msd_fft(positions[:, b])[lags]
+                MSD[i] += bacterium_MSD
+                MQD[i] += mqd_direct(positions[:, b], lags)
+                MSD_square += bacterium_MSD**2
+
+    # ensemble averages over every bacterium, then averages over the bacteria of each run
+    total = np.sum(counts)
+    ensemble_MSD = np.sum(MSD, axis=0)/total
+    ensemble_MQD = np.sum(MQD, axis=0)/total
+    MSD_sem = np.sqrt(np.maximum(MSD_square/total - ensemble_MSD**2, 0)/total)
+
+    MSD /= counts[:, None]
+    MQD /= counts[:, None]
+
+    timestep = run_timestep(run_paths[0], dt)
+
+    return {'lags': lags,
+            'lagtimes': lags*timestep if timestep is not None else lags*np.nan,
+            'runs': np.array([os.path.basename(os.path.normpath(path)) for path in run_paths]),
+            'counts': counts,
+            'MSD': MSD,
+            'MQD': MQD,
+            'alpha2': alpha2(MSD, MQD),
+            'ensemble_MSD': ensemble_MSD,
+            'ensemble_MQD': ensemble_MQD,
+            'ensemble_alpha2': alpha2(ensemble_MSD, ensemble_MQD),
+            'MSD_sem': MSD_sem}
+
+
+def main(config_folders, dt=None, points=200, output_name='ensemble_MSD.npz'):
+    '''
+    Writes the ensemble MSD file of every configuration folder inside
+    config_folders, configurations that already have one are skipped.
+
+    Parameters
+    ----------
+    config_folders : string
+        path to folder containing one folder per configuration.
+    dt : float
+        timestep of the positions, only used if a run has no time data.
+    points : integer
+        maximum number of log spaced lags.
+    output_name : string
+        name of the output file written inside each configuration folder.
+
+    '''
+    config_list = sorted(os.listdir(config_folders))
+
+    # for each congfiguration folder
+    for config in config_list:
+
+        path_to_config = os.path.join(config_folders, config)
+        output_file = os.path.join(path_to_config, output_name)
+
+        if not os.path.isdir(path_to_config) or os.path.isfile(output_file):
+            continue
+
+        # every run folder of the configuration
+        run_paths = [os.path.join(path_to_config, run) for run in sorted(os.listdir(path_to_config))
+                     if os.path.exists(trajectory_path(os.path.join(path_to_config, run)))]
+
+        if len(run_paths) == 0:
+            continue
+
+        np.savez(output_file, **ensemble_msd(run_paths, dt, points))
+
+
+if __name__ == "__main__":
+    main('D:/Kenzie_Mphys/Data/Exp2/Raw2/', dt=0.1)
@@ -0,0 +1,287 @@
+"""
+This file contains the functions used to calculate the mean square
+displacement (MSD) and mean quartic displacement (MQD) of a trajectory for
+every lagtime at once.
+
+For a trajectory of n positions r_0 ... r_n-1 and a lag of k steps:
+
+    MSD[k] = mean over i of |r_i+k - r_i|^2
+    MQD[k] = mean over i of |r_i+k - r_i|^4
+
+which are the same values as the double loop previously used in
+OptimisedMSD.py.
+
+The MSD is calculated with the FFT algorithm, expanding
+|r_i+k - r_i|^2 = |r_i+k|^2 + |r_i|^2 - 2 r_i+k·r_i, the first two terms are
+sums found from cumulative sums and the last is the autocorrelation of the
+trajectory, found with a fast fourier transform. This takes O(n log n)
+operations instead of O(n^2).
+
+The same expansion of the MQD is dominated by rounding errors at short
+lagtimes (each term is many orders of magnitude larger than the MQD), so the
+MQD is calculated directly, vectorised over every start time of each lag, for
+short lags and from the FFT expansion once the two agree. Longer lags where
+the MQD is again small compared to the rounding error of the expansion (e.g
+near multiples of the rotation period of a trajectory in the lab frame of the
+clinostat, where the displacements nearly cancel) are also calculated directly.
+"""
+
+# IMPORTS ###
+
+# external libraries
+import numpy as np
+
+# rounding error of the FFT expansion of the MQD at lag k, in units of
+# eps*max|r|^4*n/(n - k) (measured errors on rotating trajectories are below 50)
+ROUNDING_FACTOR = 64
+
+
+def cross_correlation(x, y):
+    '''
+    Sum over i of x_i+k*y_i for every lag k, using a fast fourier transform.
+
+    Parameters
+    ----------
+    x : numpy array
+        1D array of length n.
+    y : numpy array
+        1D array of length n.
+
+    Returns
+    -------
+    numpy array of length n, element k is the sum for lag k.
+
+    '''
+    n = len(x)
+
+    # zero padding to twice the length removes the wrap around of the FFT
+    size = 2*n
+    fx = np.fft.rfft(x, n=size)
+    fy = fx if y is x else np.fft.rfft(y, n=size)
+    correlation = np.fft.irfft(fx*np.conjugate(fy), n=size)[:n]
+
+    return correlation
+
+
+def autocorrelation(x):
+    '''
+    Sum over i of x_i+k*x_i for every lag k, using a fast fourier transform.
+    '''
+    return cross_correlation(x, x)
+
+
+def end_point_sums(square):
+    '''
+    Sum over i of square_i+k + square_i for every lag k, the full sum minus
+    the first k values (never an end point) and the last k (never a start point).
+    '''
+    n = len(square)
+    first = np.concatenate(([0.0], np.cumsum(square)))[:n]
+    last = np.concatenate(([0.0], np.cumsum(square[::-1])))[:n]
+
+    return 2*np.sum(square) - first - last
+
+
+def msd_fft(positions):
+    '''
+    Mean square displacement of a trajectory for every lag.
+
+    Parameters
+    ----------
+    positions : numpy array
+        n x d array of positions (e.g xyz format), equally spaced in time.
+
+    Returns
+    -------
+    MSD : numpy array
+        length n, MSD[k] is the mean square displacement at a lag of k steps.
+
+    '''
+    # removing the mean position reduces rounding errors, displacements are unchanged
+    positions = np.asarray(positions, float)
+    positions = positions - np.mean(positions, axis=0)
+    n = len(positions)
+
+    # square magnitude of each position
+    square = np.sum(positions**2, axis=1)
+
+    # sum over i of r_i+k·r_i for every lag
+    correlation = sum(autocorrelation(positions[:, d]) for d in range(positions.shape[1]))
+
+    # sum over i of |r_i+k|^2 + |r_i|^2 for every lag
+    S1 = end_point_sums(square)
+
+    # number of pairs of positions for each lag
+    count = n - np.arange(n)
+
+    MSD = (S1 - 2*correlation)/count
+
+    # rounding can make the zero lag value very slightly non zero
+    MSD[0] = 0.0
+
+    return MSD
+
+
+def mqd_fft(positions):
+    '''
+    Mean quartic displacement of a trajectory for every lag, from the FFT
+    expansion of |r_i+k - r_i|^4. Only accurate once the MQD is well above
+    the rounding error of the expansion, see mqd.
+
+    Parameters
+    ----------
+    positions : numpy array
+        n x d array of positions (e.g xyz format), equally spaced in time.
+
+    Returns
+    -------
+    MQD : numpy array
+        length n, MQD[k] is the mean quartic displacement at a lag of k steps.
+
+    '''
+    positions = np.asarray(positions, float)
+    positions = positions - np.mean(positions, axis=0)
+    n, d = positions.shape
+
+    # with A = |r|^2 and C = r_i+k·r_i,
+    # |r_i+k - r_i|^4 = A_i+k^2 + A_i^2 + 2A_i+k A_i - 4(A_i+k + A_i)C + 4C^2
+    square = np.sum(positions**2, axis=1)
+
+    total = end_point_sums(square**2) + 2*autocorrelation(square)
+
+    for a in range(d):
+        weighted = square*positions[:, a]
+        total -= 4*(cross_correlation(weighted, positions[:, a]) + cross_correlation(positions[:, a], weighted))
+
+        for b in range(d):
+            total += 4*autocorrelation(positions[:, a]*positions[:, b])
+
+    MQD = total/(n - np.arange(n))
+    MQD[0] = 0.0
+
+    return MQD
+
+
+def mqd_direct(positions, lags):
+    '''
+    Mean quartic displacement of a trajectory at selected lags, calculated
+    directly for each lag in one vectorised step over all start times.
+
+    Parameters
+    ----------
+    positions : numpy array
+        n x d array of positions (e.g xyz format), equally spaced in time.
+    lags : numpy array of integers
+        lags (in steps) to calculate the MQD for.
+
+    Returns
+    -------
+    MQD : numpy array
+        MQD[j] is the mean quartic displacement at a lag of lags[j] steps.
+
+    '''
+    positions = np.asarray(positions, float)
+
+    MQD = np.zeros(len(lags))
+    for j, k in enumerate(lags):
+        if k == 0:
+            continue
+        vec = positions[k:] - positions[:-k]
+        dr2 = np.einsum('ij,ij->i', vec, vec)
+        MQD[j] = np.mean(dr2*dr2)
+
+    return MQD
+
+
+def mqd(positions, tolerance=1E-8, agreement=16):
+    '''
+    Mean quartic displacement of a trajectory for every lag.
+
+    Short lags are calculated directly (mqd_direct). Lags are added to the
+    direct calculation until the FFT expansion (mqd_fft) agrees with it to
+    within tolerance for agreement lags in a row, the FFT values are used for
+    the longer lags, except lags where the rounding error bound of the
+    expansion (ROUNDING_FACTOR*eps*max|r|^4*n/(n - k)) is more than tolerance
+    times the MQD, which are also calculated directly.
+
+    Parameters
+    ----------
+    positions : numpy array
+        n x d array of positions (e.g xyz format), equally spaced in time.
+    tolerance : float, optional
+        relative difference allowed between the two calculations.
+    agreement : integer, optional
+        number of lags in a row the two calculations must agree for.
+
+    Returns
+    -------
+    MQD : numpy array
+        length n, MQD[k] is the mean quartic displacement at a lag of k steps.
+
+    '''
+    positions = np.asarray(positions, float)
+    n = len(positions)
+
+    MQD = mqd_fft(positions)
+
+    # lags are checked in blocks, starting with the shortest
+    start = 1
+    block = agreement
+    in_a_row = 0
+    checked = 1 # first lag not yet calculated directly
+    while start < n and in_a_row < agreement:
+
+        lags = np.arange(start, min(start + block, n))
+        direct = mqd_direct(positions, lags)
+
+        for j, k in enumerate(lags):
+            close = np.abs(MQD[k] - direct[j]) <= tolerance*np.abs(direct[j])
+            in_a_row = in_a_row + 1 if close else 0
+            MQD[k] = direct[j]
+            checked = k + 1
+            if in_a_row == agreement:
+                break
+
+        start += block
+        block *= 2
+
+    # longer lags where the MQD is too small for the FFT expansion to resolve
+    centred = positions - np.mean(positions, axis=0)
+    max_quartic = np.max(np.sum(centred**2, axis=1))**2
+    bound = ROUNDING_FACTOR*np.finfo(float).eps*max_quartic*n/(n - np.arange(n))
+
+    lags = np.arange(checked, n)
+    lags = lags[tolerance*np.abs(MQD[lags]) < bound[lags]]
+    MQD[lags] = mqd_direct(positions, lags)
+
+    return MQD
+
+
+def msd_direct(positions, lags):
+    '''
+    Mean square displacement of a trajectory at selected lags, calculated
+    directly (used when only a few lags are needed).
+
+    Parameters
+    ----------
+    positions : numpy array
+        n x d array of positions (e.g xyz format), equally spaced in time.
+    lags : numpy array of integers
+        lags (in steps) to calculate the MSD for.
+
+    Returns
+    -------
+    MSD : numpy array
+        MSD[j] is the mean square displacement at a lag of lags[j] steps.
+
+    '''
+    positions = np.asarray(positions, float)
+
+    MSD = np.zeros(len(lags))
+    for j, k in enumerate(lags):
+        if k == 0:
+            continue
+        vec = positions[k:] - positions[:-k]
+        MSD[j] = np.mean(np.einsum('ij,ij->i', vec, vec))
+
+    return MSD
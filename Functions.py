@@ -13,72 +13,25 @@ import random
 import os
 import matplotlib.pyplot as plt
 
-###############################################################################
-
-# def initialise_swimming_direction():
-#     '''
-#     Initialises an initial unit vector direction of bacteria swimming
-#     by generating two random angles on the unit sphere and converting
-#     to cartesian coordinates.
-#     '''
-    
-#     # generating random angles from the circular coordinate system
-#     # cos theta is generated as this is uniform unlike theta
-#     costheta = np.random.uniform(0, 1)
-#     phi = np.random.uniform(0, 2*np.pi)
-    
-#     # components of 3D unit vector on unit circle
-#     # converting from circular to cartesian coordinates
-#     x = np.sin(phi)*costheta
-#     y = np.sin(phi)*np.sqrt(1-costheta**2)
-#     z = np.cos(phi)
-    
-#     # random unit vector generated from the circular coordinate system
-#     return np.array([x, y, z])
+# external files
+from TrajectoryIO import load_positions, trajectory_path
+import Orientation as o
+import InitialConditions as ic
+import SteadyState as ss
 
+###############################################################################
 
 def initialise_swimming_direction():
     '''
     Initialises an initial unit vector direction of bacteria swimming
     by generating two random angles on the unit sphere and converting
     to cartesian coordinates.
-    '''
-    
-    # generating random angles from the circular coordinate system
-    # cos theta is generated as this is uniform unlike theta
-    theta = np.random.uniform(0, np.pi)
-    phi = np.random.uniform(0, 2*np.pi)
     
-    # components of 3D unit vector on unit circle
-    # converting from circular to cartesian coordinates
-    x = np.sin(phi)*np.cos(theta)
-    y = np.sin(phi)*np.sin(theta)
-    z = np.cos(phi)
-    
-    # random unit vector generated from the circular coordinate system
-    return np.array([x, y, z])
-
-
-def initialise_swimming_direction():
-    '''
-    Initialises an initial unit vector direction of bacteria swimming
-    by generating two random angles on the unit sphere and converting
-    to cartesian coordinates.
+    :returns: numpy array [3], random unit vector, uniformly distributed on the unit sphere
     '''
     
-    # generating random angles from the circular coordinate system
-    # cos theta is generated as this is uniform unlike theta
-    theta = np.random.uniform(0, np.pi)
-    phi = np.random.uniform(0, 2*np.pi)
-    
-    # components of 3D unit vector on unit circle
-    # converting from circular to cartesian coordinates
-    x = np.sin(phi)*np.cos(theta)
-    y = np.sin(phi)*np.sin(theta)
-    z = np.cos(phi)
-    
-    # random unit vector generated from the circular coordinate system
-    return np.array([x, y, z])
+    # same sampling as the directions of a whole population
+    return o.random_directions(1)[0]
 
 
 def tangential_velocity(current_position, planar_position, current_velocity):
@@ -178,7 +131,6 @@ def change_starting_coords(initial_conditions_file_path, starting_positions):
         params[3] = str(starting_positions[1]) # y coord
         params[4] = str(starting_positions[2]) # z coord
         params[5] = str(params[5]) + '\n' # making sure new line is added
-        print(params)
         
         # converting split list back into string format
         combined = convert(params)
@@ -287,41 +239,24 @@ def peclet(swimming_vel, terminal_vel, centripetal_vel, translational_diffusion_
     
 #     return xyz
 
-def sample_from_hollow_cylinder(radius_inner, radius_outer, height):
-    
-    # Define bounding box enclosing the hollow cylinder
-    min_x = -radius_outer
-    max_x = radius_outer
-    min_y = -radius_outer
-    max_y = radius_outer
-    min_z = 0
-    max_z = height
-    
-    while True:
-        # Sample a point uniformly in the bounding box
-        x = np.random.uniform(min_x, max_x)
-        y = np.random.uniform(min_y, max_y)
-        z = np.random.uniform(min_z, max_z)
-        
-        # Compute radial distance from z-axis
-        radial_dist = np.sqrt(x**2 + y**2)
-        
-        # Reject points outside the annular region defined by inner and outer radii
-        if radial_dist >= radius_inner and radial_dist <= radius_outer:
-
-            return np.array([x, y, z])
-        
-
+def sample_from_hollow_cylinder(radius_inner, radius_outer, height, rng=None):
+    '''
+    Samples a point uniformly within a hollow cylinder with its axis along z.
+    
+    :param rng: source of random numbers (e.g numpy Generator), global numpy state if None
+    '''
+    
+    # a single point of InitialConditions.sample_annulus
+    return ic.sample_annulus(1, radius_inner, radius_outer, height, rng)[0]
 
 
-def measure_steady_state_time(folder_path, position_file_name):
+def measure_steady_state_time(folder_path, position_file_name=None):
     '''
-    Measure the average steady state time of a collection of datasets 
-    corresponding to a single configuration.(in the y direction)
+    Measure the steady state time of a collection of datasets corresponding
+    to a single configuration (in the y direction), see SteadyState.py.
     
-    This is done by measuring the standard deviaiton (sigma) of the set at the end of 
-    the dataset. Then find where a line of y = <y> + 1sigma passes through the average of the
-    dataset. The time at which this occurs is taken as the steady state time.
+    The y values of every run are cached in a memory mapped matrix inside
+    folder_path the first time, so measuring again doesnt re-read the runs.
     
     Parameters
     ----------
@@ -329,12 +264,8 @@ def measure_steady_state_time(folder_path, position_file_name):
     folder_path: string
         path to folder containing subfolders with positional files
         
-    time_path: string
-        path to time file corresponding to all positions file (one file must work
-                                                               for all positions files)
-        
     position_file_name
-        name of position file. Must be the same for each run
+        not used, the positions file of each run is found by TrajectoryIO.trajectory_path
 
     
     Returns
@@ -345,144 +276,33 @@ def measure_steady_state_time(folder_path, position_file_name):
     '''
     
     # get all of the subfolders within folder path
-    runs = os.listdir(folder_path)
-    no_runs = len(runs)
-    
-    # find out how many data points are in each file
-    position_path = folder_path + '/' + runs[0] + '/positions.csv'
-    data = pd.read_csv(position_path)
-    positions = np.array(data)
-    no_pos = len(positions)
-    
+    runs = sorted(os.listdir(folder_path))
+    run_paths = [os.path.join(folder_path, run) for run in runs
+                 if os.path.exists(trajectory_path(os.path.join(folder_path, run)))]
     
-    # compile each set of y values into large array
-    y = np.zeros([no_pos, no_runs]) # rows, cols
-    #print(no_pos)
+    results = ss.steady_state(run_paths, os.path.join(folder_path, 'steady_state_cache'), columns=('y',), sigmas=1.0)
     
-    # read positions file of each run & add y values to y array
-    for i in range(no_runs):
-        
-        # path to positions file
-        ith_positions_path = folder_path + '/' + runs[i] + '/positions.csv'
-        
-        # open positions file
-        positions_r = pd.read_csv(ith_positions_path) # read csv with pandas
-        positions = np.array(positions_r)
-        
-        # store the y data
-        y[:, i] = positions[:, 1]
-    
-    #print(y)
-    
-    # get mean of each row
-    ymean = np.mean(y, axis = 1)
-    
-    p90 = int((no_pos/100)*95)
-    #print(p90)
-    #print(y[p90:, :])
-    #print(y[p90:, :].shape)
-    
-    # measure mean & standard deviation of last 90% of points (take mean again to get a singular value, but all should be very similar anyway)
-    mean90 = np.mean(np.mean(y[p90:, :], axis = 1))
-    stddev90 = np.mean(np.std(y[p90:, :], axis = 1)) # much more like it value wise
-    print(stddev90)
-    
-    c = mean90 + (np.abs(stddev90))
-    print(c)
-    arr = np.zeros(no_pos) + (c) # straight line
-    
-    # this could be done more accuratley using interpolation of the y data 
-    # to get a function that we could equate the straight line too but this is
-    # as accurate that is needed at the moment
-    
-    # return a boolean array stating if the tolerance line is close to the real 
-    # data
-    mask = np.isclose(arr, ymean, atol = 10E-5)
-    
-    # index of first true
-    ind = np.argmax(mask)
-    
-    # ignore next 3 lines ### 
-    # find first index where y data drops below the 1 sigma threshold (as we
-    # know that the non 0 g follow rough exponential distributions)
-    #crossing_index = np.argmax(ymean <= (c))
-    
-    # read in time data
-    #time = pd.read_csv(time_path)
-    #times = np.array(time)
-    #print(times)
-    #print(len(times), len(arr), len(ymean))
-    
-    # steady state time is the time corresponding to the first true index
-    #steady_state_time = times[ind]
-    
-    #print(ind,times[ind])
-    
-    #plt.scatter(times, arr, s = 2, zorder = 20)
-    #plt.scatter(times, ymean, s = 2)
-    
-    return ind
-    
-    
-#measure_steady_state_time('Studies/Exp1/Exp1_data/Data/g=0.098,vs=0.0', 'Studies/Exp1/Exp1_data/time.csv','positions.csv')
+    return int(results['y_index'])
 
-def steady_state_time(y, no_pos, time_path):
+
+def steady_state_time(y, no_pos, time_path=None):
     
     '''
+    Steady state index of the mean of a set of y values, see SteadyState.relaxation_index.
+    
     y: numpy array
+        [no_pos, runs] y values of each run
         
     no_pos: integer
         number of positions recorded per run
     '''
     
     # get mean of each row
-    ymean = np.mean(y, axis = 1)
-    
-    p90 = int((no_pos/100)*95)
-    #print(p90)
-    #print(y[p90:, :])
-    #print(y[p90:, :].shape)
-    
-    # measure mean & standard deviation of last 90% of points (take mean again to get a singular value, but all should be very similar anyway)
-    mean90 = np.mean(np.mean(y[p90:, :], axis = 1))
-    stddev90 = np.mean(np.std(y[p90:, :], axis = 1)) # much more like it value wise
-    print(stddev90)
-    
-    c = mean90 + (2*np.abs(stddev90))
-    print(c)
-    arr = np.zeros(no_pos) + (c) # straight line
-    
-    # this could be done more accuratley using interpolation of the y data 
-    # to get a function that we could equate the straight line too but this is
-    # as accurate that is needed at the moment
-    
-    # return a boolean array stating if the tolerance line is close to the real 
-    # data
-    mask = np.isclose(arr, ymean, atol = 10E-5)
-    
-    # index of first true
-    ind = np.argmax(mask)
-    
-    # ignore next 3 lines ### 
-    # find first index where y data drops below the 1 sigma threshold (as we
-    # know that the non 0 g follow rough exponential distributions)
-    #crossing_index = np.argmax(ymean <= (c))
-    
-    # read in time data
-    #time = pd.read_csv(time_path)
-    #times = np.array(time)
-    #print(times)
-    #print(len(times), len(arr), len(ymean))
-    
-    # steady state time is the time corresponding to the first true index
-    #steady_state_time = times[ind]
-    
-    #print(ind,times[ind])
+    ymean = np.mean(y[:no_pos], axis = 1)
     
-    #plt.scatter(times, arr, s = 2, zorder = 20)
-    #plt.scatter(times, ymean, s = 2)
+    ind = ss.relaxation_index(ymean, sigmas=2.0)[0]
     
-    return ind
+    return int(ind)
 
     
     
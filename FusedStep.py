@@ -0,0 +1,349 @@
+'''
+This script contains the FusedStepper class. This class advances a whole
+Population by one timestep with a single compiled loop over the bacteria
+(numba), in place of the sequence of Population methods used by
+BacStroke.simulate:
+
+    centripetal_force -> rotational_vel -> update_pos -> update_vel ->
+    apply_boundaries -> tumble -> update_swimming_vel
+
+Each bacterium is taken through the whole sequence in turn, so no
+temporary arrays are made for any velocity term, mask or step and every
+array of the population is changed in place. For a small population, where
+numpy operations cost far more than the arithmetic they do, this brings the
+cost of a timestep down by an order of magnitude.
+
+The arithmetic of each step is the same, in the same order, as the numpy
+methods, and the random numbers are drawn from the same streams of the
+population (see RandomStreams.py), so a run with the fused step follows the
+same trajectory as a run with the numpy methods. Only tumbles, which need a
+variable number of random numbers, leave the compiled loop: the new
+direction of each bacterium that tumbled is drawn afterwards.
+
+The fused step supports the 'euler' orientation method (the 'exact' method
+draws from tabulated distributions, see Orientation.py), both position
+methods and both tumble modes. numba is optional, if it isnt installed
+BacStroke.simulate uses the numpy methods.
+'''
+
+# Imports #####################################################################
+
+# modules
+import numpy as np
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+# external files
+import Orientation as o
+from Boundaries import WALLS
+
+###############################################################################
+
+# True if the fused step can be compiled
+NUMBA_AVAILABLE = numba is not None
+
+# tumble modes of the compiled loop
+NO_TUMBLES = 0
+BERNOULLI = 1
+SCHEDULED = 2
+
+# columns of the array of constants of each bacterium (see FusedStepper),
+# held in one array so each call of the compiled loop has few arguments
+CONSTANTS = ('rad', 'swim', 'omega', 'centripetal_factor', 'diffusion_scale', 'orientation_coeff',
+             'rotation_angle', 'cos_angle', 'sin_angle', 'tumble_prob')
+RAD, SWIM, OMEGA, CENTRIPETAL, DIFFUSION, ORIENTATION, ROTATION, COS, SIN, TUMBLE_PROB = range(len(CONSTANTS))
+
+
+def fused_step(pos, vel, vel_rotation, rot_vel, centripetal_vel, swim_direction, swim_vel, term_vel, constants,
+               exact_position, translation_noise, orientation_noise, tumble_mode, tumble_values, time,
+               dt, R, r, H, frac, tumbles, hits):
+    '''
+    Advances every bacterium by one timestep, changing the arrays of the
+    population in place (compiled with numba when it is installed).
+
+    :param pos, vel, vel_rotation, rot_vel, centripetal_vel, swim_direction, swim_vel,
+    term_vel: [N, 3] float arrays of the population
+    :param constants: [N, len(CONSTANTS)] float array, constants of each bacterium (see FusedStepper)
+    :param exact_position: boolean, use the 'exact' position update
+    :param translation_noise, orientation_noise: [N, 3] float arrays of normal noise
+    :param tumble_mode: integer, NO_TUMBLES, BERNOULLI or SCHEDULED
+    :param tumble_values: [N] float array, uniform random numbers (BERNOULLI) or
+    times of the next tumbles (SCHEDULED)
+    :param time: float, time at the end of the timestep [s]
+    :param dt, R, r, H, frac: floats, as BacStroke.simulate and Boundaries.apply_boundaries
+    :param tumbles: [N] integer array, set to 1 for bacteria that tumble, 0 otherwise
+    :param hits: [4] integer array, set to the number of bacteria hitting each wall
+
+    :returns n_tumbles: integer, number of bacteria that tumbled
+    '''
+    hits[:] = 0
+    n_tumbles = 0
+
+    for i in range(len(pos)):
+
+        a = constants[i, RAD]
+        swim = constants[i, SWIM]
+        omega = constants[i, OMEGA]
+        x = pos[i, 0]
+        y = pos[i, 1]
+
+        # centripetal and rotational velocity at the current position
+        centripetal_vel[i, 0] = constants[i, CENTRIPETAL]*x
+        centripetal_vel[i, 1] = constants[i, CENTRIPETAL]*y
+        centripetal_vel[i, 2] = 0.0
+        rot_vel[i, 0] = -y*omega
+        rot_vel[i, 1] = x*omega
+        rot_vel[i, 2] = 0.0
+
+        # position update with the last velocity
+        if exact_position:
+            for k in range(3):
+                pos[i, k] += (vel[i, k] - vel_rotation[i, k])*dt
+            x = pos[i, 0]
+            y = pos[i, 1]
+            pos[i, 0] = constants[i, COS]*x - constants[i, SIN]*y
+            pos[i, 1] = constants[i, SIN]*x + constants[i, COS]*y
+        else:
+            for k in range(3):
+                pos[i, k] += vel[i, k]*dt
+
+        # new velocity from each of its terms
+        for k in range(3):
+            vel[i, k] = (term_vel[i, k] + translation_noise[i, k]*constants[i, DIFFUSION] + rot_vel[i, k]
+                         + swim*swim_direction[i, k] + centripetal_vel[i, k])
+            vel_rotation[i, k] = rot_vel[i, k]
+
+        # walls, removing the radial part of the velocity
+        x = pos[i, 0]
+        y = pos[i, 1]
+        planar_magnitude = np.sqrt(x**2 + y**2)
+        outer = planar_magnitude >= (R - a)
+        inner = (not outer) and planar_magnitude <= (r + a)
+        radial = outer or inner
+
+        if radial:
+            rad_x = x/planar_magnitude
+            rad_y = y/planar_magnitude
+            rad_mag = rad_x*vel[i, 0] + rad_y*vel[i, 1]
+            vel[i, 0] -= rad_mag*rad_x
+            vel[i, 1] -= rad_mag*rad_y
+
+            if outer:
+                wall_distance = R - (1.0 + frac)*a
+                hits[0] += 1
+            else:
+                wall_distance = r + (1.0 + frac)*a
+                hits[1] += 1
+            pos[i, 0] = wall_distance*rad_x
+            pos[i, 1] = wall_distance*rad_y
+
+        # ends
+        z = pos[i, 2]
+        ends = (z >= (H - a)) or (z <= (0 + a))
+
+        upper = z >= (H - a)
+        if upper:
+            z = H - (2*a)
+            pos[i, 2] = z
+            hits[2] += 1
+
+        lower = (radial or not upper) and (z <= (0 + a))
+        if lower:
+            pos[i, 2] = 0 + (2*a)
+            hits[3] += 1
+
+        if upper or lower:
+            vel[i, 2] = 0
+
+        # bacteria that only reached an end keep their swimming direction
+        swimming = radial or not ends
+
+        # tumbling
+        tumble = False
+        if swimming and tumble_mode == BERNOULLI:
+            tumble = tumble_values[i] < constants[i, TUMBLE_PROB]
+        elif swimming and tumble_mode == SCHEDULED:
+            tumble = tumble_values[i] <= time
+
+        tumbles[i] = 1 if tumble else 0
+        n_tumbles += tumbles[i]
+
+        # Euler-Maruyama step of the swimming direction
+        if swimming and not tumble:
+            e0 = swim_direction[i, 0]
+            e1 = swim_direction[i, 1]
+            e2 = swim_direction[i, 2]
+            dot = e0*orientation_noise[i, 0] + e1*orientation_noise[i, 1] + e2*orientation_noise[i, 2]
+
+            step0 = (orientation_noise[i, 0] - dot*e0)*constants[i, ORIENTATION]
+            step1 = (orientation_noise[i, 1] - dot*e1)*constants[i, ORIENTATION]
+            step2 = (orientation_noise[i, 2] - dot*e2)*constants[i, ORIENTATION]
+            step0 -= constants[i, ROTATION]*e1
+            step1 += constants[i, ROTATION]*e0
+
+            e0 += step0
+            e1 += step1
+            e2 += step2
+            magnitude = np.sqrt(e0*e0 + e1*e1 + e2*e2)
+            swim_direction[i, 0] = e0/magnitude
+            swim_direction[i, 1] = e1/magnitude
+            swim_direction[i, 2] = e2/magnitude
+
+        for k in range(3):
+            swim_vel[i, k] = swim*swim_direction[i, k]
+
+    return n_tumbles
+
+
+if NUMBA_AVAILABLE:
+    fused_step = numba.njit(cache=True, nogil=True)(fused_step)
+
+
+def per_bacterium(value, n):
+    '''
+    Value of a parameter for each bacterium, as a contiguous float array.
+
+    :param value: float or [n] float array
+    :param n: integer, number of bacteria
+
+    :returns values: [n] float array
+    '''
+    return np.array(np.broadcast_to(np.asarray(value, float), n))
+
+
+class FusedStepper(object):
+    '''
+    Class used to advance a population one timestep at a time with the fused
+    step.
+    '''
+
+    @staticmethod
+    def supports(orientation_method, position_method):
+        '''
+        Checks if the fused step can be used for a simulation.
+
+        :returns reason: string, why it cant be used, or None if it can
+        '''
+        if not NUMBA_AVAILABLE:
+            return 'numba is not installed'
+
+        if orientation_method != 'euler':
+            return "the fused step only supports the 'euler' orientation method"
+
+        if position_method not in ('euler', 'exact'):
+            return "position method must be 'euler' or 'exact', not " + str(position_method)
+
+        return None
+
+
+    def __init__(self, bacteria, tumbler, dt, omega, viscosity_coeff, density, centripetal_status,
+                 diffusion_coefficient, rotational_diffusion_coefficient, R, r, H, position_method='euler', frac=0.1):
+        '''
+        Initialises the fused step of a population, after its velocity terms
+        have been initialised (as in BacStroke.simulate).
+
+        :param bacteria: Population instance, changed in place by each step
+        :param tumbler: TumbleSampler instance of the population
+        :param position_method: string, 'euler' or 'exact' (see Population.update_pos)
+        :param frac: float, as Boundaries.apply_boundaries
+
+        The other parameters are the same as the Population methods, each a
+        float or an [N] float array.
+        '''
+
+        self.bacteria = bacteria
+        self.tumbler = tumbler
+        n = len(bacteria)
+
+        # every array changed by the step is a contiguous copy of its own (the
+        # numpy methods share the rotational velocity between two attributes)
+        for name in ('pos', 'vel', 'vel_rotation', 'rot_vel', 'centripetal_vel', 'swim_direction', 'swim_vel', 'term_vel'):
+            setattr(bacteria, name, np.array(np.broadcast_to(getattr(bacteria, name), (n, 3)), float))
+
+        # constants of each bacterium, calculated as in the Population methods
+        if isinstance(centripetal_status, str):
+            centripetal_status = {'True': True, 'False': False}.get(centripetal_status)
+
+        centripetal_factor = np.zeros(n)
+        if centripetal_status is not None and np.any(centripetal_status):
+            bm = (4/3)*np.pi*density*(bacteria.rad**3)*((1050/density) - 1)
+            centripetal_factor = bm*(omega**2)/(6*np.pi*viscosity_coeff*bacteria.rad)
+            if np.ndim(centripetal_status) == 1:
+                centripetal_factor = centripetal_factor*centripetal_status
+
+        self.dt = float(dt)
+        self.R = float(R)
+        self.r = float(r)
+        self.H = float(H)
+        self.frac = float(frac)
+        self.exact_position = position_method == 'exact'
+
+        rotation_angle = np.asarray(omega)*dt
+        values = {'rad': bacteria.rad,
+                  'swim': bacteria.swim,
+                  'omega': omega,
+                  'centripetal_factor': centripetal_factor,
+                  'diffusion_scale': np.sqrt(2*np.asarray(diffusion_coefficient)/dt),
+                  'orientation_coeff': np.sqrt(2*np.asarray(rotational_diffusion_coefficient)/dt)*dt,
+                  'rotation_angle': rotation_angle,
+                  'cos_angle': np.cos(rotation_angle),
+                  'sin_angle': np.sin(rotation_angle),
+                  'tumble_prob': tumbler.tumble_prob}
+
+        self.constants = np.empty([n, len(CONSTANTS)])
+        for column, name in enumerate(CONSTANTS):
+            self.constants[:, column] = per_bacterium(values[name], n)
+
+        # tumbles can only happen with a non zero tumbling rate
+        self.bernoulli = tumbler.mode == 'bernoulli' and not np.all(tumbler.tumble_prob <= 0)
+
+        self.tumbles = np.zeros(n, dtype=np.int64)
+        self.hits = np.zeros(len(WALLS), dtype=np.int64)
+        self.no_values = np.zeros(n)
+
+
+    def step(self, time, hits):
+        '''
+        Advances the population by one timestep.
+
+        :param time: float, time at the end of the timestep [s]
+        :param hits: [4] integer array, set to the number of bacteria hitting each
+        wall this timestep (in the order of Boundaries.WALLS)
+
+        :returns tumbles: [N] integer array, 1 = bacterium tumbled, 0 = it didnt
+        '''
+        bacteria = self.bacteria
+        tumbler = self.tumbler
+        streams = bacteria.streams
+
+        # random numbers of this timestep, from the same streams as the numpy methods
+        translation_noise = streams.normal('translation')
+        orientation_noise = streams.normal('orientation')
+
+        if self.bernoulli:
+            tumble_mode, tumble_values = BERNOULLI, streams.uniform('tumbling')
+        elif tumbler.mode == 'scheduled' and time >= tumbler.next_due:
+            tumble_mode, tumble_values = SCHEDULED, tumbler.next_tumble
+        else:
+            tumble_mode, tumble_values = NO_TUMBLES, self.no_values
+
+        n_tumbles = fused_step(bacteria.pos, bacteria.vel, bacteria.vel_rotation, bacteria.rot_vel,
+                               bacteria.centripetal_vel, bacteria.swim_direction, bacteria.swim_vel,
+                               bacteria.term_vel, self.constants, self.exact_position, translation_noise,
+                               orientation_noise, tumble_mode, tumble_values, time,
+                               self.dt, self.R, self.r, self.H, self.frac, self.tumbles, self.hits)
+        hits[:] = self.hits
+
+        # bacteria that tumbled get a random new swimming direction
+        if n_tumbles > 0:
+            rows = np.flatnonzero(self.tumbles)
+            bacteria.swim_direction[rows] = o.random_directions(len(rows), streams.rows('directions', rows))
+            bacteria.swim_vel[rows] = self.constants[rows, SWIM, None]*bacteria.swim_direction[rows]
+
+            if tumble_mode == SCHEDULED:
+                tumbler.reschedule(time, rows)
+
+        return self.tumbles
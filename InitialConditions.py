@@ -0,0 +1,122 @@
+'''
+This script contains the functions used to set the initial conditions of a
+population of bacteria: starting positions sampled uniformly within the
+hollow cylinder (annulus r..R x 0..H) of the clinostat, and starting swimming
+directions sampled uniformly on the unit sphere.
+
+Positions are sampled by inverse transform sampling rather than rejection.
+The area of an annulus grows with the square of the radius, so for points
+uniform in the annulus the square of the radial distance is uniform between
+r^2 and R^2:
+
+    rho = sqrt(r^2 + u*(R^2 - r^2)),  u ~ U(0, 1)
+
+with the angle around the axis uniform in [0, 2pi) and z uniform in [0, H].
+Every bacterium is sampled at once with a fixed number of random numbers, so
+the positions of a large population (10^6 bacteria) take milliseconds and
+are the same for the same seed.
+
+The arrays are written straight into a Population, so a population can be
+set up without an initial conditions file.
+'''
+
+# Imports #####################################################################
+
+# modules
+import numpy as np
+
+# external files
+import Orientation as o
+from Population import Population
+
+###############################################################################
+
+
+def sample_annulus(n, radius_inner, radius_outer, height, rng=None):
+    '''
+    Samples n points uniformly within a hollow cylinder with its axis along z.
+
+    :param n: integer, number of points
+    :param radius_inner: float, inner radius of the cylinder [m]
+    :param radius_outer: float, outer radius of the cylinder [m]
+    :param height: float, length of the cylinder down the z axis [m]
+    :param rng: source of random numbers (e.g numpy Generator), global numpy state if None
+
+    :returns positions: [n, 3] float array, xyz of each point [m]
+    '''
+    rng = np.random if rng is None else rng
+
+    # inverse of the cumulative distribution of the radial distance, which is
+    # uniform in the square of the radial distance
+    u = rng.uniform(0, 1, size=n)
+    rho = np.sqrt(radius_inner**2 + u*(radius_outer**2 - radius_inner**2))
+
+    angle = rng.uniform(0, 2*np.pi, size=n)
+
+    positions = np.empty([n, 3])
+    positions[:, 0] = rho*np.cos(angle)
+    positions[:, 1] = rho*np.sin(angle)
+    positions[:, 2] = rng.uniform(0, height, size=n)
+
+    return positions
+
+
+def sample_directions(n, rng=None):
+    '''
+    Samples n swimming directions uniformly on the unit sphere.
+
+    :param n: integer, number of directions
+    :param rng: source of random numbers (e.g numpy Generator), global numpy state if None
+
+    :returns directions: [n, 3] float array of unit vectors
+    '''
+    return o.random_directions(n, rng)
+
+
+def set_initial_conditions(population, start_region=None, random_directions=False, same_position=False, rng=None):
+    '''
+    Samples the starting positions and/or swimming directions of a
+    population, changing it in place.
+
+    :param population: Population instance
+    :param start_region: tuple of floats, (inner radius, outer radius, height) [m] of
+    the hollow cylinder positions are sampled from, positions are kept if None
+    :param random_directions: boolean, sample the swimming directions, else they are kept
+    :param same_position: boolean, every bacterium starts at the same sampled position
+    (as Functions.change_starting_coords), else each has its own
+    :param rng: source of random numbers (e.g numpy Generator), global numpy state if None
+
+    :returns population: the population given
+    '''
+
+    if start_region is not None:
+        population.pos[:] = sample_annulus(1 if same_position else len(population), *start_region, rng=rng)
+
+    if random_directions:
+        population.swim_direction[:] = sample_directions(len(population), rng)
+        np.multiply(population.swim[:, None], population.swim_direction, out=population.swim_vel)
+
+    return population
+
+
+def new_population(n, mass, radius, swimming_vel, start_region, random_directions=True, rng=None):
+    '''
+    Initialises a Population of n bacteria with positions sampled within
+    start_region, without an initial conditions file.
+
+    :param n: integer, number of bacteria
+    :param mass: float or [n] float array, mass of each bacterium [kg]
+    :param radius: float or [n] float array, radius of each bacterium [m]
+    :param swimming_vel: float or [n] float array, swimming speed of each bacterium [m/s]
+    :param start_region: tuple of floats, (inner radius, outer radius, height) [m] of
+    the hollow cylinder positions are sampled from, e.g (params.r, params.R, params.H)
+    :param random_directions: boolean, sample the swimming directions, else every
+    bacterium starts swimming along y (as Population)
+    :param rng: source of random numbers (e.g numpy Generator), global numpy state if None
+
+    :returns population: Population instance
+    '''
+    population = Population(np.broadcast_to(mass, n), np.zeros([n, 3]),
+                            np.broadcast_to(radius, n), np.broadcast_to(swimming_vel, n))
+
+    return set_initial_conditions(population, start_region, random_directions, rng=rng)
@@ -0,0 +1,364 @@
+'''
+This script contains accumulators, classes that measure statistics of the
+population while BacStroke.py runs. They allow the statistics of a run to be
+found without storing its full trajectory.
+
+Every accumulator has the same two methods:
+
+    update(time, bacteria, wall_hits): called by BacStroke.main after every
+                                       timestep (each accumulator only uses
+                                       every nth call, set by every)
+    result():                          returns the statistics measured so far
+                                       as a dictionary of numpy arrays
+
+The accumulators available are:
+
+    RunningMoments: running mean and variance of a position coordinate
+    RadialHistogram: histogram of the planar radius of the bacteria
+    WallHitCounter: total number of hits on each wall of the clinostat
+
+The ConvergenceMonitor is an accumulator that BacStroke.main also uses to
+stop a run (or record it less often) once the distributions of y and of the
+planar radius r of the population are stationary.
+'''
+
+# Imports #####################################################################
+
+# modules
+import numpy as np
+import abc
+
+# external files
+from Boundaries import WALLS
+
+###############################################################################
+
+
+class Accumulator(abc.ABC):
+    '''
+    Base class of every accumulator, each accumulator defines accumulate and result.
+    '''
+
+    def __init__(self, name, every=1, start_time=0.0):
+        '''
+        :param name: string, name the results are stored under
+        :param every: integer, only every nth timestep is used
+        :param start_time: float, timesteps before this time [s] are ignored (e.g transients)
+        '''
+        self.name = name
+        self.every = int(every)
+        self.start_time = float(start_time)
+
+        # number of calls to update so far
+        self.calls = 0
+
+
+    def update(self, time, bacteria, wall_hits):
+        '''
+        Called after every timestep of the simulation.
+
+        :param time: float, current time in simulation [s]
+        :param bacteria: Population instance
+        :param wall_hits: [4] integer array, wall hits this timestep in the order of Boundaries.WALLS
+        '''
+        self.calls += 1
+
+        if (self.calls % self.every == 0) and (time >= self.start_time):
+            self.accumulate(time, bacteria, wall_hits)
+
+
+    @abc.abstractmethod
+    def accumulate(self, time, bacteria, wall_hits):
+        '''
+        Adds one timestep to the statistics, defined by each accumulator.
+        '''
+
+
+    @abc.abstractmethod
+    def result(self):
+        '''
+        Returns the statistics measured so far, defined by each accumulator.
+        '''
+
+
+class RunningMoments(Accumulator):
+    '''
+    Running mean and variance over time of one position coordinate of each
+    bacterium (Welford's algorithm), and of the whole population.
+    '''
+
+    def __init__(self, axis='y', name=None, every=1, start_time=0.0):
+        '''
+        :param axis: string, coordinate to measure, 'x', 'y', 'z' or 'r' (planar radius)
+        '''
+        if axis not in ('x', 'y', 'z', 'r'):
+            raise ValueError("axis must be 'x', 'y', 'z' or 'r', not " + str(axis))
+
+        Accumulator.__init__(self, axis + '_moments' if name is None else name, every, start_time)
+        self.axis = axis
+
+        self.count = 0
+        self.mean = None
+        self.m2 = None
+
+
+    def accumulate(self, time, bacteria, wall_hits):
+
+        if self.axis == 'r':
+            value = np.sqrt(bacteria.pos[:, 0]**2 + bacteria.pos[:, 1]**2)
+        else:
+            value = bacteria.pos[:, 'xyz'.index(self.axis)]
+
+        if self.mean is None:
+            self.mean = np.zeros(len(value))
+            self.m2 = np.zeros(len(value))
+
+        # updating mean and sum of squared differences of each bacterium
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta/self.count
+        self.m2 += delta*(value - self.mean)
+
+
+    def result(self):
+
+        if self.count == 0:
+            return {'count': np.array(0)}
+
+        variance = self.m2/self.count
+
+        # population values from the values of each bacterium (all have the same count)
+        population_mean = np.mean(self.mean)
+        population_variance = np.mean(variance + (self.mean - population_mean)**2)
+
+        return {'count': np.array(self.count),
+                'mean': self.mean,
+                'variance': variance,
+                'population_mean': np.array(population_mean),
+                'population_variance': np.array(population_variance)}
+
+
+class RadialHistogram(Accumulator):
+    '''
+    Histogram of the planar radius (distance from the axis of the clinostat)
+    of every bacterium, summed over time.
+    '''
+
+    def __init__(self, bins, name='radial_histogram', every=1, start_time=0.0):
+        '''
+        :param bins: float array, edges of the radial bins [m], e.g np.linspace(r, R, 51)
+        '''
+        Accumulator.__init__(self, name, every, start_time)
+
+        self.bins = np.asarray(bins, float)
+        self.counts = np.zeros(len(self.bins) - 1, dtype=np.int64)
+
+
+    def accumulate(self, time, bacteria, wall_hits):
+
+        radius = np.sqrt(bacteria.pos[:, 0]**2 + bacteria.pos[:, 1]**2)
+        self.counts += np.histogram(radius, bins=self.bins)[0]
+
+
+    def result(self):
+
+        total = np.sum(self.counts)
+        density = self.counts/(total*np.diff(self.bins)) if total > 0 else np.zeros(len(self.counts))
+
+        return {'bins': self.bins, 'counts': self.counts, 'density': density}
+
+
+class WallHitCounter(Accumulator):
+    '''
+    Total number of hits on each wall of the clinostat.
+    '''
+
+    def __init__(self, name='wall_hits', every=1, start_time=0.0):
+        Accumulator.__init__(self, name, every, start_time)
+
+        self.hits = np.zeros(len(WALLS), dtype=np.int64)
+
+
+    def accumulate(self, time, bacteria, wall_hits):
+
+        self.hits += wall_hits
+
+
+    def result(self):
+
+        return dict(zip(WALLS, self.hits))
+
+
+class ConvergenceMonitor(Accumulator):
+    '''
+    Detects when the distributions of y and of the planar radius r of the
+    population stop changing.
+
+    Positions are pooled over windows of window calls (every bacterium, every
+    used timestep). At the end of each window the mean and standard deviation
+    of y and r are compared with those of the window before, the change
+    measured as a fraction of the range of the coordinate in the clinostat
+    (2R for y, R - r for r):
+
+        (|mean_k - mean_k-1| + |std_k - std_k-1|)/range
+
+    The population is stationary once every change is at most tolerance for
+    patience windows in a row, and the change from the window before these
+    to the last is also at most tolerance (so a slow drift isnt missed). This
+    is checked for every configuration of a batch (Population.config_id) on
+    its own. BacStroke.main then stops the run (action='stop') or records
+    every decimate times as many timesteps (action='decimate'). A decimated
+    trajectory isnt evenly spaced in time, the row where the spacing changes
+    is saved with it (TrajectoryIO.record_segments) and the MSD analysis only
+    uses the rows before it.
+
+    The windows must be long enough that the profile moves by more than
+    tolerance*range over a window while it is still relaxing.
+    '''
+
+    def __init__(self, window=1000, tolerance=0.005, patience=3, action='stop', decimate=10,
+                 name='convergence', every=1, start_time=0.0):
+        '''
+        :param window: integer, number of used timesteps in each window
+        :param tolerance: float, largest change between windows of a stationary
+        population, as a fraction of the range of each coordinate
+        :param patience: integer, number of stationary windows in a row needed
+        :param action: string, 'stop' or 'decimate', what BacStroke.main does once converged
+        :param decimate: integer, record_every is multiplied by this once converged (action='decimate')
+        :param start_time: float, timesteps before this time [s] are ignored (e.g a known transient)
+        '''
+        if action not in ('stop', 'decimate'):
+            raise ValueError("action must be 'stop' or 'decimate', not " + str(action))
+
+        Accumulator.__init__(self, name, every, start_time)
+
+        self.window = int(window)
+        self.tolerance = float(tolerance)
+        self.patience = int(patience)
+        self.action = action
+        self.decimate = int(decimate)
+
+        self.reset()
+
+
+    def reset(self, groups=None, params=None):
+        '''
+        Starts monitoring a new run, called by BacStroke.main.
+
+        :param groups: [N] integer array, configuration of each bacterium (e.g
+        Population.config_id), all one configuration if None
+        :param params: SimulationParameters instance (or BatchParameters), the
+        clinostat of the run, changes are measured in m if None
+        '''
+        self.calls = 0
+        self.groups = np.zeros(0, dtype=int) if groups is None else np.asarray(groups)
+        self.n_groups = int(np.max(self.groups)) + 1 if len(self.groups) > 0 else 1
+
+        # range of y and r in each configuration
+        self.scale = np.ones([2, self.n_groups])
+        if params is not None and len(self.groups) == 0:
+            # one configuration, the largest clinostat if the parameters vary
+            R = np.asarray(params.R, dtype=float)
+            self.scale[:, 0] = (2*np.max(R), np.max(R - np.asarray(params.r, dtype=float)))
+        elif params is not None:
+            n = len(self.groups)
+            R = np.broadcast_to(params.R, n)
+            r = np.broadcast_to(params.r, n)
+            self.scale[:] = 0
+            np.maximum.at(self.scale[0], self.groups, 2*R)
+            np.maximum.at(self.scale[1], self.groups, R - r)
+
+        # sums of y, y^2, r and r^2 of each configuration over the current window
+        self.sums = np.zeros([4, self.n_groups])
+        self.counts = np.zeros(self.n_groups)
+        self.samples = 0
+
+        # mean and standard deviation of y and r of each configuration in the
+        # last patience + 1 windows, the last is the current window
+        self.history = []
+
+        self.stationary = 0
+        self.changes = []
+        self.window_times = []
+        self.converged = False
+        self.converged_time = np.nan
+
+
+    def accumulate(self, time, bacteria, wall_hits):
+
+        y = bacteria.pos[:, 1]
+        r = np.sqrt(bacteria.pos[:, 0]**2 + bacteria.pos[:, 1]**2)
+
+        # a population without groups is one configuration
+        if len(self.groups) != len(y):
+            self.groups = np.zeros(len(y), dtype=int)
+
+        for row, value in enumerate([y, y**2, r, r**2]):
+            self.sums[row] += np.bincount(self.groups, value, self.n_groups)
+        self.counts += np.bincount(self.groups, minlength=self.n_groups)
+
+        self.samples += 1
+        if self.samples == self.window:
+            self.end_window(time)
+
+
+    def change(self, statistics, other):
+        '''
+        Largest change of y or r of any configuration between two windows, as
+        a fraction of its range.
+        '''
+        change = (np.abs(statistics[0] - other[0]) + np.abs(statistics[1] - other[1]))/self.scale
+
+        return float(np.max(change))
+
+
+    def end_window(self, time):
+        '''
+        Compares the window that has just finished with the ones before it.
+        '''
+        mean = self.sums[0::2]/np.maximum(self.counts, 1)
+        std = np.sqrt(np.maximum(self.sums[1::2]/np.maximum(self.counts, 1) - mean**2, 0))
+        statistics = (mean, std)
+        self.history = (self.history + [statistics])[-(self.patience + 1):]
+
+        if len(self.history) > 1:
+
+            change = self.change(statistics, self.history[-2])
+            self.changes.append(change)
+            self.window_times.append(time)
+            self.stationary = self.stationary + 1 if change <= self.tolerance else 0
+
+            # drift over the last patience (stationary) windows, from the
+            # window before them (the first window of the history)
+            if (self.stationary >= self.patience and not self.converged
+                    and self.change(statistics, self.history[0]) <= self.tolerance):
+                self.converged = True
+                self.converged_time = time
+
+        self.sums[:] = 0
+        self.counts[:] = 0
+        self.samples = 0
+
+
+    def result(self):
+
+        return {'converged': np.array(self.converged),
+                'converged_time': np.array(self.converged_time),
+                'window_times': np.array(self.window_times),
+                'changes': np.array(self.changes)}
+
+
+def save_results(accumulators, output_file):
+    '''
+    Saves the results of a list of accumulators to a single .npz file, each
+    result is stored as <accumulator name>/<result name>.
+
+    :param accumulators: list of Accumulator instances
+    :param output_file: string, path to output .npz file
+    '''
+    results = {}
+    for accumulator in accumulators:
+        for key, value in accumulator.result().items():
+            results[accumulator.name + '/' + key] = value
+
+    np.savez(output_file, **results)
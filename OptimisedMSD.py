@@ -20,6 +20,10 @@ import matplotlib.pyplot as plt
 import csv
 import time
 
+# external files
+from TrajectoryIO import load_positions, load_times, even_rows
+from FastMSD import msd_fft, mqd
+
 def main(positions_file, time_file, output_file, N, max_lagtime, dt):
     '''
     
@@ -27,15 +31,18 @@ def main(positions_file, time_file, output_file, N, max_lagtime, dt):
     Parameters
     ----------
     positions_file : string
-        File path to positions file from current directory.
+        File path to positions file (csv or binary trajectory folder) from current directory.
     time_file : string
-        File path to time file from current directory.
+        File path to time file (csv or binary trajectory folder) from current directory.
     output_file : string
         file path to outputfile (doesnt need to exist already), csv.
     N : integer
         number of data points to skip periodically to speed up calculation.
     max_lagtime : float
-        max lagtime desired.
+        max lagtime desired, only this length of the start of the
+        trajectory is used. The whole trajectory is used if None. Only the
+        evenly spaced rows at the start of a run are used (see
+        TrajectoryIO.even_rows), e.g before a converged run was decimated.
     dt : float
         timestep of data from positions file.
 
@@ -68,14 +75,17 @@ def main(positions_file, time_file, output_file, N, max_lagtime, dt):
     # total_time = float(config[2]) # total length of similation [s]
     # numstep = round(total_time/dt) # number of simulation steps
     
-    no_steps = int(max_lagtime/dt)
+    no_steps = None if max_lagtime is None else int(max_lagtime/dt)
+    
+    # rows recorded after the spacing of the run changed arent used
+    rows = even_rows(positions_file)[0]
+    if rows is not None:
+        no_steps = rows if no_steps is None else min(no_steps, rows)
     
     
     # POSITION FILE READING ####
     
-    data = pd.read_csv(positions_file)
-    positions = np.array(data)[0:no_steps:N] # in xyz format
-    no_pos = len(positions[0::])
+    positions = load_positions(positions_file)[0:no_steps:N] # in xyz format
 
     # storage array for times    
     #t = np.zeros(no_pos)
@@ -87,41 +97,14 @@ def main(positions_file, time_file, output_file, N, max_lagtime, dt):
    
     #print(t) 
     
-    time = pd.read_csv(time_file, header = None)[0:-1]
-    #print(time)
-    time_arr = time.to_numpy()[0:no_steps:N]
+    time_arr = load_times(time_file)[0:no_steps:N]
     #print(time_arr)
     
     # print(len(t), len(time))
    
-    # MSD AND MQD 
-    MSD = np.zeros(no_pos)
-    MQD =  np.zeros(no_pos)
-    count = np.zeros(no_pos)
-    
-    for i in range(no_pos):
-        print('Progress ' + str(i) + ' out of ' + str(no_pos))
-        # new time portion, set current time to starting time
-        #t1 = t[i]
-        
-        # setting positions for this
-        pos1 = positions[i]
-        
-        # calculating MSD for each step inbetween current time i and end time
-        for j in range(i,no_pos):
-            pos2 = positions[j]
-            vec = pos2 - pos1
-            dr2 = np.sum(vec*vec)
-            dr4 = dr2*dr2
-            MSD[j-i] += dr2
-            MQD[j-i] += dr4
-            count[j-i] += 1.0
-    
-    # dividing MSD & MQD by count
-    for i in range(no_pos):
-        if(count[i]>0):
-            MSD[i] /= count[i]
-            MQD[i] /= count[i]
+    # MSD AND MQD, for every lag at once (see FastMSD.py)
+    MSD = msd_fft(positions)
+    MQD = mqd(positions)
     
     # write MSD, MQD & lagtime to file
     with open(output_file, 'w') as f:
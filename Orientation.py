@@ -0,0 +1,256 @@
+'''
+This script contains the functions used to update the swimming direction of
+every bacterium in a population.
+
+The swimming direction e of a bacterium changes due to the rotation of the
+clinostat and to rotational diffusion:
+
+    de/dt = omega*[-ey, ex, 0] + sqrt(2*Dr/dt)*(I - e⊗e)·xi
+
+where xi is a vector of normally distributed noise. The projection
+(I - e⊗e)·xi is calculated as xi - (e·xi)e, so only elementwise operations
+on the (N, 3) direction array are used and no 3x3 matrix is built for any
+bacterium.
+
+Two steps are available, euler_maruyama_step (the step used by Bacteria3D)
+and exact_step, which applies the clinostat rotation exactly and rotational
+diffusion as a random geodesic move on the sphere, so stays accurate at much
+larger timesteps.
+'''
+
+# Imports #####################################################################
+
+# modules
+import numpy as np
+
+###############################################################################
+
+
+def random_directions(n, rng=None):
+    '''
+    Generates a random swimming direction for each of n bacteria, uniformly
+    distributed on the unit sphere.
+
+    :param n: integer, number of directions to generate
+    :param rng: source of random numbers, global numpy state if None
+
+    :returns directions: [n, 3] float array of unit vectors
+    '''
+    rng = np.random if rng is None else rng
+
+    # cos of the polar angle is sampled, as it is uniform for directions
+    # uniform on the sphere (the polar angle itself isnt)
+    costheta = rng.uniform(-1, 1, size=n)
+    phi = rng.uniform(0, 2*np.pi, size=n)
+    sintheta = np.sqrt(1 - costheta**2)
+
+    # converting from spherical to cartesian coordinates
+    directions = np.empty([n, 3])
+    directions[:, 0] = sintheta*np.cos(phi)
+    directions[:, 1] = sintheta*np.sin(phi)
+    directions[:, 2] = costheta
+
+    return directions
+
+
+def row_dot(a, b):
+    '''
+    Dot product of each row of two [N, 3] arrays.
+
+    :returns dot: [N] float array
+    '''
+    return a[:, 0]*b[:, 0] + a[:, 1]*b[:, 1] + a[:, 2]*b[:, 2]
+
+
+def normalise(e, where):
+    '''
+    Normalises the rows of e selected by where to unit length, in place.
+
+    :param e: [N, 3] float array of directions
+    :param where: [N] boolean array, rows to normalise
+    '''
+    magnitude = np.sqrt(row_dot(e, e))
+    np.divide(e, magnitude[:, None], out=e, where=where[:, None])
+
+
+def euler_maruyama_step(e, omega, rotational_diffusion_coefficient, dt, noise, where):
+    '''
+    Euler-Maruyama step of the swimming direction of every bacterium, done in
+    place and followed by renormalisation.
+
+    :param e: [N, 3] float array, current swimming direction unit vectors (changed in place)
+    :param omega: float or [N] float array, rotational speed of clinostat in rad/s
+    :param rotational_diffusion_coefficient: float or [N] float array, in 1/s
+    :param dt: float, timestep of simulation in s
+    :param noise: [N, 3] float array of normal noise, used as work space
+    :param where: [N] boolean array, only these rows of e are updated
+    '''
+
+    # coefficients of each term, as columns so they broadcast over xyz
+    coeff = (np.sqrt(2*np.asarray(rotational_diffusion_coefficient)/dt)*dt)
+    rot = np.asarray(omega)*dt
+    if np.ndim(coeff) == 1:
+        coeff = coeff[:, None]
+
+    # diffusion term, (I - e⊗e)·xi = xi - (e·xi)e
+    step = noise
+    step -= row_dot(e, noise)[:, None]*e
+    step *= coeff
+
+    # rotation term, omega*[-ey, ex, 0]
+    step[:, 0] -= rot*e[:, 1]
+    step[:, 1] += rot*e[:, 0]
+
+    # calculating new direction and normalising for unit vector
+    np.add(e, step, out=e, where=where[:, None])
+    normalise(e, where)
+
+
+def rotate_about_z(e, angle, where):
+    '''
+    Rotates the rows of e selected by where about the z axis (the axis of the
+    clinostat) by angle, in place. This is the exact solution of the rotation
+    term omega*[-ey, ex, 0] over a timestep, with angle = omega*dt.
+
+    :param e: [N, 3] float array of directions
+    :param angle: float or [N] float array, angle of rotation in radians
+    :param where: [N] boolean array, rows to rotate
+    '''
+    cos_angle = np.cos(angle)
+    sin_angle = np.sin(angle)
+
+    ex = np.where(where, cos_angle*e[:, 0] - sin_angle*e[:, 1], e[:, 0])
+    ey = np.where(where, sin_angle*e[:, 0] + cos_angle*e[:, 1], e[:, 1])
+
+    e[:, 0] = ex
+    e[:, 1] = ey
+
+
+def tilt(e, theta, phi):
+    '''
+    Moves each direction e along the surface of the unit sphere by the
+    geodesic angle theta, in the direction given by the azimuthal angle phi
+    around e.
+
+    :param e: [n, 3] float array of unit vectors
+    :param theta: [n] float array, geodesic angle to move each direction by
+    :param phi: [n] float array, azimuthal angle of each move around e
+
+    :returns new: [n, 3] float array of unit vectors
+    '''
+
+    # any vector not parallel to e, used to build two unit vectors
+    # perpendicular to e
+    helper = np.zeros_like(e)
+    helper[:, 0] = 1.0
+    parallel = np.abs(e[:, 0]) > 0.9
+    helper[parallel] = [0.0, 1.0, 0.0]
+
+    b1 = np.cross(e, helper)
+    b1 /= np.sqrt(row_dot(b1, b1))[:, None]
+    b2 = np.cross(e, b1)
+
+    # moving along the great circle in the direction cos(phi)b1 + sin(phi)b2
+    tangent = np.cos(phi)[:, None]*b1 + np.sin(phi)[:, None]*b2
+    new = np.cos(theta)[:, None]*e + np.sin(theta)[:, None]*tangent
+
+    return new
+
+
+class GeodesicAngleSampler(object):
+    '''
+    Class used to draw the geodesic angle a direction moves through on the unit
+    sphere in time dt under rotational diffusion with coefficient Dr.
+
+    The angle theta is drawn from the exact distribution (the heat kernel on the
+    sphere) with cumulative distribution, in terms of u = cos(theta),
+
+        P(cos(theta) <= u) = (u + 1)/2 + sum_l exp(-l(l+1)Dr dt)(P_l+1(u) - P_l-1(u))/2
+
+    where P_l are Legendre polynomials, by inverting a tabulated version of it.
+    For Dr*dt small enough the distribution is indistinguishable from the
+    small angle limit, where theta = sqrt(2 Dr dt)*|xi| with xi a 2D normal
+    vector, which is used instead.
+    '''
+
+    # below this value of Dr*dt the small angle limit is used
+    small_tau = 1E-3
+
+    def __init__(self, rotational_diffusion_coefficient, dt, grid_size=4001, tolerance=1E-12):
+        '''
+        :param rotational_diffusion_coefficient: float, rotational diffusion coefficient in 1/s
+        :param dt: float, timestep of simulation in s
+        :param grid_size: integer, number of angles the distribution is tabulated at
+        :param tolerance: float, size of the last term kept in the Legendre series
+        '''
+
+        self.tau = float(rotational_diffusion_coefficient)*float(dt) # dimensionless diffusion time
+
+        if self.tau >= self.small_tau:
+
+            # number of terms needed before exp(-l(l+1)tau) drops below the tolerance
+            l_max = int(np.ceil(np.sqrt(-np.log(tolerance)/self.tau))) + 1
+
+            # tabulating the cumulative distribution of the angle on a grid of angles
+            self.theta = np.linspace(0, np.pi, grid_size)
+            u = np.cos(self.theta)
+
+            cdf_u = (u + 1)/2
+            for l in range(1, l_max + 1):
+                p_above = np.polynomial.legendre.legval(u, np.eye(l + 2)[l + 1])
+                p_below = np.polynomial.legendre.legval(u, np.eye(l)[l - 1])
+                cdf_u += np.exp(-l*(l + 1)*self.tau)*(p_above - p_below)/2
+
+            # probability that the angle is smaller than each grid angle, forced
+            # to be monotonic to remove rounding errors in the series
+            self.cdf = np.maximum.accumulate(np.clip(1 - cdf_u, 0, 1))
+            self.cdf /= self.cdf[-1]
+
+
+    def sample(self, n, rng=None):
+        '''
+        Draws n geodesic angles.
+
+        :param n: integer, number of angles to draw
+        :param rng: source of random numbers, global numpy state if None
+
+        :returns theta: [n] float array, angles in radians
+        '''
+        rng = np.random if rng is None else rng
+
+        if self.tau < self.small_tau:
+            return np.sqrt(2*self.tau)*np.sqrt(rng.normal(0, 1, size=n)**2 + rng.normal(0, 1, size=n)**2)
+
+        # inverse transform sampling of the tabulated distribution
+        return np.interp(rng.uniform(0, 1, size=n), self.cdf, self.theta)
+
+
+def exact_step(e, omega, dt, angle_sampler, where, rng=None):
+    '''
+    Exact step of the swimming direction of every bacterium, done in place.
+
+    The clinostat rotation is applied exactly as a rotation by omega*dt about
+    the z axis, and rotational diffusion as a move along the sphere by a
+    geodesic angle drawn from its exact distribution in a uniformly random
+    direction. As rotational diffusion is the same in every direction the two
+    parts can be applied one after the other without error, so the step stays
+    accurate for timesteps much larger than euler_maruyama_step allows.
+
+    :param e: [N, 3] float array, current swimming direction unit vectors (changed in place)
+    :param omega: float or [N] float array, rotational speed of clinostat in rad/s
+    :param dt: float, timestep of simulation in s
+    :param angle_sampler: GeodesicAngleSampler for the rotational diffusion coefficient and dt
+    :param where: [N] boolean array, only these rows of e are updated
+    :param rng: source of random numbers, global numpy state if None
+    '''
+    rng = np.random if rng is None else rng
+
+    # rotation of the clinostat
+    rotate_about_z(e, np.asarray(omega)*dt, where)
+
+    # rotational diffusion
+    rows = np.flatnonzero(where)
+    theta = angle_sampler.sample(len(rows), rng)
+    phi = rng.uniform(0, 2*np.pi, size=len(rows))
+    e[rows] = tilt(e[rows], theta, phi)
+    normalise(e, where)
@@ -0,0 +1,289 @@
+'''
+This script contains the functions used to run a sweep of simulations (every
+combination of configuration file, initial conditions file and run) in
+parallel, on a pool of processes sized to the number of available cores.
+
+Each simulation of the sweep is a job. The configuration and initial
+conditions files of the sweep are read once, each job holds its parameters
+(SimulationParameters) and initial population in memory, so nothing is
+written to or read from the input files while the sweep runs and jobs can
+not interfere with each other.
+
+Every job is given its own random number streams (see RandomStreams.py),
+seeded from a single seed for the whole sweep (numpy SeedSequence). The
+streams of a job only depend on this seed and the position of the job in the
+full (sorted) sweep, so a run gives the same result whether it is run alone,
+with the rest of the sweep, in a batch (Batch.py) or after a restart. The
+seed of each run is saved with its output.
+
+As in runExp3.py, jobs whose positions file already exists are skipped, so an
+interrupted sweep can be restarted and only the missing runs are simulated.
+The output files of a run are created as soon as it starts, so a marker file
+(STARTED_FILE) is written in its output folder before the simulation starts
+and removed once the simulation has returned and its output is closed. A run
+killed part way through (e.g interrupted, out of memory or a lost node)
+still has its marker, its partial output is removed and it is run again.
+Output without a marker (e.g written before markers were used) is always
+treated as complete and never removed.
+'''
+
+# Imports #####################################################################
+
+# modules
+import numpy as np
+import multiprocessing as mp
+import contextlib
+import shutil
+import time
+import sys
+import os
+
+# class
+from SimParameters import SimulationParameters
+from Population import Population
+from RandomStreams import generator
+from InitialConditions import set_initial_conditions
+
+###############################################################################
+
+# file in the output folder of a run while the run is being simulated
+STARTED_FILE = 'started'
+
+
+class Job(object):
+    '''
+    Class used to hold everything needed to run one simulation of a sweep.
+    '''
+
+    def __init__(self, params, population, output_folder, seed, start_region=None, random_directions=False,
+                 output_format='csv', options=None):
+        '''
+        :param params: SimulationParameters instance, parameters of the run
+        :param population: Population instance, initial conditions of the run (not changed by the run)
+        :param output_folder: string, path to folder the output of the run is stored in
+        :param seed: numpy SeedSequence, seed of the random number streams of the run
+        :param start_region: tuple of floats, (inner radius, outer radius, height) [m] of
+        the hollow cylinder the starting position of each bacterium is sampled from, if
+        None the positions of population are used
+        :param random_directions: boolean, sample the starting swimming direction of each
+        bacterium uniformly on the unit sphere, else the directions of population are used
+        :param output_format: string, 'csv' or 'binary', output format of BacStroke.main
+        :param options: dictionary, any other keyword arguments passed to BacStroke.main
+        '''
+        self.params = params
+        self.population = population
+        self.output_folder = output_folder
+        self.seed = seed
+        self.start_region = start_region
+        self.random_directions = random_directions
+        self.output_format = output_format
+        self.options = {} if options is None else options
+
+
+    def output_path(self, name):
+        '''
+        Path to a file within the output folder of the run.
+        '''
+        return os.path.join(self.output_folder, name)
+
+
+    def is_complete(self):
+        '''
+        Checks if the output of the run already exists, and isnt the partial
+        output of a run that was started and didnt finish.
+        '''
+        if os.path.isfile(self.output_path(STARTED_FILE)):
+            return False
+
+        if self.output_format == 'binary':
+            return os.path.isfile(os.path.join(self.output_path('positions.traj'), 'header.json'))
+
+        return os.path.isfile(self.output_path('positions.csv'))
+
+
+    def mark_started(self):
+        '''
+        Writes the marker file of the run, called before its output is opened.
+        '''
+        with open(self.output_path(STARTED_FILE), 'w') as file:
+            file.write(time.strftime('%Y-%m-%d %H:%M:%S') + '\n')
+
+
+    def mark_complete(self):
+        '''
+        Removes the marker file of the run, called once its output is closed.
+        '''
+        os.remove(self.output_path(STARTED_FILE))
+
+
+    def remove_output(self):
+        '''
+        Removes the positions output of a run that was started and didnt
+        finish, so it isnt skipped when the sweep is restarted. Output of a
+        run without a marker file wasnt written by an unfinished run and is
+        never removed.
+        '''
+        if not os.path.isfile(self.output_path(STARTED_FILE)):
+            return
+
+        if os.path.isdir(self.output_path('positions.traj')):
+            shutil.rmtree(self.output_path('positions.traj'))
+
+        if os.path.isfile(self.output_path('positions.csv')):
+            os.remove(self.output_path('positions.csv'))
+
+
+def sweep_jobs(config_files, ic_files, runs, output_root, seed=None, **job_options):
+    '''
+    Builds the job of every combination of configuration file, initial
+    conditions file and run. The output of each job is stored in
+    output_root/<config name>,<ic name>/run_<run number>, as in runExp3.py.
+
+    :param config_files: list of strings, paths to configuration files
+    :param ic_files: list of strings, paths to initial conditions files
+    :param runs: integer, number of runs of each combination
+    :param output_root: string, path to folder the sweep output is stored in
+    :param seed: integer, seed of the whole sweep, if None one is chosen and
+    printed so the sweep can be repeated
+    :param job_options: any other keyword arguments of Job
+
+    :returns jobs: list of Job instances
+    '''
+
+    seed_sequence = np.random.SeedSequence(seed)
+    if seed is None:
+        print('Sweep seed: ' + str(seed_sequence.entropy))
+
+    # sorted so the random stream of each job doesnt depend on the order
+    # os.listdir returns files in
+    config_files = sorted(config_files)
+    ic_files = sorted(ic_files)
+
+    # every input file is read once, here
+    configs = [SimulationParameters.from_config_file(config_file) for config_file in config_files]
+    populations = []
+    for ic_file in ic_files:
+        with open(ic_file, 'r') as file:
+            populations.append(Population.new_population(file))
+
+    # one independent stream per job
+    seeds = seed_sequence.spawn(len(config_files)*len(ic_files)*runs)
+
+    jobs = []
+    for config_file, params in zip(config_files, configs):
+        for ic_file, population in zip(ic_files, populations):
+
+            # name of folder to store data for this config + ic set
+            direct = os.path.join(output_root, os.path.basename(config_file) + ',' + os.path.basename(ic_file))
+
+            for i in range(runs):
+                jobs.append(Job(params, population, os.path.join(direct, 'run_' + str(i+1)), seeds[len(jobs)], **job_options))
+
+    return jobs
+
+
+def prepare_job(job):
+    '''
+    Creates the initial population of one run, sampling its starting positions
+    and swimming directions if needed.
+
+    :param job: Job instance
+
+    :returns population: Population instance
+    '''
+    # the population of the job is shared by every run with the same initial conditions
+    population = job.population.copy()
+
+    return set_initial_conditions(population, job.start_region, job.random_directions,
+                                  rng=generator(job.seed, 'initial'))
+
+
+def run_job(job):
+    '''
+    Runs the simulation of one job, called by each worker process. Everything
+    the simulation prints is written to log.txt in the output folder of the run.
+
+    :param job: Job instance
+
+    :returns result: tuple, (output folder, time taken [s], error message or None)
+    '''
+    start = time.time()
+
+    # figures are drawn without a display in the worker processes
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    import BacStroke as bac
+
+    try:
+        if not os.path.isdir(job.output_folder):
+            os.makedirs(job.output_folder)
+
+        # output left by an earlier attempt of the run that didnt finish
+        job.remove_output()
+        job.mark_started()
+
+        with open(job.output_path('log.txt'), 'w') as log, contextlib.redirect_stdout(log):
+            population = prepare_job(job)
+            bac.simulate(job.params, population, job.output_path('positions.csv'), job.output_path('tumbles.csv'),
+                         job.output_path('time.csv'), job.output_path('swimming_direction.csv'),
+                         job.output_path('trajectory.png'), output_format=job.output_format,
+                         seed=job.seed, **job.options)
+
+        # only reached once the output of the run is closed
+        job.mark_complete()
+
+    except Exception as error:
+        # removing partial output so the run isnt skipped on a restart
+        job.remove_output()
+        return job.output_folder, time.time() - start, repr(error)
+
+    finally:
+        # figures are never shown in a worker, closing them stops them piling up
+        plt.close('all')
+
+    return job.output_folder, time.time() - start, None
+
+
+def run_sweep(jobs, processes=None):
+    '''
+    Runs every job that doesnt already have its output, on a pool of processes.
+    Progress of the whole sweep is printed as each job finishes.
+
+    :param jobs: list of Job instances, e.g from sweep_jobs
+    :param processes: integer, number of worker processes, number of available cores if None
+
+    :returns failed: list of tuples, (output folder, error message) of every job that failed
+    '''
+
+    # skipping runs that have already been simulated
+    pending = [job for job in jobs if not job.is_complete()]
+    print(str(len(jobs) - len(pending)) + ' of ' + str(len(jobs)) + ' runs already complete')
+
+    if len(pending) == 0:
+        return []
+
+    if processes is None:
+        processes = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count()
+    processes = max(1, min(processes, len(pending)))
+
+    failed = []
+    start = time.time()
+
+    # jobs are handed out one at a time, so a slow run doesnt hold up others
+    with mp.Pool(processes) as pool:
+        for done, (output_folder, elapsed, error) in enumerate(pool.imap_unordered(run_job, pending, chunksize=1), 1):
+
+            if error is not None:
+                failed.append((output_folder, error))
+
+            # progress of the whole sweep, with the time left estimated from
+            # the average time per run so far
+            total_elapsed = time.time() - start
+            remaining = total_elapsed/done*(len(pending) - done)
+            print('Progress: ' + str(done) + ' out of ' + str(len(pending)) + ' runs'
+                  + ', elapsed ' + str(round(total_elapsed)) + 's, remaining ~' + str(round(remaining)) + 's'
+                  + (', FAILED ' + output_folder + ': ' + error if error is not None else ''))
+            sys.stdout.flush()
+
+    return failed
@@ -0,0 +1,338 @@
+'''
+This script contains the Population class. This class is used to describe a
+whole (dilute, non-interacting) population of bacteria present within a
+clinostat.
+
+It is the array version of the Bacteria3D class. Instead of holding one
+instance per bacterium, every property of the population is stored as a
+numpy array with one row per bacterium, positions and velocities are (N, 3)
+arrays and radii, masses and swimming speeds are (N,) arrays. Each velocity
+term is then calculated for every bacterium at once, which removes the per
+bacterium python loop from the time integration in BacStroke.py.
+
+The physics in each method is the same as the method of the same name in
+Bacteria3D.py.
+'''
+
+# Imports #####################################################################
+
+# modules
+import numpy as np
+
+# external files
+import Orientation as o
+from RandomStreams import RandomStreams
+
+###############################################################################
+
+
+class Population(object):
+    '''
+    Class used to describe a population of bacteria modelled as point particles
+    in fluid moving as a solid body within a clinostat.
+    '''
+
+    def __init__(self, mass, position, radius, swimming_vel):
+        """
+        Initialises a population of N point particles in 3D space
+
+        :param mass: [N] float array, mass of each bacterium
+        :param position: [N, 3] float array w/ position of each bacterium
+        :param radius: [N] float array, radius of each bacterium assumed to be shape sphere
+        :param swimming_vel: [N] float array, swimming speed of each bacterium
+        """
+
+        self.mass = np.array(mass, float).reshape(-1) # bouyant bacterial mass in kg
+        self.pos = np.array(position, float).reshape(-1, 3) # bacterial position in [x,y,z], each component in m
+        self.rad = np.array(radius, float).reshape(-1) # bacterial radius in m
+        self.swim = np.array(swimming_vel, float).reshape(-1) # swimming speed in m/s
+
+        # number of bacteria in the population
+        self.n = len(self.rad)
+
+        # initialising direction of swimming, same starting direction as Bacteria3D
+        self.swim_direction = np.zeros([self.n, 3])
+        self.swim_direction[:, 1] = 1.0
+        self.swim_vel = self.swim[:, None]*self.swim_direction # swimming velocity in m/s, [N, 3] array
+
+        # velocity terms, all [N, 3] arrays in m/s
+        self.term_vel = np.zeros([self.n, 3])
+        self.centripetal_vel = np.zeros([self.n, 3])
+        self.rot_vel = np.zeros([self.n, 3])
+        self.vel = np.zeros([self.n, 3])
+        self.vel_rotation = np.zeros([self.n, 3])
+
+        # source of random numbers for the population, unseeded until
+        # BacStroke.simulate gives it the streams of the run
+        self.streams = RandomStreams(self.n)
+
+        # distributions of rotational diffusion angles for the exact orientation
+        # step, one per (rotational diffusion coefficient, timestep)
+        self.angle_samplers = {}
+
+        # configuration each bacterium belongs to, when several configurations
+        # are simulated together as one population (see Batch.py)
+        self.config_id = np.zeros(self.n, dtype=int)
+
+
+    def __len__(self):
+        '''
+        Number of bacteria in the population.
+        '''
+        return self.n
+
+
+    def copy(self):
+        '''
+        Returns a copy of the population, e.g to run several simulations from
+        the same initial conditions (a simulation changes its population in place).
+
+        :returns population: Population instance
+        '''
+        population = Population(self.mass, self.pos, self.rad, self.swim)
+
+        population.swim_direction = np.copy(self.swim_direction)
+        population.swim_vel = population.swim[:, None]*population.swim_direction
+        population.config_id = np.copy(self.config_id)
+
+        return population
+
+
+    @staticmethod
+    def concatenate(populations):
+        '''
+        Joins several populations into one, the bacteria of populations[k] are
+        given config_id k.
+
+        :param populations: list of Population instances
+
+        :returns population: Population instance
+        '''
+        population = Population(np.concatenate([p.mass for p in populations]),
+                                np.concatenate([p.pos for p in populations]),
+                                np.concatenate([p.rad for p in populations]),
+                                np.concatenate([p.swim for p in populations]))
+
+        population.swim_direction = np.concatenate([p.swim_direction for p in populations])
+        population.swim_vel = population.swim[:, None]*population.swim_direction
+        population.config_id = np.repeat(np.arange(len(populations)), [len(p) for p in populations])
+
+        return population
+
+
+    def planar_position(self):
+        '''
+        Returns the position of every bacterium projected onto the circular
+        face of the clinostat (z component set to 0).
+
+        :returns planar: [N, 3] float array
+        '''
+        planar = np.copy(self.pos)
+        planar[:, 2] = 0
+
+        return planar
+
+
+    def terminal_vel(self, viscosity_coeff, density, g):
+        '''
+        Calculates the terminal velocity of every bacterium in the population.
+
+        :param viscosity_coeff: float or [N] float array, viscosity coefficient in PaS for liquid in sim.
+        :param density: float or [N] float array, density in kg/m^3 for the same liquid
+        :param g: float or [N] float array, gavitational constant in kg/m^2 for desired environment
+        '''
+
+        # bouyant mass of each bacterium
+        bm = (4/3)*np.pi*density*(self.rad**3)*((1050/density) - 1)
+
+        # gravity acts in y direction therefore terminal velocity in y direction
+        VTy = bm*g/(6*np.pi*viscosity_coeff*self.rad)
+
+        self.term_vel = np.zeros([self.n, 3])
+        self.term_vel[:, 1] = -VTy # negative comes from coordinate definition
+
+
+    def centripetal_force(self, viscosity_coeff, fluid_density, omega, status):
+        '''
+        Calculates velocity due to centripetal force to offset the drag force,
+        at the current position of every bacterium.
+
+        :param viscosity_coeff: float or [N] float array, viscosity coefficient in PaS for liquid in sim.
+        :param fluid_density: float or [N] float array, density in kg/m^3 for the same liquid
+        :param omega: float or [N] float array, rotational speed of clinostat in rad/s
+        :param status: String, True means centripetal force is on, False means its off,
+        or a boolean or [N] boolean array (one value per bacterium)
+        '''
+
+        if isinstance(status, str):
+            status = {'True': True, 'False': False}.get(status)
+
+        # centripetal force is on (for at least one bacterium)
+        if status is not None and np.any(status):
+
+            # bouyant mass of each bacterium
+            bm = (4/3)*np.pi*fluid_density*(self.rad**3)*((1050/fluid_density) - 1)
+
+            # centripetal force being offset by drag force
+            factor = bm*(omega**2)/(6*np.pi*viscosity_coeff*self.rad)
+            if np.ndim(status) == 1:
+                factor = factor*status
+            self.centripetal_vel = factor[:, None]*self.planar_position()
+
+        # centripetal force is off
+        elif status is not None:
+
+            self.centripetal_vel = np.zeros([self.n, 3])
+
+
+    def rotational_vel(self, omega):
+        '''
+        This function calculates the rotational velocity of every bacterium
+        at its current position.
+
+        :param omega: float or [N] float array, rotational speed of clinostat in rad/s
+        '''
+
+        self.rot_vel = np.zeros([self.n, 3])
+        self.rot_vel[:, 0] = -self.pos[:, 1]*omega
+        self.rot_vel[:, 1] = self.pos[:, 0]*omega
+
+
+    def update_vel(self, dt, diffusion_coefficient):
+        '''
+        Calculates the total velocity of every bacterium from each of its
+        velocity terms.
+
+        :param dt: float, timestep of simulation
+        :param diffusion_coefficient: float or [N] float array, diffusion coefficent of bacteria in medium, in m^2/s
+        '''
+
+        # generating a noise vector for each bacterium from a normal distribution
+        noise = self.streams.normal('translation')
+
+        # diffusion, coefficient as a column so it broadcasts over xyz
+        scale = np.sqrt(2*np.asarray(diffusion_coefficient)/dt)
+        if np.ndim(scale) == 1:
+            scale = scale[:, None]
+        diffusion = noise*scale
+
+        self.vel = self.term_vel + diffusion + self.rot_vel + self.swim[:, None]*self.swim_direction + self.centripetal_vel
+
+        # rotational velocity included in vel, so it can be separated from the
+        # other velocity terms by the exact position update
+        self.vel_rotation = self.rot_vel
+
+
+    def update_pos(self, dt, method='euler', omega=0.0):
+        """
+        Updates the position of every bacterium in the population
+
+        :param dt: float, timestep
+        :param method: string, 'euler' for a forward Euler step with the total
+        velocity, or 'exact' to move each bacterium by every velocity term
+        except the clinostat rotation and then rotate its planar coordinates
+        by omega*dt about the axis of the clinostat. The exact update keeps
+        the solid body rotation from spiralling bacteria outwards at large
+        omega*dt.
+        :param omega: float or [N] float array, rotational speed of clinostat in rad/s (exact method only)
+        """
+
+        if method == 'euler':
+            self.pos += self.vel*dt # adding new position vector to previous position vector
+
+        elif method == 'exact':
+
+            # every velocity term except the clinostat rotation
+            self.pos += (self.vel - self.vel_rotation)*dt
+
+            # rotating the planar coordinates as a solid body
+            angle = np.asarray(omega)*dt
+            cos_angle = np.cos(angle)
+            sin_angle = np.sin(angle)
+            x = np.copy(self.pos[:, 0])
+            y = self.pos[:, 1]
+
+            self.pos[:, 0] = cos_angle*x - sin_angle*y
+            self.pos[:, 1] = sin_angle*x + cos_angle*y
+
+        else:
+            raise ValueError("method must be 'euler' or 'exact', not " + str(method))
+
+
+    def update_swimming_vel(self, omega, rotational_diffusion_coefficient, dt, tumbles, mask=None, method='euler'):
+        '''
+        This function updates the swimming velocity of the bacteria.
+
+        :param omega: float or [N] float array, rotational speed of clinostat in rad/s
+        :param rotational_diffusion_coefficient: float or [N] float array, rotational diffusion coefficient in 1/s
+        :param dt: float, timestep of simulation in s
+        :param tumbles: [N] integer array, 1 = bacterium tumbles, 0 = it doesnt
+        :param mask: [N] boolean array, only bacteria set True are updated, all if None
+        :param method: string, 'euler' for an Euler-Maruyama step or 'exact' for
+        the exact rotation and geodesic diffusion step (see Orientation.py)
+        '''
+
+        if mask is None:
+            mask = np.ones(self.n, dtype=bool)
+
+        # bacteria that tumble get a random new swimming direction
+        tumbling = mask & (tumbles == 1)
+        if np.any(tumbling):
+            rows = np.flatnonzero(tumbling)
+            self.swim_direction[rows] = o.random_directions(len(rows), self.streams.rows('directions', rows))
+
+        # bacteria that dont tumble swim in their new direction, the update is
+        # done in place on the direction array and only kept for these bacteria
+        swimming = mask & (tumbles == 0)
+
+        if method == 'euler':
+            noise = self.streams.normal('orientation') # different from noise vector in diffusion velocity (avoids coupling)
+            o.euler_maruyama_step(self.swim_direction, omega, rotational_diffusion_coefficient, dt, noise, swimming)
+
+        elif method == 'exact':
+
+            # bacteria are stepped in groups with the same rotational
+            # diffusion coefficient, as each needs its own distribution of angles
+            Dr = np.asarray(rotational_diffusion_coefficient, float)
+            if Dr.ndim == 0:
+                groups = [(float(Dr), swimming)]
+            else:
+                groups = [(float(value), swimming & (Dr == value)) for value in np.unique(Dr)]
+
+            for value, where in groups:
+
+                # each distribution is only tabulated once
+                key = (value, float(dt))
+                if key not in self.angle_samplers:
+                    self.angle_samplers[key] = o.GeodesicAngleSampler(*key)
+
+                rng = self.streams.rows('geodesic', np.flatnonzero(where))
+                o.exact_step(self.swim_direction, omega, dt, self.angle_samplers[key], where, rng)
+
+        else:
+            raise ValueError("method must be 'euler' or 'exact', not " + str(method))
+
+        np.multiply(self.swim[:, None], self.swim_direction, out=self.swim_vel)
+
+
+    @staticmethod
+    def new_population(file_handle):
+        """
+        Initialises a Population instance given an input file handle.
+
+        The input file should contain one line per bacterium in the following
+        format (same as Bacteria3D.new_b3d):
+        <mass>  <radius>  <x> <y> <z>  <vs>
+
+        :param file_handle: Readable file handle in the above format
+        :return: Population instance
+        """
+        # every non empty line describes one bacterium
+        p = np.array([line.split() for line in file_handle if line.strip()], float).reshape(-1, 6)
+
+        mass = p[:, 0] # bacterial mass in kg
+        radius = p[:, 1] # radius of bacteria in m
+        position = p[:, 2:5] # x,y,z component in m from origin
+        swimming_vel = p[:, 5] # swimming velocity of bacteria in m/s
+
+        return Population(mass, position, radius, swimming_vel)
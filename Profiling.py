@@ -0,0 +1,210 @@
+'''
+This script contains the ComponentProfiler class, used to find how the time
+of each timestep of BacStroke.py is split between the physics components
+and the boundary conditions:
+
+    gravity:               Population.terminal_vel (once, before the first
+                           timestep, the terminal velocity doesnt change)
+    centripetal:           Population.centripetal_force
+    rotation:              Population.rotational_vel
+    position:              Population.update_pos
+    diffusion:             Population.update_vel (total velocity and the
+                           translational diffusion noise)
+    tumbling:              TumbleSampler.sample
+    swimming:              Population.update_swimming_vel
+    boundaries: masks      finding the bacteria at each wall
+    boundaries: outer      moving bacteria back from the outer wall (only
+                           timed on timesteps a bacterium is at the wall)
+    boundaries: inner      moving bacteria back from the inner wall (same)
+    boundaries: ends       moving bacteria back from the ends
+    escape check:          finding bacteria outside the clinostat (only on
+                           the recorded timesteps, or the last timestep if
+                           no trajectory is recorded)
+    fused step:            FusedStepper.step (engine='numba', every component
+                           in one compiled loop, so not split up)
+
+It is opt in (BacStroke.main(..., profiler=ComponentProfiler())). The
+methods of the population and tumbler of a run are replaced by timed
+wrappers on those instances only, for the length of the run, so nothing is
+timed and nothing runs slower when it isnt used. The time of the whole run
+from the initial velocities to the last timestep is also measured, the rest
+of it (recording the trajectory, accumulators, ...) is reported as other. A
+summary is printed at the end of the run and the times are saved with the
+accumulators (observables_file).
+'''
+
+# Imports #####################################################################
+
+# modules
+import numpy as np
+import time
+
+###############################################################################
+
+# component timed for each method of the population, tumbler and fused stepper
+POPULATION_METHODS = {'terminal_vel': 'gravity',
+                      'centripetal_force': 'centripetal',
+                      'rotational_vel': 'rotation',
+                      'update_pos': 'position',
+                      'update_vel': 'diffusion',
+                      'update_swimming_vel': 'swimming'}
+TUMBLER_METHODS = {'sample': 'tumbling'}
+STEPPER_METHODS = {'step': 'fused step'}
+
+
+class ComponentProfiler(object):
+    '''
+    Class used to accumulate the wall time and number of calls of each
+    component of a simulation.
+    '''
+
+    def __init__(self, name='profile'):
+        '''
+        :param name: string, name the results are stored under (see Observables.save_results)
+        '''
+        self.name = name
+        self.reset()
+
+
+    def reset(self):
+        '''
+        Clears every time measured so far.
+        '''
+        self.seconds = {}
+        self.calls = {}
+        self.total = 0.0
+        self.run_start = None
+
+        # time of the last checkpoint (see mark and lap)
+        self.last = 0.0
+
+        # instances whose methods are timed, and the names of those methods
+        self.instrumented = []
+
+
+    def add(self, component, seconds):
+        '''
+        Adds one call of a component.
+        '''
+        self.seconds[component] = self.seconds.get(component, 0.0) + seconds
+        self.calls[component] = self.calls.get(component, 0) + 1
+
+
+    def timed(self, component, function):
+        '''
+        Wrapper of a function that adds the time of each call to a component.
+        '''
+        def timed_function(*args, **kwargs):
+            start = time.perf_counter()
+            result = function(*args, **kwargs)
+            self.add(component, time.perf_counter() - start)
+            return result
+
+        return timed_function
+
+
+    def instrument(self, instance, methods):
+        '''
+        Times methods of one instance until stop is called.
+
+        :param instance: object, e.g Population or TumbleSampler instance
+        :param methods: dictionary, component timed for each method name
+        '''
+        if instance is None:
+            return
+
+        for method, component in methods.items():
+            setattr(instance, method, self.timed(component, getattr(instance, method)))
+
+        self.instrumented.append((instance, list(methods)))
+
+
+    def start(self, bacteria):
+        '''
+        Starts timing a run, called by BacStroke.simulate before the initial
+        velocities are found.
+
+        :param bacteria: Population instance of the run
+        '''
+        self.instrument(bacteria, POPULATION_METHODS)
+        self.run_start = time.perf_counter()
+
+
+    def start_steps(self, tumbler, stepper=None):
+        '''
+        Times the tumbler and fused stepper of a run, once they are made.
+
+        :param tumbler: TumbleSampler instance of the run
+        :param stepper: FusedStepper instance of the run, if used
+        '''
+        self.instrument(tumbler, TUMBLER_METHODS)
+        self.instrument(stepper, STEPPER_METHODS)
+
+
+    def stop(self):
+        '''
+        Stops timing the run and removes the wrappers of every instance,
+        called by BacStroke.simulate even if the run raises an error.
+        '''
+        if self.run_start is not None:
+            self.total += time.perf_counter() - self.run_start
+            self.run_start = None
+
+        for instance, methods in self.instrumented:
+            for method in methods:
+                delattr(instance, method)
+
+        self.instrumented = []
+
+
+    def mark(self):
+        '''
+        Sets a checkpoint, the start of the next lap.
+        '''
+        self.last = time.perf_counter()
+
+
+    def lap(self, component):
+        '''
+        Adds the time since the last checkpoint to a component and sets a new checkpoint.
+        '''
+        now = time.perf_counter()
+        self.add(component, now - self.last)
+        self.last = now
+
+
+    def summary(self):
+        '''
+        Table of the time taken by each component, slowest first.
+
+        :returns summary: string
+        '''
+        components = sorted(self.seconds, key=self.seconds.get, reverse=True)
+        rows = [(component, self.calls[component], self.seconds[component]) for component in components]
+
+        # time of the run not spent in any component
+        if self.total > 0:
+            rows.append(('other', 0, max(self.total - sum(self.seconds.values()), 0.0)))
+
+        lines = ['Component               calls     total [s]   per call [us]    run [%]']
+        for component, calls, seconds in rows:
+            per_call = format(1E6*seconds/calls, '13.1f') if calls else ' '*13
+            share = format(100*seconds/self.total, '8.1f') if self.total > 0 else ' '*8
+            lines.append(component.ljust(22) + (str(calls) if calls else '').rjust(7) + format(seconds, '14.4f')
+                         + '   ' + per_call + '   ' + share)
+        lines.append('run'.ljust(29) + format(self.total, '14.4f'))
+
+        return '\n'.join(lines)
+
+
+    def result(self):
+        '''
+        Time and number of calls of each component, as a dictionary of numpy arrays.
+        '''
+        result = {'run_seconds': np.array(self.total)}
+        for component in self.seconds:
+            key = component.replace(': ', '_').replace(' ', '_')
+            result[key + '_seconds'] = np.array(self.seconds[component])
+            result[key + '_calls'] = np.array(self.calls[component])
+
+        return result
@@ -0,0 +1,389 @@
+'''
+This script contains the RandomStreams class. This class is the source of
+every random number used by a simulation, in place of the global numpy
+random state.
+
+Every run has a seed (a numpy SeedSequence). Each kind of random number used
+by the simulation (see KINDS) is drawn from its own numpy Generator, spawned
+from the seed of the run, so the random numbers of one kind dont depend on
+how many of another kind were used. When several runs are simulated together
+as one population (see Batch.py) each run keeps its own streams, and with
+per_cell=True every bacterium of a run has its own streams. A run therefore
+gives the same result bit for bit whether it is simulated alone, in a batch
+or after a restart, and can be replayed from the seed saved with its output
+(seed_metadata, as_seed_sequence).
+
+Random numbers needed for every bacterium every timestep (the noise of the
+translational diffusion and of the swimming direction, and tumbling tests)
+are handed out by NoiseBuffers. A NoiseBuffer generates around 10^6 numbers
+at once into a preallocated block, each timestep only takes a view of the
+block, and the next block is filled by a background thread while the
+simulation uses the current one (numpy releases the GIL while it generates
+random numbers). The numbers handed out are the same whatever the block size
+and whether or not a background thread is used.
+'''
+
+# Imports #####################################################################
+
+# modules
+import numpy as np
+import threading
+
+###############################################################################
+
+# kinds of random numbers, each has its own stream (order must not change,
+# the index of a kind is part of the key of its stream). 'split' isnt a kind
+# of random number, its index is the key of the seeds a seed is split into
+# (one per group or per bacterium), new kinds are added after it
+KINDS = ('initial', 'translation', 'orientation', 'geodesic', 'directions', 'tumbling', 'waiting', 'split', 'bridge')
+
+
+def as_seed_sequence(seed=None):
+    '''
+    Converts a seed to a numpy SeedSequence.
+
+    :param seed: None (new random seed), integer, SeedSequence or dictionary
+    returned by seed_metadata
+
+    :returns seed_sequence: numpy SeedSequence
+    '''
+    if isinstance(seed, np.random.SeedSequence):
+        return seed
+
+    if isinstance(seed, dict):
+        return np.random.SeedSequence(seed['entropy'], spawn_key=tuple(seed['spawn_key']))
+
+    return np.random.SeedSequence(seed)
+
+
+def seed_metadata(seed):
+    '''
+    Description of a seed that can be saved (e.g as json) and passed back to
+    as_seed_sequence to replay a run.
+
+    :param seed: numpy SeedSequence
+
+    :returns metadata: dictionary, entropy and spawn key of the seed
+    '''
+    return {'entropy': seed.entropy, 'spawn_key': [int(key) for key in seed.spawn_key]}
+
+
+def child_seed(seed, *key):
+    '''
+    Child of a seed with the given key, always the same for the same seed and
+    key (unlike SeedSequence.spawn, which depends on how many children have
+    already been spawned).
+
+    :param seed: numpy SeedSequence
+    :param key: integers, added to the spawn key of seed
+
+    :returns child: numpy SeedSequence
+    '''
+    return np.random.SeedSequence(seed.entropy, spawn_key=tuple(seed.spawn_key) + tuple(key), pool_size=seed.pool_size)
+
+
+def generator(seed, kind):
+    '''
+    Generator of one kind of random number of a run, e.g generator(seed,
+    'initial') for sampling its starting position.
+
+    :param seed: numpy SeedSequence, seed of the run (or bacterium)
+    :param kind: string, one of KINDS
+
+    :returns rng: numpy Generator
+    '''
+    return np.random.default_rng(child_seed(seed, KINDS.index(kind)))
+
+
+class RowStream(object):
+    '''
+    Class used to draw random numbers for a subset of the bacteria when they
+    belong to different streams. Each row is drawn from the generator of its
+    own stream, rows of each stream in order, so the numbers a bacterium gets
+    dont depend on the other bacteria in the subset. It has the uniform,
+    normal and exponential methods of a numpy Generator, the first dimension
+    of size must be the number of rows.
+    '''
+
+    def __init__(self, generators, stream_of_row):
+        '''
+        :param generators: list of numpy Generators, one per stream
+        :param stream_of_row: [k] integer array, stream of each row
+        '''
+        self.generators = generators
+        self.stream_of_row = stream_of_row
+
+
+    def draw(self, method, size, *args):
+        '''
+        Draws random numbers with the named Generator method for every row.
+        '''
+        size = (size,) if np.ndim(size) == 0 else tuple(size)
+        values = np.empty(size)
+
+        for stream in np.unique(self.stream_of_row):
+            rows = np.flatnonzero(self.stream_of_row == stream)
+            values[rows] = getattr(self.generators[stream], method)(*args, size=(len(rows),) + size[1:])
+
+        return values
+
+
+    def uniform(self, low=0.0, high=1.0, size=None):
+        return self.draw('uniform', size, low, high)
+
+
+    def normal(self, loc=0.0, scale=1.0, size=None):
+        return self.draw('normal', size, loc, scale)
+
+
+    def exponential(self, scale=1.0, size=None):
+        return self.draw('exponential', size, scale)
+
+
+class NoiseBuffer(object):
+    '''
+    Class used to hand out random numbers for every bacterium, one timestep at
+    a time, from two preallocated blocks. One block is handed out while the
+    other is filled, in a background thread if background is True.
+
+    Each view returned by next is only valid until the next call to next after
+    the end of its block, so it must be used within its timestep.
+    '''
+
+    def __init__(self, generators, rows_of_stream, n, method, tail=(), block_size=1000, steps=None, background=True):
+        '''
+        :param generators: list of numpy Generators, one per stream
+        :param rows_of_stream: list of integer arrays, bacteria of each stream
+        :param n: integer, number of bacteria
+        :param method: string, Generator method used to fill the blocks, e.g 'standard_normal'
+        :param tail: tuple, shape of the numbers of each bacterium each timestep
+        :param block_size: integer, number of timesteps in each block
+        :param steps: integer, number of timesteps needed in total (no more are
+        generated ahead of time), unknown if None
+        :param background: boolean, fill the next block in a background thread
+        '''
+
+        self.generators = generators
+        self.rows_of_stream = rows_of_stream
+        self.method = method
+        self.tail = tail
+        self.steps = steps
+        self.background = background
+
+        if steps is not None:
+            block_size = max(1, min(block_size, steps))
+
+        self.blocks = [np.empty((block_size, n) + tail), np.empty((block_size, n) + tail)]
+
+        # block currently handed out and index of its next timestep
+        self.current = 0
+        self.index = 0
+
+        # timesteps generated so far, and the thread filling the other block
+        # (None once it has finished, or if it isnt being filled)
+        self.generated = 0
+        self.thread = None
+        self.other_filled = False
+
+        self.fill(self.blocks[0])
+        self.generated += block_size
+        self.start_fill()
+
+
+    def fill(self, block):
+        '''
+        Fills a block with the next random numbers of every stream.
+        '''
+        if len(self.generators) == 1:
+            # a single stream fills the block in place
+            getattr(self.generators[0], self.method)(out=block)
+        else:
+            for rng, rows in zip(self.generators, self.rows_of_stream):
+                block[:, rows] = getattr(rng, self.method)(size=(len(block), len(rows)) + self.tail)
+
+
+    def start_fill(self):
+        '''
+        Starts filling the block that isnt being handed out, if more timesteps
+        are needed.
+        '''
+        if self.steps is not None and self.generated >= self.steps:
+            return
+
+        other = self.blocks[1 - self.current]
+        self.generated += len(other)
+        self.other_filled = True
+
+        if self.background:
+            self.thread = threading.Thread(target=self.fill, args=(other,), daemon=True)
+            self.thread.start()
+        else:
+            self.fill(other)
+
+
+    def next(self):
+        '''
+        Random numbers for every bacterium for the next timestep.
+
+        :returns values: [N, *tail] float array, can be changed in place
+        '''
+        if self.index == len(self.blocks[self.current]):
+
+            # more timesteps than expected, the other block is filled now
+            if not self.other_filled:
+                self.steps = None
+                self.start_fill()
+
+            if self.thread is not None:
+                self.thread.join()
+                self.thread = None
+
+            # swapping blocks and refilling the one that has been used up
+            self.current = 1 - self.current
+            self.index = 0
+            self.other_filled = False
+            self.start_fill()
+
+        values = self.blocks[self.current][self.index]
+        self.index += 1
+
+        return values
+
+
+class RandomStreams(object):
+    '''
+    Class used to draw every random number of a population of bacteria.
+    '''
+
+    def __init__(self, n, seed=None, groups=None, per_cell=False, block_size=None, steps=None, background=True):
+        '''
+        :param n: integer, number of bacteria in the population
+        :param seed: seed of the population (see as_seed_sequence), or a list
+        with one seed per group
+        :param groups: [n] integer array, group (run) each bacterium belongs to
+        (e.g Population.config_id), all in one group if None
+        :param per_cell: boolean, give each bacterium its own streams, child i
+        of the seed of its group for the ith bacterium of the group
+        :param block_size: integer, number of timesteps of random numbers
+        generated at once, if None this is chosen to keep each block near 10^6 values
+        :param steps: integer, number of timesteps the streams are used for, unknown if None
+        :param background: boolean, generate blocks of random numbers in a background thread
+        '''
+
+        self.n = n
+        groups = np.zeros(n, dtype=int) if groups is None else np.asarray(groups)
+        n_groups = int(groups.max()) + 1 if n > 0 else 1
+
+        # seed of each group, a single seed is used by one group as it is and
+        # split between several groups
+        if isinstance(seed, (list, tuple)):
+            self.seeds = [as_seed_sequence(s) for s in seed]
+        elif n_groups == 1:
+            self.seeds = [as_seed_sequence(seed)]
+        else:
+            base = as_seed_sequence(seed)
+            self.seeds = [child_seed(base, KINDS.index('split'), g) for g in range(n_groups)]
+
+        # seed of each stream and the stream each bacterium draws from
+        if per_cell:
+            self.stream_seeds = []
+            self.stream_of_row = np.zeros(n, dtype=int)
+            for g in range(n_groups):
+                rows = np.flatnonzero(groups == g)
+                self.stream_of_row[rows] = len(self.stream_seeds) + np.arange(len(rows))
+                self.stream_seeds += [child_seed(self.seeds[g], KINDS.index('split'), i) for i in range(len(rows))]
+        else:
+            self.stream_seeds = self.seeds
+            self.stream_of_row = groups
+
+        self.rows_of_stream = [np.flatnonzero(self.stream_of_row == s) for s in range(len(self.stream_seeds))]
+
+        if block_size is None:
+            block_size = int(np.clip(10**6 // (3*max(n, 1)), 1, 10**4))
+        self.block_size = block_size
+        self.steps = steps
+        self.background = background
+
+        # generators of each kind, made when first used
+        self.generators = {}
+
+        # buffers of per timestep random numbers of each kind, made when first used
+        self.buffers = {}
+
+
+    def kind_generators(self, kind):
+        '''
+        Generator of every stream for one kind of random number.
+
+        :param kind: string, one of KINDS
+
+        :returns generators: list of numpy Generators
+        '''
+        if kind not in self.generators:
+            self.generators[kind] = [generator(seed, kind) for seed in self.stream_seeds]
+
+        return self.generators[kind]
+
+
+    def next_step(self, kind, method, tail):
+        '''
+        Random numbers for every bacterium for one timestep, from the buffer of this kind.
+        '''
+        if kind not in self.buffers:
+            self.buffers[kind] = NoiseBuffer(self.kind_generators(kind), self.rows_of_stream, self.n, method, tail,
+                                             self.block_size, self.steps, self.background)
+
+        return self.buffers[kind].next()
+
+
+    def normal(self, kind, tail=(3,)):
+        '''
+        Standard normal random numbers for every bacterium for one timestep.
+
+        :param kind: string, one of KINDS
+        :param tail: tuple, shape of the numbers of each bacterium
+
+        :returns noise: [N, *tail] float array, can be changed in place
+        '''
+        return self.next_step(kind, 'standard_normal', tail)
+
+
+    def uniform(self, kind):
+        '''
+        Uniform random numbers in [0, 1) for every bacterium for one timestep.
+
+        :param kind: string, one of KINDS
+
+        :returns values: [N] float array
+        '''
+        return self.next_step(kind, 'random', ())
+
+
+    def rows(self, kind, rows):
+        '''
+        Source of random numbers for a subset of the bacteria, with the
+        methods of a numpy Generator.
+
+        :param kind: string, one of KINDS
+        :param rows: [k] integer array, bacteria the random numbers are for, in order
+
+        :returns rng: numpy Generator if there is a single stream, else RowStream
+        '''
+        generators = self.kind_generators(kind)
+
+        if len(generators) == 1:
+            return generators[0]
+
+        return RowStream(generators, self.stream_of_row[rows])
+
+
+    def metadata(self):
+        '''
+        Seed of every group, as saved with the output of a run.
+
+        :returns metadata: dictionary, or list of dictionaries with more than one group
+        '''
+        if len(self.seeds) == 1:
+            return seed_metadata(self.seeds[0])
+
+        return [seed_metadata(seed) for seed in self.seeds]
@@ -0,0 +1,214 @@
+'''
+This script contains the SimulationParameters class. This class holds every
+parameter of a BacStroke simulation in memory, so a simulation can be set up
+(and a sweep of simulations changed from one run to the next) without
+writing a configuration file for each run.
+
+A SimulationParameters instance is made either directly, or from a
+configuration file with SimulationParameters.from_config_file. The
+configuration file has one entry per parameter, each entry is three lines:
+
+    # description of parameter #
+    value
+    (blank line)
+
+in the order
+
+    initial conditions file, dt [s], simulation length [s],
+    clinostat rotation rate [RPM], outer radius [m], length [m],
+    density of medium [kg/m^3], gravity [m/s^2],
+    rotational diffusion coefficient [1/s], viscosity coefficient [Pa/s],
+    diffusion coefficient [m^2/s], tumbling rate [1/s], centripetal force (True/False)
+
+Files with an inner radius entry after the outer radius (e.g config.txt)
+are also read. The tumbling rate and centripetal force entries can be left
+out, tumbling and centripetal force are then off.
+
+The BatchParameters class holds the parameters of several configurations
+simulated together as one population (see Batch.py), with one value of each
+parameter per bacterium.
+'''
+
+# Imports #####################################################################
+
+# modules
+import numpy as np
+
+###############################################################################
+
+
+class SimulationParameters(object):
+    '''
+    Class used to hold the parameters of a BacStroke simulation.
+    '''
+
+    def __init__(self, dt, total_time, clino_rotation_rate, R, H, density, g, rotational_diffusion_coefficient,
+                 viscosity_coefficient, diffusion_coefficient, tumbling_rate=0.0, centripetal_force=False,
+                 r=0.1E-2, initial_conditions_file=None):
+        '''
+        :param dt: float, length of each timestep [s]
+        :param total_time: float, total length of simulation [s]
+        :param clino_rotation_rate: float, rotation rate of clinostat [RPM]
+        :param R: float, outer radius of circular face of clinostat [m]
+        :param H: float, length of clinostat down the z axis [m]
+        :param density: float, density of medium in clinostat [kg/m^3]
+        :param g: float, acceleration due to gravity [m/s^2]
+        :param rotational_diffusion_coefficient: float, [1/s]
+        :param viscosity_coefficient: float, viscosity coefficient of medium [Pa/s]
+        :param diffusion_coefficient: float, diffusion coefficient of medium [m^2/s]
+        :param tumbling_rate: float, number of tumbles per second of each bacterium
+        :param centripetal_force: boolean, True means centripetal force is on
+        :param r: float, inner radius of circular face of clinostat [m]
+        :param initial_conditions_file: string, path to initial conditions file, only
+        used if no population is given to BacStroke.main
+        '''
+
+        self.dt = float(dt)
+        self.total_time = float(total_time)
+        self.clino_rotation_rate = float(clino_rotation_rate)
+        self.R = float(R)
+        self.H = float(H)
+        self.r = float(r)
+        self.density = float(density)
+        self.g = float(g)
+        self.rotational_diffusion_coefficient = float(rotational_diffusion_coefficient)
+        self.viscosity_coefficient = float(viscosity_coefficient)
+        self.diffusion_coefficient = float(diffusion_coefficient)
+        self.tumbling_rate = float(tumbling_rate)
+        self.centripetal_force = bool(centripetal_force)
+        self.initial_conditions_file = initial_conditions_file
+
+
+    @property
+    def omega(self):
+        '''
+        Angular velocity of the clinostat [rad/s].
+        '''
+        return self.clino_rotation_rate*2*np.pi/60
+
+
+    @property
+    def numstep(self):
+        '''
+        Number of steps the simulation takes.
+        '''
+        return round(self.total_time/self.dt)
+
+
+    def as_dict(self):
+        '''
+        Returns every parameter as a dictionary (e.g for storing in a trajectory header).
+        '''
+        return dict(vars(self))
+
+
+    def copy(self, **changes):
+        '''
+        Returns a copy of the parameters with some of them changed, e.g
+        params.copy(g=0.0, clino_rotation_rate=5).
+
+        :param changes: new value of each parameter to change
+        '''
+        values = self.as_dict()
+
+        for name in changes:
+            if name not in values:
+                raise ValueError('unknown simulation parameter ' + str(name))
+
+        values.update(changes)
+
+        return SimulationParameters(**values)
+
+
+    @staticmethod
+    def from_config_file(config_file):
+        '''
+        Reads the parameters of a simulation from a configuration file (see
+        top of file for the format).
+
+        :param config_file: string, path to configuration file
+
+        :returns params: SimulationParameters instance
+        '''
+
+        with open(config_file, 'r') as file:
+            lines = file.readlines()
+
+        # description and value of every entry, removing trailing new line (\n)
+        headers = [line.strip() for line in lines[0::3]]
+        config = [line.strip() for line in lines[1::3]]
+
+        # files with an inner radius entry after the outer radius
+        r = 0.1E-2
+        if len(headers) > 5 and 'inner radius' in headers[5]:
+            r = float(config.pop(5))
+
+        return SimulationParameters(dt=config[1],
+                                    total_time=config[2],
+                                    clino_rotation_rate=config[3],
+                                    R=config[4],
+                                    H=config[5],
+                                    density=config[6],
+                                    g=config[7],
+                                    rotational_diffusion_coefficient=config[8],
+                                    viscosity_coefficient=config[9],
+                                    diffusion_coefficient=config[10],
+                                    tumbling_rate=config[11] if len(config) > 11 else 0.0,
+                                    centripetal_force=len(config) > 12 and config[12] == 'True',
+                                    r=r,
+                                    initial_conditions_file=config[0])
+
+
+class BatchParameters(SimulationParameters):
+    '''
+    Class used to hold the parameters of several configurations simulated
+    together as one population. Parameters that differ between configurations
+    are stored as arrays with one value per bacterium, so they broadcast with
+    the arrays of the population.
+    '''
+
+    # parameters that must be the same for every configuration in a batch,
+    # the timestep and clinostat size are shared by the whole population
+    shared = ('dt', 'total_time', 'R', 'H', 'r')
+
+    def __init__(self, configs, counts):
+        '''
+        :param configs: list of SimulationParameters instances, one per configuration
+        :param counts: list of integers, number of bacteria of each configuration,
+        in the order the populations are joined (Population.concatenate)
+        '''
+
+        self.configs = list(configs)
+        self.counts = [int(count) for count in counts]
+
+        # configuration of each bacterium
+        self.config_id = np.repeat(np.arange(len(self.configs)), self.counts)
+
+        for name, value in self.configs[0].as_dict().items():
+
+            values = [getattr(config, name) for config in self.configs]
+
+            if name in self.shared:
+                if any(other != value for other in values):
+                    raise ValueError(name + ' must be the same for every configuration in a batch')
+                setattr(self, name, value)
+
+            elif name == 'initial_conditions_file':
+                setattr(self, name, None)
+
+            else:
+                setattr(self, name, np.repeat(np.array(values), self.counts))
+
+
+    def as_dict(self):
+        '''
+        Returns the parameters of every configuration as a dictionary.
+        '''
+        return {'configs': [config.as_dict() for config in self.configs], 'counts': self.counts}
+
+
+    def copy(self, **changes):
+        '''
+        Returns a copy of the batch with some parameters changed in every configuration.
+        '''
+        return BatchParameters([config.copy(**changes) for config in self.configs], self.counts)
@@ -0,0 +1,402 @@
+"""
+Measure the time the runs of a configuration take to reach a steady state.
+
+The y coordinate and planar radius r of every bacterium of every run are
+streamed from the output of the runs (csv or binary, see
+rotational_transform.iter_positions) into one matrix per column, stored as
+.npy files in a cache folder inside the configuration folder:
+
+    steady_state_cache/
+        y.npy, r.npy:   [timesteps, trajectories] matrices, one column per
+                        bacterium of each run (runs in sorted order)
+        time.npy:       [timesteps] times of the first run [s]
+        index.json:     runs, number of bacteria of each run, timesteps and
+                        the modification time and size of each run output
+
+The matrices are opened as memory maps, so only the rows being used are read.
+They are made once, after that the relaxation times can be measured again
+with different settings without reading the run outputs. The cache is
+rebuilt if the runs change (added, removed or rerun).
+
+The relaxation time of a trace (the mean of y or r over the bacteria of one
+run, or over every bacterium of the configuration for the ensemble) is found
+with a running median:
+
+    1. the running median of the trace over a window of timesteps
+    2. centre and spread of the steady state: the median of the running
+       median and the scaled median absolute deviation of the trace over the
+       final tail_fraction of the trace
+    3. the relaxation index is the first timestep from which the running
+       median stays within centre +- sigmas*spread for hold timesteps
+
+Unlike a single crossing of a fixed threshold line this doesnt depend on the
+units of the trace, and a noisy trace that only touches the band isnt
+counted as relaxed.
+"""
+
+### imports
+
+import numpy as np
+import json
+import os
+
+from TrajectoryIO import Trajectory, is_binary_trajectory, trajectory_path
+from rotational_transform import iter_positions
+
+###
+
+# columns of the matrices, and the function giving each from a chunk of positions
+COLUMNS = {'y': lambda positions: positions[..., 1],
+           'r': lambda positions: np.sqrt(positions[..., 0]**2 + positions[..., 1]**2)}
+
+# scales the median absolute deviation to the standard deviation of a normal distribution
+MAD_SCALE = 1.4826
+
+
+def run_shape(path):
+    '''
+    Number of recorded timesteps and bacteria of a run, without reading its positions.
+
+    Parameters
+    ----------
+    path : string
+        path to a positions csv file or a binary trajectory folder.
+
+    Returns
+    -------
+    no_pos, n : integers
+
+    '''
+    if is_binary_trajectory(path):
+        trajectory = Trajectory(path)
+        return min(len(trajectory), len(trajectory['positions'])), trajectory.n
+
+    with open(path, 'r') as file:
+        n = file.readline().count(',')//3 + 1
+        no_pos = 1 + sum(1 for line in file)
+
+    return no_pos, n
+
+
+def run_stamp(path):
+    '''
+    Modification time and size of the output of a run, which change whenever
+    the run is rerun.
+
+    Parameters
+    ----------
+    path : string
+        path to a positions csv file or a binary trajectory folder.
+
+    Returns
+    -------
+    stamp : list, [latest modification time [s], total size [bytes]] of its files
+
+    '''
+    if os.path.isdir(path):
+        stats = [os.stat(os.path.join(path, name)) for name in sorted(os.listdir(path))]
+    else:
+        stats = [os.stat(path)]
+
+    return [max(stat.st_mtime for stat in stats), sum(stat.st_size for stat in stats)]
+
+
+def build_cache(run_paths, cache_folder, columns=('y', 'r'), dtype='float64'):
+    '''
+    Streams the columns of every run into memory mapped matrices (see top of
+    file). Runs are cut to the length of the shortest run.
+
+    Parameters
+    ----------
+    run_paths : list of strings
+        paths to the run folders of one configuration.
+    cache_folder : string
+        folder the matrices are written to (created if it doesnt exist).
+    columns : tuple of strings
+        columns to store, keys of COLUMNS.
+    dtype : string
+        type the matrices are stored as.
+
+    Returns
+    -------
+    index : dictionary, contents of index.json
+
+    '''
+    if not os.path.isdir(cache_folder):
+        os.makedirs(cache_folder)
+
+    paths = [trajectory_path(path) for path in run_paths]
+    stamps = [run_stamp(path) for path in paths]
+    shapes = [run_shape(path) for path in paths]
+    no_pos = min(shape[0] for shape in shapes)
+    counts = [shape[1] for shape in shapes]
+
+    matrices = {name: np.lib.format.open_memmap(os.path.join(cache_folder, name + '.npy'), mode='w+',
+                                                dtype=dtype, shape=(no_pos, sum(counts)))
+                for name in columns}
+    times = np.zeros(no_pos)
+
+    # first column of each run in the matrices
+    offsets = np.concatenate([[0], np.cumsum(counts)])
+
+    for k, path in enumerate(paths):
+
+        # streaming each run into its columns a chunk of timesteps at a time
+        row = 0
+        for chunk_times, positions in iter_positions(path):
+
+            rows = min(len(positions), no_pos - row)
+            if rows <= 0:
+                break
+
+            for name in columns:
+                matrices[name][row:row + rows, offsets[k]:offsets[k + 1]] = COLUMNS[name](positions[:rows])
+            if k == 0:
+                times[row:row + rows] = chunk_times[:rows]
+
+            row += rows
+
+    for matrix in matrices.values():
+        matrix.flush()
+    np.save(os.path.join(cache_folder, 'time.npy'), times)
+
+    index = {'runs': [os.path.basename(os.path.normpath(path)) for path in run_paths],
+             'counts': counts,
+             'no_pos': no_pos,
+             'columns': list(columns),
+             'stamps': stamps}
+
+    # index is written last, so an interrupted build isnt used
+    with open(os.path.join(cache_folder, 'index.json'), 'w') as file:
+        json.dump(index, file, indent=1)
+
+    return index
+
+
+def open_cache(run_paths, cache_folder, columns=('y', 'r')):
+    '''
+    Opens the matrices of a configuration, building them if the cache doesnt
+    hold every column of the same runs, or any run changed since it was built.
+
+    Returns
+    -------
+    matrices : dictionary of read only memory mapped [timesteps, trajectories] arrays
+    times : numpy array [s]
+    index : dictionary, contents of index.json
+
+    '''
+    index_path = os.path.join(cache_folder, 'index.json')
+    runs = [os.path.basename(os.path.normpath(path)) for path in run_paths]
+
+    index = None
+    if os.path.isfile(index_path):
+        with open(index_path, 'r') as file:
+            index = json.load(file)
+
+    if (index is None or index['runs'] != runs or not set(columns) <= set(index['columns'])
+            or index.get('stamps') != [run_stamp(trajectory_path(path)) for path in run_paths]):
+        index = build_cache(run_paths, cache_folder, columns)
+
+    matrices = {name: np.load(os.path.join(cache_folder, name + '.npy'), mmap_mode='r') for name in columns}
+    times = np.load(os.path.join(cache_folder, 'time.npy'))
+
+    return matrices, times, index
+
+
+def running_median(traces, window, block=None):
+    '''
+    Running median of each trace over a centred window of timesteps, with the
+    ends of the traces repeated to fill windows that run past them.
+
+    Parameters
+    ----------
+    traces : numpy array
+        [timesteps] or [timesteps, traces] array.
+    window : integer
+        number of timesteps in each window (odd, rounded up if even).
+    block : integer
+        number of timesteps processed at once, chosen to keep each block near
+        10^7 values if None.
+
+    Returns
+    -------
+    medians : numpy array, same shape as traces
+
+    '''
+    traces = np.asarray(traces, dtype=float)
+    half = max(int(window), 1)//2
+    if half == 0:
+        return np.array(traces)
+
+    padded = np.pad(traces, [(half, half)] + [(0, 0)]*(traces.ndim - 1), mode='edge')
+    medians = np.empty_like(traces)
+
+    if block is None:
+        block = max(1, 10**7//((2*half + 1)*max(traces[0].size, 1)))
+
+    # windows of each block are views of the padded traces, only their medians are stored
+    for start in range(0, len(traces), block):
+        stop = min(start + block, len(traces))
+        windows = np.lib.stride_tricks.sliding_window_view(padded[start:stop + 2*half], 2*half + 1, axis=0)
+        medians[start:stop] = np.median(windows, axis=-1)
+
+    return medians
+
+
+def relaxation_index(traces, window=None, tail_fraction=0.05, sigmas=2.0, hold=None):
+    '''
+    Index of the first timestep after which each trace stays in its steady
+    state (see top of file).
+
+    Parameters
+    ----------
+    traces : numpy array
+        [timesteps] or [timesteps, traces] array.
+    window : integer
+        timesteps in the running median window, 1/200 of the trace if None.
+    tail_fraction : float
+        final fraction of the trace taken as the steady state.
+    sigmas : float
+        half width of the steady state band in units of its spread.
+    hold : integer
+        timesteps the running median must stay in the band for, window if None.
+
+    Returns
+    -------
+    index : integer or numpy array of integers, one per trace (the number of
+        timesteps if the band is never held)
+    centre : float or numpy array, steady state value
+    spread : float or numpy array, steady state spread
+
+    '''
+    traces = np.asarray(traces, dtype=float)
+    no_pos = len(traces)
+
+    if window is None:
+        window = max(3, no_pos//200)
+
+    running = running_median(traces, window)
+
+    # steady state from the tail, centred on the running median and as wide
+    # as the fluctuations of the trace itself (the running median fluctuates
+    # less, but drifts over longer times than the tail)
+    tail = no_pos - max(1, int(round(no_pos*tail_fraction)))
+    centre = np.median(running[tail:], axis=0)
+    spread = MAD_SCALE*np.median(np.abs(traces[tail:] - np.median(traces[tail:], axis=0)), axis=0)
+
+    if hold is None:
+        hold = window
+    hold = max(1, min(int(hold), no_pos))
+
+    # number of timesteps outside the band in the hold timesteps from each
+    # timestep, from the cumulative count of timesteps outside
+    outside = np.abs(running - centre) > sigmas*spread
+    count = np.concatenate([np.zeros((1,) + outside.shape[1:], dtype=int), np.cumsum(outside, axis=0)])
+    held = (count[hold:] - count[:-hold]) == 0
+
+    # first timestep the band is held from, number of timesteps if never
+    index = np.where(np.any(held, axis=0), np.argmax(held, axis=0), no_pos)
+
+    return index, centre, spread
+
+
+def relaxation_time(index, times):
+    '''
+    Time of each relaxation index, nan for traces that never relaxed (index
+    past the last timestep).
+    '''
+    index = np.asarray(index)
+    no_pos = len(times)
+
+    return np.where(index < no_pos, times[np.minimum(index, no_pos - 1)], np.nan)
+
+
+def steady_state(run_paths, cache_folder=None, columns=('y', 'r'), window=None, tail_fraction=0.05, sigmas=2.0, hold=None):
+    '''
+    Relaxation times of each run and of the ensemble of runs of a configuration.
+
+    Parameters
+    ----------
+    run_paths : list of strings
+        paths to the run folders of one configuration.
+    cache_folder : string
+        folder holding the matrices, steady_state_cache next to the runs if None.
+    columns, window, tail_fraction, sigmas, hold :
+        see build_cache and relaxation_index.
+
+    Returns
+    -------
+    results : dictionary of numpy arrays, for each column:
+        <column>_run_index, <column>_run_time: relaxation of each run [s]
+        <column>_index, <column>_time: relaxation of the ensemble [s]
+        (times are nan if a trace never relaxes)
+        <column>_centre, <column>_spread: steady state of the ensemble
+        <column>_mean: ensemble mean trace
+    and runs, time
+
+    '''
+    if cache_folder is None:
+        cache_folder = os.path.join(os.path.dirname(os.path.normpath(run_paths[0])), 'steady_state_cache')
+
+    matrices, times, index = open_cache(run_paths, cache_folder, columns)
+    offsets = np.concatenate([[0], np.cumsum(index['counts'])])
+
+    results = {'runs': np.array(index['runs']), 'time': times}
+
+    for name in columns:
+        matrix = matrices[name]
+
+        # mean over the bacteria of each run (one column each), then over every bacterium
+        run_means = np.add.reduceat(matrix, offsets[:-1], axis=1)/np.array(index['counts'])
+        ensemble_mean = np.mean(matrix, axis=1)
+
+        run_index = relaxation_index(run_means, window, tail_fraction, sigmas, hold)[0]
+        ensemble_index, centre, spread = relaxation_index(ensemble_mean, window, tail_fraction, sigmas, hold)
+
+        results[name + '_run_index'] = run_index
+        results[name + '_run_time'] = relaxation_time(run_index, times)
+        results[name + '_index'] = np.array(ensemble_index)
+        results[name + '_time'] = relaxation_time(ensemble_index, times)
+        results[name + '_centre'] = np.array(centre)
+        results[name + '_spread'] = np.array(spread)
+        results[name + '_mean'] = ensemble_mean
+
+    return results
+
+
+def main(config_folders, output_name='steady_state.npz', **options):
+    '''
+    Writes the steady state file of every configuration folder inside
+    config_folders (as EnsembleMSD.main).
+
+    Parameters
+    ----------
+    config_folders : string
+        path to folder containing one folder per configuration.
+    output_name : string
+        name of the output file written inside each configuration folder.
+    options :
+        passed to steady_state (e.g window, sigmas).
+
+    '''
+    config_list = sorted(os.listdir(config_folders))
+
+    # for each congfiguration folder
+    for config in config_list:
+
+        path_to_config = os.path.join(config_folders, config)
+        if not os.path.isdir(path_to_config):
+            continue
+
+        # every run folder of the configuration
+        run_paths = [os.path.join(path_to_config, run) for run in sorted(os.listdir(path_to_config))
+                     if os.path.exists(trajectory_path(os.path.join(path_to_config, run)))]
+
+        if len(run_paths) == 0:
+            continue
+
+        np.savez(os.path.join(path_to_config, output_name), **steady_state(run_paths, **options))
+
+
+if __name__ == "__main__":
+    main('D:/Kenzie_Mphys/Data/Exp2/Raw2/')
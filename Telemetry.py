@@ -0,0 +1,164 @@
+'''
+This script contains the Telemetry class. This class reports the progress of
+a simulation run by BacStroke.py and counts events of the run, in place of
+printing a line every timestep.
+
+Progress is printed at most once every interval seconds (and when the run
+ends) as:
+
+    Progress: 52000 out of 120000 (43.3%), 8650 steps/s, ETA 8s
+
+Counters of events are kept for the whole run (e.g wall hits on each wall,
+tumbles and bacteria found outside the clinostat in the recorded positions)
+and reported with the final progress line. Messages (e.g convergence of a
+run) are printed as they happen. With quiet=True nothing is printed, the
+counters are still kept and can be saved with the other statistics of a run
+(result). The wall time of the run stops at finish, called at the end of the
+time integration, so the rate saved doesnt include closing the output or
+plotting.
+'''
+
+# Imports #####################################################################
+
+# modules
+import numpy as np
+import time
+import sys
+
+###############################################################################
+
+
+class Telemetry(object):
+    '''
+    Class used to report the progress and count the events of a simulation.
+    '''
+
+    def __init__(self, interval=5.0, quiet=False, stream=None, name='telemetry'):
+        '''
+        :param interval: float, shortest time between progress reports [s]
+        :param quiet: boolean, print nothing (e.g for batch sweeps)
+        :param stream: file to print to, sys.stdout at the time of printing if None
+        :param name: string, name the results are stored under (see Observables.save_results)
+        '''
+        self.interval = float(interval)
+        self.quiet = quiet
+        self.stream = stream
+        self.name = name
+
+        self.start(None)
+
+
+    def start(self, total_steps):
+        '''
+        Starts reporting a new run, called by BacStroke.main.
+
+        :param total_steps: integer, number of timesteps of the run, unknown if None
+        '''
+        self.total_steps = total_steps
+        self.steps = 0
+        self.counters = {}
+
+        self.start_time = time.perf_counter()
+        self.last_report = self.start_time
+
+        # time the run ended, set by finish
+        self.end_time = None
+
+
+    def write(self, message):
+        '''
+        Prints a line, unless quiet.
+        '''
+        if self.quiet:
+            return
+
+        stream = sys.stdout if self.stream is None else self.stream
+        stream.write(message + '\n')
+        stream.flush()
+
+
+    def count(self, name, value=1):
+        '''
+        Adds to a counter.
+
+        :param name: string, name of the counter
+        :param value: integer (or array, summed), amount added
+        '''
+        self.counters[name] = self.counters.get(name, 0) + int(np.sum(value))
+
+
+    def message(self, message):
+        '''
+        Prints a message about the run (e.g its convergence).
+        '''
+        self.write(message)
+
+
+    def step(self, steps=1):
+        '''
+        Called after every timestep, reports progress if interval has passed
+        since the last report.
+
+        :param steps: integer, number of timesteps taken
+        '''
+        self.steps += steps
+
+        now = time.perf_counter()
+        if now - self.last_report >= self.interval:
+            self.last_report = now
+            self.report(now)
+
+
+    def rate(self, now=None):
+        '''
+        Average number of timesteps per second of wall time so far, or over
+        the whole run once it has finished.
+        '''
+        if now is None:
+            now = time.perf_counter() if self.end_time is None else self.end_time
+
+        elapsed = now - self.start_time
+
+        return self.steps/elapsed if elapsed > 0 else 0.0
+
+
+    def report(self, now=None):
+        '''
+        Prints the progress of the run.
+        '''
+        rate = self.rate(now)
+        line = 'Progress: ' + str(self.steps)
+
+        if self.total_steps is not None:
+            line += ' out of ' + str(self.total_steps)
+            line += ' (' + format(100*self.steps/max(self.total_steps, 1), '.1f') + '%)'
+
+        line += ', ' + format(rate, '.0f') + ' steps/s'
+
+        if self.total_steps is not None and rate > 0:
+            line += ', ETA ' + format((self.total_steps - self.steps)/rate, '.0f') + 's'
+
+        self.write(line)
+
+
+    def finish(self):
+        '''
+        Reports the end of the run, with every counter.
+        '''
+        self.end_time = time.perf_counter()
+        elapsed = self.end_time - self.start_time
+
+        self.report()
+        self.write('Finished ' + str(self.steps) + ' steps in ' + format(elapsed, '.1f') + 's'
+                   + ''.join(', ' + name + ' ' + str(value) for name, value in self.counters.items()))
+
+
+    def result(self):
+        '''
+        Counters and timing of the run, as a dictionary of numpy arrays.
+        '''
+        result = {name: np.array(value) for name, value in self.counters.items()}
+        result['steps'] = np.array(self.steps)
+        result['steps_per_second'] = np.array(self.rate())
+
+        return result
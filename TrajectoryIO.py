@@ -0,0 +1,555 @@
+'''
+This script contains the TrajectoryWriter class. This class writes the output
+files of BacStroke.py while the simulation runs.
+
+Each recorded timestep is stored in fixed size blocks (chunks), when a block
+is full it is written to the end of the output files and reused. The memory
+needed is set by the chunk size and the number of bacteria, not by the length
+of the simulation.
+
+The output files are csv files with one row per recorded timestep:
+
+    positions:          x, y, z of bacterium 1, x, y, z of bacterium 2, ...
+    swimming direction: ex, ey, ez of bacterium 1, ex, ey, ez of bacterium 2, ...
+    tumbles:            1 if bacterium 1 tumbled else 0, same for bacterium 2, ...
+    time:               time of the timestep [s]
+
+For a single bacterium this is the same format as the positions and time files
+written by earlier versions of BacStroke.py.
+
+The BinaryTrajectoryWriter class writes the same columns to a compact binary
+format instead (see below), which the Trajectory class reads back as
+memory mapped arrays. load_positions and load_times read the positions and
+times of a run from either format.
+
+The recorded timesteps are evenly spaced in time unless the spacing is
+changed while the run is written (change_spacing, e.g once a run has
+converged and is recorded less often, see Observables.ConvergenceMonitor).
+The trajectory is then made of segments, each evenly spaced, stored as
+[first row, spacing [s]] pairs in the binary header or the csv metadata file
+(positions.json) and read back with record_segments. Analysis that needs
+evenly spaced rows (e.g the MSD) uses even_rows.
+'''
+
+# Imports #####################################################################
+
+# modules
+import numpy as np
+import pandas as pd
+import os
+import json
+import gzip
+import shutil
+
+###############################################################################
+
+
+class TrajectoryWriter(object):
+    '''
+    Class used to stream the trajectory of a population to csv files in
+    fixed size blocks.
+    '''
+
+    def __init__(self, n, positions_file, swimming_file=None, tumble_file=None, time_file=None, chunk_size=None,
+                 metadata_file=None, config=None, dt=None):
+        '''
+        Opens the output files of a population of n bacteria. Any file path set
+        to None is not written.
+
+        :param n: integer, number of bacteria in the population
+        :param positions_file: string, path to positions output file
+        :param swimming_file: string, path to swimming direction output file
+        :param tumble_file: string, path to tumbles output file
+        :param time_file: string, path to time output file
+        :param chunk_size: integer, number of timesteps held before writing to
+        the files, if None this is chosen to keep each block near 10^6 values
+        :param metadata_file: string, path to json file the configuration and
+        segments of the trajectory are saved to, not written if None
+        :param config: dictionary, configuration of the simulation (e.g parameters and seed)
+        :param dt: float, time between recorded timesteps [s]
+        '''
+
+        self.n = n
+        self.metadata_file = metadata_file
+        self.config = {} if config is None else config
+
+        # [first row, spacing] of each evenly spaced part of the trajectory
+        self.segments = [[0, dt]]
+
+        if chunk_size is None:
+            chunk_size = int(np.clip(10**6 // (3*n), 1, 1000))
+        self.chunk_size = chunk_size
+
+        # number of timesteps currently held in the blocks
+        self.filled = 0
+
+        # number of timesteps recorded in total
+        self.recorded = 0
+
+        # open output files and the block for each of them
+        self.files = {}
+        self.blocks = {}
+        self.formats = {}
+        for name, path, shape, fmt in [('positions', positions_file, (chunk_size, n, 3), '%.18e'),
+                                       ('swimming', swimming_file, (chunk_size, n, 3), '%.18e'),
+                                       ('tumbles', tumble_file, (chunk_size, n), '%d'),
+                                       ('time', time_file, (chunk_size,), '%.18e')]:
+            if path is not None:
+                self.files[name] = self.open_file(name, path)
+                self.blocks[name] = np.zeros(shape)
+                self.formats[name] = fmt
+
+        self.write_metadata()
+
+
+    def write_metadata(self):
+        '''
+        Writes the configuration and segments of the trajectory to the metadata file.
+        '''
+        if self.metadata_file is None:
+            return
+
+        with open(self.metadata_file, 'w') as file:
+            json.dump(dict(self.config, record_segments=self.segments), file, indent=1)
+
+
+    def change_spacing(self, dt):
+        '''
+        Starts a new segment of the trajectory, the timesteps recorded from now
+        on (and the gap before the next one) are dt apart.
+
+        :param dt: float, new time between recorded timesteps [s]
+        '''
+        self.segments.append([self.recorded, dt])
+        self.write_metadata()
+
+
+    def open_file(self, name, path):
+        '''
+        Opens the output file of one column of the trajectory.
+
+        :param name: string, name of the column (positions, swimming, tumbles or time)
+        :param path: string, path to the output file
+
+        :returns file: open file handle
+        '''
+        return open(path, 'w')
+
+
+    def write_block(self, name, block):
+        '''
+        Writes a block of recorded timesteps to the end of an output file.
+
+        :param name: string, name of the column (positions, swimming, tumbles or time)
+        :param block: [k, ...] array, one row per timestep
+        '''
+        np.savetxt(self.files[name], block.reshape(len(block), -1), delimiter=",", fmt=self.formats[name])
+
+
+    def record(self, time, positions, swim_direction=None, tumbles=None):
+        '''
+        Records the state of the population at one timestep.
+
+        :param time: float, current time in simulation [s]
+        :param positions: [N, 3] float array, position of every bacterium
+        :param swim_direction: [N, 3] float array, swimming direction of every bacterium
+        :param tumbles: [N] integer array, 1 = bacterium tumbled, 0 = it didnt
+        '''
+
+        for name, value in [('positions', positions), ('swimming', swim_direction),
+                            ('tumbles', tumbles), ('time', time)]:
+            if name in self.blocks and value is not None:
+                self.blocks[name][self.filled] = value
+
+        self.filled += 1
+        self.recorded += 1
+
+        # write the blocks once they are full
+        if self.filled == self.chunk_size:
+            self.flush()
+
+
+    def flush(self):
+        '''
+        Writes every recorded timestep still held in the blocks to the output files.
+        '''
+
+        if self.filled == 0:
+            return
+
+        for name, file in self.files.items():
+            self.write_block(name, self.blocks[name][:self.filled])
+            file.flush()
+
+        self.filled = 0
+
+
+    def close(self):
+        '''
+        Writes any remaining timesteps and closes the output files.
+        '''
+
+        self.flush()
+
+        for file in self.files.values():
+            file.close()
+
+
+class BinaryTrajectoryWriter(TrajectoryWriter):
+    '''
+    Class used to stream the trajectory of a population to the binary
+    trajectory format in fixed size blocks.
+
+    A binary trajectory is a folder (named <name>.traj) holding one raw binary
+    file per column and a header:
+
+        header.json:    number of bacteria and timesteps, dt (of the first
+                        segment), segments, configuration of the simulation
+                        and the file, dtype and shape of each column
+        positions.bin:  [timesteps, N, 3] positions
+        swimming.bin:   [timesteps, N, 3] swimming directions
+        tumbles.bin:    [timesteps, N] tumbles, uint8
+        time.bin:       [timesteps] times, always float64
+
+    Positions and swimming directions can be stored as float32 to halve the
+    size of the files. If compress is True each column file is gzip compressed
+    (<column>.bin.gz) once the trajectory is closed.
+    '''
+
+    def __init__(self, n, path, dt=None, config=None, dtype='float64', compress=False, chunk_size=None):
+        '''
+        Creates the trajectory folder of a population of n bacteria.
+
+        :param n: integer, number of bacteria in the population
+        :param path: string, path to trajectory folder (created if it doesnt exist)
+        :param dt: float, timestep of the recorded trajectory [s]
+        :param config: dictionary, configuration of the simulation (stored in the header)
+        :param dtype: string, 'float64' or 'float32', type positions and swimming directions are stored as
+        :param compress: boolean, gzip compress the column files when closed
+        :param chunk_size: integer, number of timesteps held before writing to the files
+        '''
+
+        self.path = path
+        self.dt = dt
+        self.compress = compress
+        self.dtypes = {'positions': np.dtype(dtype), 'swimming': np.dtype(dtype),
+                       'tumbles': np.dtype('uint8'), 'time': np.dtype('float64')}
+
+        if not os.path.isdir(path):
+            os.makedirs(path)
+
+        # header is written straight away (write_metadata) so a run that stops early can still be read
+        TrajectoryWriter.__init__(self, n, 'positions', 'swimming', 'tumbles', 'time', chunk_size=chunk_size,
+                                  config=config, dt=dt)
+
+
+    def open_file(self, name, path):
+        '''
+        Opens the raw binary file of one column of the trajectory.
+        '''
+        return open(os.path.join(self.path, name + '.bin'), 'wb')
+
+
+    def write_block(self, name, block):
+        '''
+        Writes a block of recorded timesteps to the end of a column file.
+        '''
+        block.astype(self.dtypes[name]).tofile(self.files[name])
+
+
+    def write_metadata(self):
+        '''
+        The configuration and segments of a binary trajectory are stored in its header.
+        '''
+        self.write_header()
+
+
+    def write_header(self):
+        '''
+        Writes the header of the trajectory (header.json).
+        '''
+        shapes = {'positions': [self.n, 3], 'swimming': [self.n, 3], 'tumbles': [self.n], 'time': []}
+
+        header = {'version': 1,
+                  'n_bacteria': self.n,
+                  'n_records': self.recorded,
+                  'dt': self.dt,
+                  'segments': self.segments,
+                  'compressed': False,
+                  'config': self.config,
+                  'columns': {name: {'file': name + '.bin', 'dtype': self.dtypes[name].name, 'shape': shapes[name]}
+                              for name in self.files}}
+
+        if self.compress and self.files and all(file.closed for file in self.files.values()):
+            header['compressed'] = True
+            for column in header['columns'].values():
+                column['file'] += '.gz'
+
+        with open(os.path.join(self.path, 'header.json'), 'w') as file:
+            json.dump(header, file, indent=1)
+
+
+    def close(self):
+        '''
+        Writes any remaining timesteps, closes the column files, compresses
+        them if asked to and writes the final header.
+        '''
+
+        TrajectoryWriter.close(self)
+
+        if self.compress:
+            for name in self.files:
+                raw_path = os.path.join(self.path, name + '.bin')
+                with open(raw_path, 'rb') as raw, gzip.open(raw_path + '.gz', 'wb') as compressed:
+                    shutil.copyfileobj(raw, compressed)
+                os.remove(raw_path)
+
+        self.write_header()
+
+
+class SplitTrajectoryWriter(object):
+    '''
+    Class used to write the trajectory of several configurations simulated
+    together as one population (see Batch.py), each configuration to its own
+    writer. It has the same record and close methods as TrajectoryWriter.
+    '''
+
+    def __init__(self, writers, config_id):
+        '''
+        :param writers: list of TrajectoryWriter instances, one per configuration
+        :param config_id: [N] integer array, configuration of each bacterium in the population
+        '''
+        self.writers = writers
+
+        # bacteria of each configuration
+        self.rows = [np.flatnonzero(config_id == k) for k in range(len(writers))]
+
+
+    def record(self, time, positions, swim_direction=None, tumbles=None):
+        '''
+        Records the state of every configuration at one timestep (see TrajectoryWriter.record).
+        '''
+        for writer, rows in zip(self.writers, self.rows):
+            writer.record(time, positions[rows],
+                          None if swim_direction is None else swim_direction[rows],
+                          None if tumbles is None else tumbles[rows])
+
+
+    def change_spacing(self, dt):
+        '''
+        Starts a new segment of the trajectory of every configuration (see TrajectoryWriter.change_spacing).
+        '''
+        for writer in self.writers:
+            writer.change_spacing(dt)
+
+
+    def close(self):
+        '''
+        Closes the writer of every configuration.
+        '''
+        for writer in self.writers:
+            writer.close()
+
+
+def open_writer(n, output_file, swimming_file=None, tumble_file=None, time_file=None, output_format='csv',
+                dt=None, config=None, precision='float64', compress=False, chunk_size=None):
+    '''
+    Opens the writer of the output of a population of n bacteria.
+
+    For 'csv' output each column is written to its own file, and config (and
+    the segments of the trajectory) is saved as json next to output_file
+    (positions.csv -> positions.json). For
+    'binary' output every column is stored in one binary trajectory folder
+    next to output_file (positions.csv -> positions.traj), with config in its
+    header, the other file paths are not used.
+
+    :param n: integer, number of bacteria in the population
+    :param output_file: string, path to positions output file, no output is written if None
+    :param swimming_file: string, path to swimming direction output file
+    :param tumble_file: string, path to tumbles output file
+    :param time_file: string, path to time output file
+    :param output_format: string, 'csv' or 'binary'
+    :param dt: float, timestep of the recorded trajectory [s]
+    :param config: dictionary, configuration of the simulation (e.g parameters and seed)
+    :param precision: string, 'float64' or 'float32' (binary only)
+    :param compress: boolean, gzip compress the column files (binary only)
+    :param chunk_size: integer, number of timesteps held before writing to the files
+
+    :returns writer: TrajectoryWriter or BinaryTrajectoryWriter instance, None if output_file is None
+    '''
+
+    if output_file is None:
+        return None
+
+    if output_format == 'csv':
+        metadata_file = None if config is None else os.path.splitext(output_file)[0] + '.json'
+        return TrajectoryWriter(n, output_file, swimming_file, tumble_file, time_file, chunk_size=chunk_size,
+                                metadata_file=metadata_file, config=config, dt=dt)
+
+    if output_format == 'binary':
+        trajectory_folder = os.path.splitext(output_file)[0] + '.traj'
+        return BinaryTrajectoryWriter(n, trajectory_folder, dt=dt, config=config,
+                                      dtype=precision, compress=compress, chunk_size=chunk_size)
+
+    raise ValueError("output_format must be 'csv' or 'binary', not " + str(output_format))
+
+
+class Trajectory(object):
+    '''
+    Class used to read a binary trajectory written by BinaryTrajectoryWriter.
+
+    Columns of an uncompressed trajectory are returned as read only
+    np.memmap views of the column files, so nothing is read from disk until
+    it is used. Compressed columns are decompressed into memory when first used.
+    '''
+
+    def __init__(self, path):
+        '''
+        :param path: string, path to trajectory folder
+        '''
+
+        self.path = path
+
+        with open(os.path.join(path, 'header.json'), 'r') as file:
+            self.header = json.load(file)
+
+        self.n = self.header['n_bacteria']
+        self.dt = self.header['dt']
+        self.config = self.header['config']
+        self.columns = {}
+
+
+    def __getitem__(self, name):
+        '''
+        Returns one column of the trajectory, e.g trajectory['positions'].
+
+        :param name: string, name of the column (positions, swimming, tumbles or time)
+
+        :returns column: [timesteps, ...] array
+        '''
+
+        if name not in self.columns:
+
+            column = self.header['columns'][name]
+            dtype = np.dtype(column['dtype'])
+            shape = tuple(column['shape'])
+            file_path = os.path.join(self.path, column['file'])
+
+            if column['file'].endswith('.gz'):
+                with gzip.open(file_path, 'rb') as file:
+                    data = np.frombuffer(file.read(), dtype=dtype)
+                self.columns[name] = data.reshape((-1,) + shape)
+
+            else:
+                # number of timesteps from the size of the file, so a run that
+                # stopped early can still be read
+                record_size = dtype.itemsize*int(np.prod(shape))
+                n_records = os.path.getsize(file_path)//record_size
+
+                if n_records == 0:
+                    self.columns[name] = np.zeros((0,) + shape, dtype=dtype)
+                else:
+                    self.columns[name] = np.memmap(file_path, dtype=dtype, mode='r', shape=(n_records,) + shape)
+
+        return self.columns[name]
+
+
+    def __len__(self):
+        '''
+        Number of recorded timesteps.
+        '''
+        return len(self['time'])
+
+
+def is_binary_trajectory(path):
+    '''
+    Checks if a path is a binary trajectory folder.
+    '''
+    return os.path.isfile(os.path.join(path, 'header.json'))
+
+
+def trajectory_path(run_folder):
+    '''
+    Path to the positions output of a run folder, the binary trajectory
+    (positions.traj) if there is one, otherwise positions.csv.
+
+    :param run_folder: string, path to folder containing the output of one run
+    '''
+    binary_path = os.path.join(run_folder, 'positions.traj')
+
+    if is_binary_trajectory(binary_path):
+        return binary_path
+
+    return os.path.join(run_folder, 'positions.csv')
+
+
+def load_positions(path, bacterium=0):
+    '''
+    Loads the positions of one bacterium from either output format of BacStroke.
+
+    :param path: string, path to a positions csv file or a binary trajectory folder
+    :param bacterium: integer, index of the bacterium in the population
+
+    :returns positions: [timesteps, 3] array in xyz format
+    '''
+
+    if is_binary_trajectory(path):
+        return Trajectory(path)['positions'][:, bacterium]
+
+    positions = np.array(pd.read_csv(path, header=None))
+
+    return positions[:, 3*bacterium:3*bacterium + 3]
+
+
+def load_times(path):
+    '''
+    Loads the times of every recorded timestep from either output format of BacStroke.
+
+    :param path: string, path to a time csv file or a binary trajectory folder
+
+    :returns times: [timesteps] array [s]
+    '''
+
+    if is_binary_trajectory(path):
+        return Trajectory(path)['time']
+
+    return np.array(pd.read_csv(path, header=None))[:, 0]
+
+
+def record_segments(path):
+    '''
+    Evenly spaced segments of a trajectory (see top of file).
+
+    :param path: string, path to a positions csv file or a binary trajectory folder
+
+    :returns segments: list of [first row, spacing [s]], spacing is None if
+    it wasnt saved, a single segment if the trajectory was never respaced (or
+    has no metadata file)
+    '''
+
+    if is_binary_trajectory(path):
+        header = Trajectory(path).header
+        return header.get('segments', [[0, header['dt']]])
+
+    metadata_file = os.path.splitext(path)[0] + '.json'
+    if os.path.isfile(metadata_file):
+        with open(metadata_file, 'r') as file:
+            return json.load(file).get('record_segments', [[0, None]])
+
+    return [[0, None]]
+
+
+def even_rows(path):
+    '''
+    Number of rows at the start of a trajectory that are evenly spaced in
+    time, and their spacing.
+
+    :param path: string, path to a positions csv file or a binary trajectory folder
+
+    :returns rows: integer, rows of the first segment, None if every row is evenly spaced
+    :returns dt: float, time between the rows [s], None if it wasnt saved
+    '''
+    segments = record_segments(path)
+    rows = segments[1][0] if len(segments) > 1 else None
+
+    return rows, segments[0][1]
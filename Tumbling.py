@@ -0,0 +1,147 @@
+'''
+This script contains the TumbleSampler class. This class decides which
+bacteria in a population tumble during each timestep of the simulation, which
+allows implementation of run and tumble motion into the bacteriums motion.
+
+Tumbling is treated as a Poisson process with rate tumbling_rate [1/s], so
+the probability that a bacterium tumbles within a timestep dt is
+
+    p = 1 - exp(-tumbling_rate*dt)
+
+Two modes are available:
+
+    'bernoulli': every bacterium is tested against p each timestep, using one
+                 vectorised random draw for the whole population.
+    'scheduled': exponential waiting times between tumbles are drawn ahead of
+                 time for every bacterium, a bacterium tumbles in the timestep
+                 its next tumble is due. Timesteps where no tumble is due cost
+                 a single comparison, so low tumbling rates with a small dt
+                 are nearly free.
+'''
+
+# Imports #####################################################################
+
+# modules
+import numpy as np
+
+# external files
+from RandomStreams import RandomStreams
+
+###############################################################################
+
+
+class TumbleSampler(object):
+    '''
+    Class used to draw tumble events for every bacterium in a population.
+    '''
+
+    def __init__(self, n, dt, tumbling_rate, mode='bernoulli', streams=None):
+        '''
+        Initialises the tumble sampler of a population of n bacteria.
+
+        :param n: integer, number of bacteria in the population
+        :param dt: float, timestep of simulation in s
+        :param tumbling_rate: float or [n] float array, number of tumbles per second in bacteriums motion
+        :param mode: string, 'bernoulli' or 'scheduled' (see top of file)
+        :param streams: RandomStreams instance of the population (e.g
+        Population.streams), unseeded streams if None
+        '''
+
+        if mode not in ('bernoulli', 'scheduled'):
+            raise ValueError("mode must be 'bernoulli' or 'scheduled', not " + str(mode))
+
+        self.n = n
+        self.dt = float(dt)
+        self.tumbling_rate = float(tumbling_rate) if np.ndim(tumbling_rate) == 0 else np.asarray(tumbling_rate, float)
+        self.mode = mode
+        self.streams = RandomStreams(n) if streams is None else streams
+
+        # probability of each bacterium tumbling within one timestep
+        self.tumble_prob = 1 - np.exp(-self.tumbling_rate*self.dt)
+
+        # returned in timesteps where nothing tumbles
+        self.no_tumbles = np.zeros(n, dtype=int)
+
+        # time of the next tumble of every bacterium [s]
+        if self.mode == 'scheduled':
+            self.next_tumble = self.waiting_times(n)
+            self.next_due = np.min(self.next_tumble, initial=np.inf)
+
+
+    def waiting_times(self, size, rows=None):
+        '''
+        Draws exponentially distributed waiting times between tumbles.
+
+        :param size: integer, number of waiting times to draw
+        :param rows: [size] integer array, bacteria the waiting times are for, all if None
+
+        :returns times: [size] float array, waiting times in s (inf if the tumbling rate is 0)
+        '''
+        rng = self.streams.rows('waiting', np.arange(self.n) if rows is None else rows)
+
+        if np.ndim(self.tumbling_rate) == 1:
+
+            rate = self.tumbling_rate if rows is None else self.tumbling_rate[rows]
+
+            with np.errstate(divide='ignore'):
+                return np.where(rate > 0, rng.exponential(1, size=size)/rate, np.inf)
+
+        if self.tumbling_rate <= 0:
+            return np.full(size, np.inf)
+
+        return rng.exponential(1/self.tumbling_rate, size=size)
+
+
+    def sample(self, time, mask=None, dt=None):
+        '''
+        Calculates which bacteria tumble in the timestep ending at time.
+
+        :param time: float, current time in simulation in s (end of the timestep)
+        :param mask: [N] boolean array, only bacteria set True can tumble, all if None.
+        In 'scheduled' mode a tumble that is due on a masked bacterium waits
+        for the next timestep it is unmasked.
+        :param dt: float, length of this timestep in s if it isnt the dt of the
+        sampler (e.g with an adaptive timestep), only used in 'bernoulli' mode
+
+        :returns tumbles: [N] integer array, 1 = does tumble, 0 = does not tumble
+        '''
+
+        if self.mode == 'bernoulli':
+
+            tumble_prob = self.tumble_prob
+            if dt is not None and dt != self.dt:
+                tumble_prob = 1 - np.exp(-self.tumbling_rate*dt)
+
+            # no bacterium can tumble
+            if np.all(tumble_prob <= 0):
+                return self.no_tumbles
+
+            tumbles = self.streams.uniform('tumbling') < tumble_prob
+
+        else:
+
+            # quick exit while no bacterium is due to tumble
+            if time < self.next_due:
+                return self.no_tumbles
+
+            tumbles = self.next_tumble <= time
+
+        if mask is not None:
+            tumbles &= mask
+
+        if self.mode == 'scheduled':
+            self.reschedule(time, np.flatnonzero(tumbles))
+
+        return tumbles.astype(int)
+
+
+    def reschedule(self, time, tumbled):
+        '''
+        Schedules the next tumble of every bacterium that tumbled, from the end
+        of this timestep ('scheduled' mode only).
+
+        :param time: float, current time in simulation in s (end of the timestep)
+        :param tumbled: [k] integer array, bacteria that tumbled this timestep
+        '''
+        self.next_tumble[tumbled] = time + self.waiting_times(len(tumbled), tumbled)
+        self.next_due = np.min(self.next_tumble, initial=np.inf)
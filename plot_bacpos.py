@@ -10,19 +10,20 @@ import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 
+# external files
+from TrajectoryIO import load_positions, load_times
+
 ###
 
-# path to output files of BacStroke
+# path to output files of BacStroke (csv files or a binary trajectory folder)
 positions_file = 'bacpos.csv'
 time_file = 'time.csv'
 
-# fetch positions and convert to numpy array
-xyz = pd.read_csv(positions_file)
-positions = np.array(xyz) # in xyz format
+# fetch positions of first bacterium as numpy array
+positions = load_positions(positions_file) # in xyz format
 
-# fetch times and convert to numpy array
-time_table = pd.read_csv(time_file)
-times = np.array(time_table) 
+# fetch times as numpy array
+times = load_times(time_file) 
 
 # plotting path of bacteria
 nopoints = 50
@@ -1,29 +1,46 @@
 # -*- coding: utf-8 -*-
 """
 Transform coordinates to rotational frame
+
+The positions of a run are streamed from its output (a positions csv file or
+a binary trajectory, see TrajectoryIO.py) a chunk of recorded timesteps at a
+time, in the lab frame or in the frame rotating with the clinostat, so a
+trajectory is never held in memory whole and no transformed copy of it is
+written to disk. Statistics of the transformed trajectories are measured by
+reducers while they stream, e.g:
+
+    for times, positions in frame_chunks('run_1/positions.traj', frame='rotating'):
+        ...
+
+    results, failed = transform_runs(run_paths, [ThinnedPositions(50), FrameMoments()])
+
+transform_runs streams every run on its own process of a pool. The angular
+velocity of the clinostat is read from the configuration saved with each run
+(clino_rotation_rate, in rpm) unless it is given.
+
+The clinostat turns the bacteria anticlockwise about z (see
+Population.rotational_vel), so positions are rotated by -omega*t into the
+rotating frame. Importing this file has no side effects, the old driver that
+plotted every configuration is run with python rotational_transform.py.
 """
 
-### imports as style
+### imports
 
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
+import multiprocessing as mp
+import copy
+import json
 import os
-import re
 
-plt.rcParams.update({
-    'text.usetex': False,
-    'font.family': 'roman',
-})
-
-# #handle graph formatting and style
-plt.style.use('shendrukGroupStyle')
-#mpl.rcParams['image.cmap'] = 'viridis'
-import shendrukGroupFormat as ed
-MYLW=1.0 #line width
+from TrajectoryIO import Trajectory, is_binary_trajectory, trajectory_path
 
 ###
 
+# frames a trajectory can be streamed in
+FRAMES = ('lab', 'rotating')
+
+
 def rotation_matrices(angle_array):
     """
     Generate an array of rotation matrices corresponding to an array of angles.
@@ -36,206 +53,410 @@ def rotation_matrices(angle_array):
     return rotation_matrix
 
 
-def transform_to_rotational_coords(positions, times, omega):
+def transform_to_rotational_coords(positions, times, omega, out=None):
     '''
-    positions n x 3 array in xyz format
-    
-    times n array 
-    
-    omega, angular speed in radians per second
+    Rotates positions about z by omega*times (pass -omega for the frame
+    rotating with the clinostat, as to_rotating_frame does). positions is
+    left unchanged unless it is also out.
+
+    :param positions: [n, 3] float array in xyz format, or [n, N, 3] for N bacteria
+    :param times: [n] or [n, 1] float array, time of each row [s]
+    :param omega: float, angular speed in radians per second
+    :param out: array of the same shape as positions the result is written to, new array if None
+
+    :returns rotpositions: array of the same shape as positions
     '''
-    #print(positions)
-    
-    # angle to transform with
-    theta = omega*times # -1 for negative rotation
-    #print(theta)
-    # calculate sin and cos theta
+
+    # angle to transform with, as a column that broadcasts over the bacteria
+    theta = omega*np.reshape(times, (-1,) + (1,)*(np.ndim(positions) - 2))
     costheta = np.cos(theta)
     sintheta = np.sin(theta)
-    
-    #print(costheta, sintheta)
-    
+
     # isolate axis coords
-    x = positions[:, 0]
-    y = positions[:, 1]
-    z = positions[:, 2]
-    
-    rotx = (x*costheta[:, 0]) - (y*sintheta[:, 0])
-    roty = (x*sintheta[:, 0]) + (y*costheta[:, 0])  
-    
-    #print(rotx[0], x[0])
-    #print(roty[0], y[0])
-    
-    rotpositions = np.zeros_like(positions)
-    
-    rotpositions[:, 0] = rotx
-    rotpositions[:, 1] = roty
-    rotpositions[:, 2] = z
-    
-    #rotpositions = np.array([rotx, roty, z])
-    #print(rotpositions)
-    
-    return rotpositions
-
-#transform_to_rotational_coords(np.array([1, 0, 0]), times, omega)
-       
-        
-# path = '../../bacpos.csv'    
-# timepath = '../../time.csv' 
-
-# #xyz = pd.read_csv('D:\MPhys\ExpData/Exp2/omega=1.407052941362897,vs=7.5e-06/run_1/positions.csv')
-# xyz = pd.read_csv('D:\MPhys\ExpData/Exp3/omega=1.407,g=29.4,vs=2.5e-05/run_1/positions.csv')
-# xyz = pd.read_csv(path)
-# positions = np.array(xyz) # in xyz format
-
-# x = positions[:, 0]
-# y = positions[:, 1]
-# r = np.sqrt((x**2) + (y**2))
-
-# #time = pd.read_csv('time.csv')
-# time = pd.read_csv(timepath)
-# t = np.array(time)
-    
-# rotcoords = transform_to_rotational_coords(positions, t, 1.407052941362897)
-
-# fig, ax = plt.subplots(nrows = 1, ncols = 2, figsize = (15, 8))
-
-# ax[0].scatter(x[::50], y[::50], s = 1)
-# ax[1].scatter(rotcoords[:, 0][::50], rotcoords[:, 1][::50], s = 1)
-
-
-# get all folder names in Data directory
-config_path = 'D:/Kenzie_Mphys/Data/Exp2/Raw2/'
-config_list = os.listdir(config_path)
-config_list = config_list
-#print(config_list)
-
-time = pd.read_csv('C:/Users/kenzi/Documents/Masters/BacStroke2.0/BacStroke2.0/Studies/Exp2/timenew230324.csv')
-times = np.array(time)
-#print(times)
-
-# for each folder
-for i in range(len(config_list)): #len(config_list)
-    print(i)
-    
-    # path to save output plot too 
-    plot_path = 'D:/Kenzie_Mphys/Data/Exp2/Rotated_coordinates/' + config_list[i] + '.png'
-    
-    # if png doesnt exist already then generate it
-    if not os.path.exists(plot_path):
-        
-        char1 = '='
-        char2 = ','
-        
-        omega = float(config_list[i][config_list[i].find(char1)+1:config_list[i].find(char2)])
-    
-        # current folder path
-        folder_path = config_path + '/' + config_list[i]
-        
-        # getting each run folder
-        run_paths = os.listdir(folder_path)
-        #print(run_paths)
-        
-        # # create figure to plot too for each iteration
-        
-        # fig = plt.figure(constrained_layout = True, figsize = (15,8))
-        # gs = fig.add_gridspec(nrows = 1, ncols = 2, wspace = 0, figure = fig)
-        # ax = gs.subplots()#sharey = True)
-
-        # # fig, ax = plt.subplots(ncols = 2, nrows = 1, figsize = (25, 12))
-        # # fontsize = 27
-        # ax[0].set_xlabel(r'$x (m)$')#,fontsize = fontsize)
-        # ax[0].set_ylabel(r'$y (m)$')#,fontsize = fontsize)
-        # ax[0].set_title('Lab frame')
-        # ax[1].set_xlabel(r'$x (m)$')#,fontsize = fontsize)
-        # ax[1].set_ylabel(r'$y (m)$')#,fontsize = fontsize)
-        # ax[1].set_title('Rotated frame')
-        # # ax[2].set_xlabel(r'$z/m$')#,fontsize = fontsize)
-        # # ax[2].set_ylabel(r'$y/m$')#,fontsize = fontsize)
-       
-
-        # ticklabelsize = 23
-        # ax[0].tick_params(axis='x')#, labelsize=ticklabelsize)
-        # ax[0].tick_params(axis='y')#, labelsize=ticklabelsize)
-        
-        # ax[1].tick_params(axis='x')#, labelsize=ticklabelsize)
-        # ax[1].tick_params(axis='y')#, labelsize=ticklabelsize)
-        
-        # # ax[2].tick_params(axis='x')#, labelsize=ticklabelsize)
-        # # ax[2].tick_params(axis='y')#, labelsize=ticklabelsize)
-        
-        # ax[0].set_ylim(-0.055, 0.055)
-        # ax[1].set_ylim(-0.055, 0.055)
-        
-        # # adding circular patches for scale
-        # R = 5E-2
-        # r = 0.5E-2
-        # cir = plt.Circle((0, 0), R, facecolor='#c7c7c7', alpha=0.5, linewidth=3, linestyle='--', edgecolor='black')#color='darkorange',fill=False)
-        # ax[0].add_patch(cir)
-        # cir2 = plt.Circle((0, 0), r, facecolor='white', alpha=0.5, linewidth=3, linestyle='--', edgecolor='black')#color='darkorange',fill=False)
-        # ax[0].add_patch(cir2)
-        
-        # cir = plt.Circle((0, 0), R, facecolor='#c7c7c7', alpha=0.5, linewidth=3, linestyle='--', edgecolor='black')#color='darkorange',fill=False)
-        # ax[1].add_patch(cir)
-        # cir2 = plt.Circle((0, 0), r, facecolor='white', alpha=0.5, linewidth=3, linestyle='--', edgecolor='black')#color='darkorange',fill=False)
-        # ax[1].add_patch(cir2)
-        
-        # fig.suptitle(config_list[i], fontsize = 30)
-        
-        # # for axs in ax:
-        # #     axs.label_outer()
-        
-        
-        # for each iteration of a config
-        for j in range(len(run_paths)):
-            
-            # check if folder exists
-            
-            # grab the sub folders containing the data and find the positions.csv file
-            pos_path = folder_path + '/' + run_paths[j] + '/positions.csv'
-            
-            # fetch positions and convert to numpy array
-            xyz = pd.read_csv(pos_path)
-            positions = np.array(xyz) # in xyz format
-            
-            npoints = 50
-            #ax[0].scatter(positions[:, 0][::npoints], positions[:, 1][::npoints], s = 3, alpha = 0.3)
-            
-            # transformed coordinates
-            rotcoords = transform_to_rotational_coords(positions, times, omega)
-            
-            # write to file
-            output_path = 'D:/Kenzie_Mphys/Data/Exp2/Rotated_coordinates/' + config_list[i] + '/' + run_paths[j]
-            if not os.path.exists(output_path):
-                os.makedirs(output_path)
-                print(output_path)
-                
-                np.savetxt(output_path + '/rotated_positions.csv', rotcoords, delimiter=",")
-                
-            #ax[1].scatter(rotcoords[:, 0][::npoints], rotcoords[:, 1][::npoints], s = 3, alpha = 0.3)
-            
-            
-        #plt.show()
-        #fig.savefig(plot_path, dpi = 500)
-        
-        
-        
-        
-        
-        
-    
-
-    
-    
-    
-
-
-
-    
-    
-    
+    x = positions[..., 0]
+    y = positions[..., 1]
+
+    rotx = (x*costheta) - (y*sintheta)
+    roty = (x*sintheta) + (y*costheta)
+
+    if out is None:
+        out = np.array(positions, dtype=float)
+    elif out is not positions:
+        out[..., 2] = positions[..., 2]
+
+    out[..., 0] = rotx
+    out[..., 1] = roty
+
+    return out
+
+
+def to_rotating_frame(positions, times, omega, out=None):
+    '''
+    Positions in the frame rotating with the clinostat.
+
+    :param positions: [n, 3] or [n, N, 3] float array of lab frame positions
+    :param times: [n] float array, time of each row [s]
+    :param omega: float, angular speed of the clinostat in radians per second
+    :param out: array the result is written to (can be positions), new array if None
+    '''
+    return transform_to_rotational_coords(positions, times, -omega, out=out)
+
+
+def run_config(path):
+    '''
+    Configuration saved with a run, from the header of a binary trajectory or
+    the json file next to a positions csv file (see TrajectoryIO.open_writer).
+
+    :param path: string, path to a positions csv file or a binary trajectory folder
+
+    :returns config: dictionary, empty if none was saved
+    '''
+
+    if is_binary_trajectory(path):
+        return Trajectory(path).config or {}
+
+    config_path = os.path.splitext(path)[0] + '.json'
+    if os.path.isfile(config_path):
+        with open(config_path, 'r') as file:
+            return json.load(file)
+
+    return {}
+
+
+def run_omega(path):
+    '''
+    Angular speed of the clinostat of a run in radians per second, from its
+    saved configuration, None if it cant be found.
+
+    :param path: string, path to a positions csv file or a binary trajectory folder
+    '''
+    rate = run_config(path).get('clino_rotation_rate')
+
+    if rate is None or np.ndim(rate) != 0:
+        return None
+
+    return float(rate)*2*np.pi/60
+
+
+def default_chunk_size(n):
+    '''
+    Number of recorded timesteps in each chunk, chosen to keep each chunk near
+    10^6 values (as TrajectoryIO.TrajectoryWriter).
+
+    :param n: integer, number of bacteria in the trajectory
+    '''
+    return int(np.clip(10**6 // (3*max(n, 1)), 1, 10**5))
+
+
+def iter_positions(path, chunk_size=None, bacteria=None, time_path=None):
+    '''
+    Streams the lab frame positions of a run, a chunk of recorded timesteps at a time.
+
+    :param path: string, path to a positions csv file or a binary trajectory folder
+    :param chunk_size: integer, number of recorded timesteps in each chunk,
+    chosen from the number of bacteria if None
+    :param bacteria: integer array (or slice), bacteria to stream, all if None
+    :param time_path: string, path to the time csv file of a csv run, time.csv
+    next to the positions file if None
+
+    :yields times, positions: [k] float array [s], [k, N, 3] float array (a new array each chunk)
+    '''
+    bacteria = slice(None) if bacteria is None else bacteria
+
+    if is_binary_trajectory(path):
+
+        trajectory = Trajectory(path)
+        times = trajectory['time']
+        positions = trajectory['positions']
+        chunk_size = default_chunk_size(trajectory.n) if chunk_size is None else chunk_size
+
+        # only the rows of each chunk are read from the memory mapped column
+        for start in range(0, min(len(times), len(positions)), chunk_size):
+            stop = start + chunk_size
+            yield np.array(times[start:stop], dtype=float), np.array(positions[start:stop][:, bacteria], dtype=float)
+
+        return
+
+    if time_path is None:
+        time_path = os.path.join(os.path.dirname(path), 'time.csv')
+
+    if chunk_size is None:
+        # number of bacteria from the columns of the first row
+        with open(path, 'r') as file:
+            chunk_size = default_chunk_size(file.readline().count(',')//3 + 1)
+
+    position_chunks = pd.read_csv(path, header=None, chunksize=chunk_size)
+    time_chunks = pd.read_csv(time_path, header=None, chunksize=chunk_size)
+
+    for position_chunk, time_chunk in zip(position_chunks, time_chunks):
+        positions = np.array(position_chunk, dtype=float)
+        positions = positions.reshape(len(positions), -1, 3)[:, bacteria]
+        yield np.array(time_chunk, dtype=float)[:len(positions), 0], positions[:len(time_chunk)]
+
+
+def frame_chunks(path, frame='rotating', omega=None, chunk_size=None, bacteria=None, time_path=None):
+    '''
+    Streams the positions of a run in the lab frame or the frame rotating
+    with the clinostat, a chunk of recorded timesteps at a time (see iter_positions).
+
+    :param frame: string, 'lab' or 'rotating'
+    :param omega: float, angular speed of the clinostat in radians per second,
+    read from the configuration of the run if None (only needed for 'rotating')
+
+    :yields times, positions: [k] float array [s], [k, N, 3] float array
+    '''
+
+    if frame not in FRAMES:
+        raise ValueError("frame must be 'lab' or 'rotating', not " + str(frame))
+
+    if frame == 'rotating' and omega is None:
+        omega = run_omega(path)
+        if omega is None:
+            raise ValueError('no clino_rotation_rate saved with ' + str(path) + ', omega must be given')
+
+    for times, positions in iter_positions(path, chunk_size, bacteria, time_path):
+
+        # each chunk is a new array, so it is transformed in place
+        if frame == 'rotating':
+            to_rotating_frame(positions, times, omega, out=positions)
+
+        yield times, positions
+
+
+class ThinnedPositions(object):
+    '''
+    Reducer keeping every nth recorded position of a trajectory (e.g for
+    plotting it).
+
+    Every reducer has the same two methods as an accumulator (see Observables.py):
+
+        update(times, positions): called with each chunk of the trajectory
+        result():                 returns the statistics measured so far as a
+                                  dictionary of numpy arrays
+    '''
+
+    def __init__(self, every=50, name='thinned'):
+        '''
+        :param every: integer, only every nth recorded timestep is kept
+        :param name: string, name the results are stored under
+        '''
+        self.every = int(every)
+        self.name = name
+
+        # number of recorded timesteps seen so far, and the kept chunks
+        self.seen = 0
+        self.times = []
+        self.positions = []
+
+
+    def update(self, times, positions):
+
+        # first row of this chunk that is a multiple of every
+        first = -self.seen % self.every
+        self.seen += len(times)
+
+        self.times.append(times[first::self.every])
+        self.positions.append(positions[first::self.every])
+
+
+    def result(self):
+
+        if len(self.times) == 0:
+            return {'times': np.zeros(0), 'positions': np.zeros([0, 0, 3])}
+
+        return {'times': np.concatenate(self.times), 'positions': np.concatenate(self.positions)}
+
+
+class FrameMoments(object):
+    '''
+    Reducer measuring the mean and variance over time of the x, y and z
+    coordinates of each bacterium, combined chunk by chunk (Chan et al.).
+    '''
+
+    def __init__(self, name='moments'):
+        '''
+        :param name: string, name the results are stored under
+        '''
+        self.name = name
+
+        self.count = 0
+        self.mean = None
+        self.m2 = None
+
+
+    def update(self, times, positions):
+
+        count = len(positions)
+        if count == 0:
+            return
+
+        mean = np.mean(positions, axis=0)
+        m2 = np.sum((positions - mean)**2, axis=0)
+
+        if self.mean is None:
+            self.count, self.mean, self.m2 = count, mean, m2
+            return
+
+        # combining the statistics of this chunk with those so far
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean = self.mean + delta*count/total
+        self.m2 = self.m2 + m2 + delta**2*self.count*count/total
+        self.count = total
+
+
+    def result(self):
+
+        if self.count == 0:
+            return {'count': np.array(0)}
+
+        return {'count': np.array(self.count), 'mean': self.mean, 'variance': self.m2/self.count}
+
+
+def reduce_run(task):
+    '''
+    Streams one run through its reducers, run by each worker of transform_runs.
+
+    :param task: tuple, (path, reducers, frame, omega, chunk_size)
+
+    :returns path, results, error: results is a dictionary of the result of
+    each reducer (None if the run failed), error is None unless it failed
+    '''
+    path, reducers, frame, omega, chunk_size = task
+
+    try:
+        for times, positions in frame_chunks(path, frame, omega, chunk_size):
+            for reducer in reducers:
+                reducer.update(times, positions)
+
+    except Exception as error:
+        return path, None, repr(error)
+
+    return path, {reducer.name: reducer.result() for reducer in reducers}, None
+
+
+def transform_runs(run_paths, reducers, frame='rotating', omega=None, chunk_size=None, processes=None):
+    '''
+    Streams every run through its own copy of the reducers, in the lab or
+    rotating frame, on a pool of processes.
+
+    :param run_paths: list of strings, run folders (see TrajectoryIO.trajectory_path),
+    positions csv files or binary trajectory folders
+    :param reducers: list of reducers (e.g ThinnedPositions, FrameMoments), copied for each run
+    :param frame: string, 'lab' or 'rotating'
+    :param omega: float, angular speed of the clinostat in radians per second,
+    read from the configuration of each run if None
+    :param chunk_size: integer, number of recorded timesteps in each chunk
+    :param processes: integer, number of worker processes, number of available
+    cores if None, 1 streams every run in this process
+
+    :returns results, failed: dictionary of the results of each run (by path
+    given), list of tuples (path, error message) of every run that failed
+    '''
+
+    if frame not in FRAMES:
+        raise ValueError("frame must be 'lab' or 'rotating', not " + str(frame))
+
+    paths = {trajectory_path(path) if os.path.isdir(path) and not is_binary_trajectory(path) else path: path
+             for path in run_paths}
+    tasks = [(path, reducers, frame, omega, chunk_size) for path in paths]
+
+    if processes is None:
+        processes = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count()
+    processes = max(1, min(processes, len(tasks)))
+
+    results = {}
+    failed = []
+
+    def collect(outcome):
+        path, result, error = outcome
+        if error is None:
+            results[paths[path]] = result
+        else:
+            failed.append((paths[path], error))
+
+    if processes == 1:
+        # a pool sends each run a copy of the reducers, so they are copied here too
+        for task in tasks:
+            collect(reduce_run((task[0], copy.deepcopy(reducers)) + task[2:]))
+
+    else:
+        # runs are handed out one at a time, so a long run doesnt hold up others
+        with mp.Pool(processes) as pool:
+            for outcome in pool.imap_unordered(reduce_run, tasks, chunksize=1):
+                collect(outcome)
+
+    return results, failed
+
+
+def omega_from_folder(name):
+    '''
+    Angular speed in a configuration folder name, e.g 'omega=1.407,vs=7.5e-06'
+    (folders of runs saved without their configuration).
+    '''
+    char1 = '='
+    char2 = ','
+
+    return float(name[name.find(char1)+1:name.find(char2)])
+
+
+def main(config_path, plot_folder, frame='rotating', npoints=50, processes=None):
+    '''
+    Plots the positions of every run of each configuration folder in the
+    lab frame and the chosen frame, one figure per configuration. Configurations
+    already plotted are skipped, no transformed positions are written.
+
+    :param config_path: string, path to folder containing one folder per configuration
+    :param plot_folder: string, folder the figures are saved to
+    :param frame: string, frame of the second panel, 'lab' or 'rotating'
+    :param npoints: integer, only every npoints recorded position is plotted
+    :param processes: integer, number of worker processes, number of available cores if None
+    '''
+    import matplotlib.pyplot as plt
+
+    if not os.path.isdir(plot_folder):
+        os.makedirs(plot_folder)
+
+    # get all folder names in Data directory
+    config_list = sorted(os.listdir(config_path))
+
+    for config in config_list:
+
+        folder_path = os.path.join(config_path, config)
+        plot_path = os.path.join(plot_folder, config + '.png')
+
+        # if png doesnt exist already then generate it
+        if not os.path.isdir(folder_path) or os.path.exists(plot_path):
+            continue
+
+        run_paths = [os.path.join(folder_path, run) for run in sorted(os.listdir(folder_path))
+                     if os.path.exists(trajectory_path(os.path.join(folder_path, run)))]
+
+        # folders of runs saved without their configuration have omega in their name
+        omega = None
+        if run_paths and run_omega(trajectory_path(run_paths[0])) is None:
+            omega = omega_from_folder(config)
+
+        lab, failed = transform_runs(run_paths, [ThinnedPositions(npoints)], 'lab', processes=processes)
+        framed, failed_frame = transform_runs(run_paths, [ThinnedPositions(npoints)], frame, omega, processes=processes)
 
+        for path, error in failed + failed_frame:
+            print('FAILED ' + path + ': ' + error)
 
+        fig, ax = plt.subplots(nrows=1, ncols=2, figsize=(15, 8))
+        for axs, results, title in [(ax[0], lab, 'Lab frame'), (ax[1], framed, frame.capitalize() + ' frame')]:
+            for path in run_paths:
+                if path in results:
+                    positions = results[path]['thinned']['positions']
+                    axs.scatter(positions[..., 0], positions[..., 1], s=3, alpha=0.3)
+            axs.set_xlabel(r'$x (m)$')
+            axs.set_ylabel(r'$y (m)$')
+            axs.set_title(title)
 
+        fig.suptitle(config)
+        fig.savefig(plot_path, dpi=500)
+        plt.close(fig)
 
 
+if __name__ == "__main__":
+    main('D:/Kenzie_Mphys/Data/Exp2/Raw2/', 'D:/Kenzie_Mphys/Data/Exp2/Rotated_coordinates/')